@@ -121,6 +121,7 @@ This is how the artifact_path is returned. This hook can be removed, by running
 ``unregister_hook_callback`` with the name of the hook callback.
 
 """
+from artifactor.transport import UnixHookServer, default_socket_path
 from artifactor.utils import parse_setup_dir, start_session
 from riggerlib import Rigger, RiggerClient
 import os
@@ -157,6 +158,26 @@ class Artifactor(Rigger):
         self.global_data = {'artifactor_config': self.config, 'log_dir': self.config['log_dir'],
                             'artifacts': dict()}
 
+    def start_server(self):
+        """Starts the server for the configured ``transport``, ``tcp`` (default) or ``unix``
+
+        See :py:mod:`artifactor.transport` for the ``unix`` transport and its options.
+        """
+        if self.config.get('transport', 'tcp') != 'unix':
+            return super(Artifactor, self).start_server()
+        if not self.config.get('server_enabled', False):
+            return
+        self.config.setdefault('server_socket', default_socket_path())
+        self.server = UnixHookServer(self.config['server_socket'], self,
+            self.config.get('server_workers', 1))
+        self.server.serve_in_background()
+
+    def stop_server(self):
+        """Stops the ``unix`` transport's server, once the hooks it has received have run"""
+        server = getattr(self, 'server', None)
+        if isinstance(server, UnixHookServer):
+            server.close()
+
     def handle_failure(self, exc):
         self.logger.debug(exc[0])
         self.logger.debug(exc[1])
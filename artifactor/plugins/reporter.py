@@ -10,31 +10,96 @@ artifactor:
             enabled: True
             plugin: reporter
             only_failed: False #Only show faled tests in the report
+            page_size: 500 #Number of tests on each page of the report
+
+As each test finishes, it is appended to ``report_index.jsonl`` in the log dir, one JSON object
+per line, and dropped from the artifacts kept in memory. A test is finished once the slave that
+ran it starts its next test, so artifacts of errors in its teardown are included. Tests are shown
+in ``report.html`` until there are ``page_size`` of them, at which point they are written out to
+the next numbered page, ``report-1.html``, ``report-2.html`` and so on, which ``report.html``
+links to. Pages are only rendered once, so the report stays cheap to rebuild as the run goes on,
+and can be watched while tests are running.
 """
 
 from artifactor.utils import ArtifactorBasePlugin
 from jinja2 import Environment, FileSystemLoader
+from threading import Lock
 from utils.path import template_path
+import json
 import os
 import time
 
 
+def overall_status(statuses):
+    """Works out the result of a whole test from the outcomes of its phases
+
+    Args:
+        statuses: A dict of ``{when: (outcome, xfail)}``, as reported by ``report_test``
+
+    Returns: One of ``passed``, ``failed``, ``skipped``, ``error``, ``xfailed`` or ``xpassed``
+    """
+    for when, status in statuses.iteritems():
+        if when == "call" and status[1] and status[0] == "skipped":
+            return "xfailed"
+        elif when == "call" and status[1] and status[0] == "failed":
+            return "xpassed"
+        elif (when == "setup" or when == "teardown") and status[0] == "failed":
+            return "error"
+        elif status[0] == "skipped":
+            return "skipped"
+        elif when == "call" and status[0] == 'failed':
+            return "failed"
+    return "passed"
+
+
 class Reporter(ArtifactorBasePlugin):
 
     def plugin_initialize(self):
+        self.register_plugin_hook('start_session', self.start_session)
         self.register_plugin_hook('report_test', self.report_test)
-        self.register_plugin_hook('finish_session', self.run_report)
+        self.register_plugin_hook('finish_session', self.finish_session)
         self.register_plugin_hook('build_report', self.run_report)
         self.register_plugin_hook('start_test', self.start_test)
         self.register_plugin_hook('finish_test', self.finish_test)
 
     def configure(self):
         self.only_failed = self.data.get('only_failed', False)
+        self.page_size = self.data.get('page_size', 500)
+        self.template_env = Environment(
+            loader=FileSystemLoader(template_path.strpath)
+        )
+        self.lock = Lock()
+        self.reset()
         self.configured = True
 
+    def reset(self):
+        self.counts = {
+            'passed': 0, 'failed': 0, 'skipped': 0, 'error': 0, 'xfailed': 0, 'xpassed': 0}
+        # Finished tests that haven't been written out to a page yet
+        self.page = []
+        self.pages = []
+        # Tests written out already, so reports of them sent again are ignored
+        self.finished = set()
+        # The test each slave started last
+        self.last_test = {}
+
     @ArtifactorBasePlugin.check_configured
-    def start_test(self, test_location, test_name):
+    def start_session(self, log_dir):
+        with self.lock:
+            self.reset()
+            # Start a new index for this session
+            open(os.path.join(log_dir, 'report_index.jsonl'), 'w').close()
+
+    @ArtifactorBasePlugin.check_configured
+    def start_test(self, artifacts, log_dir, test_location, test_name, slaveid=None):
         test_ident = "{}/{}".format(test_location, test_name)
+        with self.lock:
+            previous = self.last_test.get(slaveid)
+            self.last_test[slaveid] = test_ident
+        # Everything from the slave's previous test, e.g. tracebacks of errors in its teardown,
+        # has arrived by now
+        if previous is not None:
+            self.finish(artifacts, log_dir, previous)
         return None, {'artifacts': {test_ident: {'start_time': time.time()}}}
 
     @ArtifactorBasePlugin.check_configured
@@ -45,73 +110,92 @@ class Reporter(ArtifactorBasePlugin):
     @ArtifactorBasePlugin.check_configured
     def report_test(self, test_location, test_name, test_xfail, test_when, test_outcome):
         test_ident = "{}/{}".format(test_location, test_name)
-        return None, {'artifacts': {test_ident: {'statuses': {
-            test_when: (test_outcome, test_xfail)}}}}
+        with self.lock:
+            if test_ident in self.finished:
+                # Sent again, by the master relaying a slave's report
+                return
+        # Reporting the same phase again changes nothing. The teardown report is the last one
+        # for a test, but the test is only written out once its slave moves on to the next one
+        # (see start_test), as artifacts of the teardown come after it.
+        test = {'statuses': {test_when: (test_outcome, test_xfail)}}
+        if test_when == 'teardown':
+            test['torn_down'] = True
+        return None, {'artifacts': {test_ident: test}}
 
-    @ArtifactorBasePlugin.check_configured
-    def run_report(self, artifacts, log_dir):
-        template_env = Environment(
-            loader=FileSystemLoader(template_path.strpath)
-        )
-        template_data = {'tests': []}
-        log_dir += "/"
-        counts = {'passed': 0, 'failed': 0, 'skipped': 0, 'error': 0, 'xfailed': 0, 'xpassed': 0}
-        for test_name, test in artifacts.iteritems():
-            if not test.get('statuses', None):
-                continue
-            overall_status = None
-            for when, status in test['statuses'].iteritems():
-                if when == "call" and status[1] and status[0] == "skipped":
-                    counts['xfailed'] += 1
-                    overall_status = "xfailed"
-                    break
-                elif when == "call" and status[1] and status[0] == "failed":
-                    counts['xpassed'] += 1
-                    overall_status = "xpassed"
-                    break
-                elif (when == "setup" or when == "teardown") and status[0] == "failed":
-                    counts['error'] += 1
-                    overall_status = "error"
-                    break
-                elif status[0] == "skipped":
-                    counts['skipped'] += 1
-                    overall_status = "skipped"
-                    break
-                elif when == "call" and status[0] == 'failed':
-                    counts['failed'] += 1
-                    overall_status = "failed"
-                    break
+    def finish(self, artifacts, log_dir, test_ident):
+        """Writes out a test that's been torn down, and drops it from the artifacts"""
+        with self.lock:
+            test = artifacts.get(test_ident)
+            if test_ident in self.finished or not test or not test.get('torn_down'):
+                return
+            self.finished.add(test_ident)
+            del artifacts[test_ident]
+            test_data = self.test_data(test_ident, test, log_dir)
+            test_data['in_progress'] = False
+            self.counts[test_data['outcomes']['overall']] += 1
+            with open(os.path.join(log_dir, 'report_index.jsonl'), 'a') as f:
+                f.write(json.dumps(test_data) + '\n')
+            if self.only_failed and test_data['outcomes']['overall'] == 'passed':
+                return
+            self.page.append(test_data)
+            if len(self.page) >= self.page_size:
+                page_name = 'report-{}.html'.format(len(self.pages) + 1)
+                self.render(log_dir, page_name, tests=self.page,
+                            title='Test Report page {}'.format(len(self.pages) + 1))
+                self.pages.append(page_name)
+                self.page = []
+
+    def test_data(self, test_name, test, log_dir):
+        """Gathers what the report shows about a test from its artifacts"""
+        log_dir = os.path.join(log_dir, "")
+        statuses = dict(test.get('statuses', {}))
+        statuses['overall'] = overall_status(test.get('statuses', {}))
+        test_data = {'name': test_name, 'outcomes': statuses}
+        if test.get('start_time', None):
+            if test.get('finish_time', None):
+                test_data['in_progress'] = False
+                test_data['duration'] = test['finish_time'] - test['start_time']
             else:
-                counts['passed'] += 1
-                overall_status = "passed"
-                if self.only_failed:
-                    continue
-            test['statuses']['overall'] = overall_status
-            test_data = {'name': test_name, 'outcomes': test['statuses']}
-            if test.get('start_time', None):
-                if test.get('finish_time', None):
-                    test_data['in_progress'] = False
-                    test_data['duration'] = test['finish_time'] - test['start_time']
-                else:
-                    test_data['duration'] = time.time() - test['start_time']
-                    test_data['in_progress'] = True
-            for ident in test.get('files', []):
-                for filename in test['files'].get(ident, []):
-                    if "screenshot" in filename:
-                        test_data['screenshot'] = filename.replace(log_dir, "")
-                    elif "short-traceback" in filename:
-                        test_data['short_tb'] = open(filename).read()
-                    elif "traceback" in filename:
-                        test_data['full_tb'] = filename.replace(log_dir, "")
-                    elif "video" in filename:
-                        test_data['video'] = filename.replace(log_dir, "")
-                    elif "cfme.log" in filename:
-                        test_data['cfme'] = filename.replace(log_dir, "")
-                if "merkyl" in ident:
-                    test_data['merkyl'] = [f.replace(log_dir, "")
-                                           for f in test['files']['merkyl']]
-            template_data['tests'].append(test_data)
-        template_data['counts'] = counts
-        data = template_env.get_template('test_report.html').render(**template_data)
-        with open(os.path.join(log_dir, 'report.html'), "w") as f:
+                test_data['duration'] = time.time() - test['start_time']
+                test_data['in_progress'] = True
+        for ident in test.get('files', []):
+            for filename in test['files'].get(ident, []):
+                if "screenshot" in filename:
+                    test_data['screenshot'] = filename.replace(log_dir, "")
+                elif "short-traceback" in filename:
+                    test_data['short_tb'] = open(filename).read()
+                elif "traceback" in filename:
+                    test_data['full_tb'] = filename.replace(log_dir, "")
+                elif "video" in filename:
+                    test_data['video'] = filename.replace(log_dir, "")
+                elif "cfme.log" in filename:
+                    test_data['cfme'] = filename.replace(log_dir, "")
+            if "merkyl" in ident:
+                test_data['merkyl'] = [f.replace(log_dir, "")
+                                       for f in test['files']['merkyl']]
+        return test_data
+
+    def render(self, log_dir, filename, **template_data):
+        data = self.template_env.get_template('test_report.html').render(**template_data)
+        with open(os.path.join(log_dir, filename), "w") as f:
             f.write(data)
+
+    @ArtifactorBasePlugin.check_configured
+    def finish_session(self, artifacts, log_dir):
+        # Nothing else is coming from any of the slaves
+        for test_ident in artifacts.keys():
+            self.finish(artifacts, log_dir, test_ident)
+        self.run_report(artifacts, log_dir)
+
+    @ArtifactorBasePlugin.check_configured
+    def run_report(self, artifacts, log_dir):
+        # Tests still in the artifacts haven't been written out yet
+        running = []
+        for test_name, test in artifacts.items():
+            if test.get('statuses', None):
+                test_data = self.test_data(test_name, test, log_dir)
+                test_data['in_progress'] = not test.get('torn_down', False)
+                running.append(test_data)
+        with self.lock:
+            self.render(log_dir, 'report.html', tests=running + self.page, pages=self.pages,
+                        counts=self.counts, title='Test Report')
@@ -0,0 +1,332 @@
+"""Unix domain socket transport for Artifactor
+
+The TCP server that Artifactor gets from riggerlib takes a new connection for every hook that is
+fired, and runs all hooks one after the other on a single thread. This module provides an
+alternative, enabled by setting ``transport`` to ``unix`` in the artifactor config::
+
+    artifactor:
+        transport: unix
+        # Optional, defaults to a socket in the temp dir named after the master's pid
+        server_socket: /tmp/artifactor.sock
+        # Number of threads running hooks (default 1)
+        server_workers: 4
+
+Each client keeps one connection open to the server, over which messages are sent as a 4-byte
+big-endian length followed by that many bytes of JSON. Hooks fired without ``grab_result`` are
+fire-and-forget; nothing is sent back for them. Hooks fired with ``grab_result`` get a reply
+tagged with the id of the request, so a client can have several requests in flight at once (see
+:py:meth:`UnixHookClient.send_hook`).
+
+On the server, each connection is assigned to one of the worker threads, which runs the hooks
+from that connection in the order they were sent. Since every slave has its own client, hooks
+from one slave are run in order, while hooks from different slaves can run at the same time.
+
+"""
+import json
+import logging
+import os
+import socket
+import SocketServer
+import struct
+import threading
+import time
+import Queue
+from itertools import count
+from tempfile import gettempdir
+
+_header = struct.Struct('!I')
+
+logger = logging.getLogger(__name__)
+
+
+def default_socket_path():
+    """Path of the server socket if it isn't configured, unique to the current process"""
+    return os.path.join(gettempdir(), 'artifactor-{}.sock'.format(os.getpid()))
+
+
+def send_message(sock, message):
+    """Sends a JSON-serializable message, prefixed with its length"""
+    data = json.dumps(message)
+    sock.sendall(_header.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    data = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        data.append(chunk)
+        size -= len(chunk)
+    return ''.join(data)
+
+
+def recv_message(sock):
+    """Receives a message sent by :py:func:`send_message`
+
+    Returns: The message, or ``None`` if the connection was closed
+    """
+    header = _recv_exactly(sock, _header.size)
+    if header is None:
+        return None
+    data = _recv_exactly(sock, _header.unpack(header)[0])
+    if data is None:
+        return None
+    return json.loads(data)
+
+
+class _Connection(object):
+    # Server side state of a client connection, shared with the worker running its hooks
+    def __init__(self, sock):
+        self.sock = sock
+        self.finished = threading.Event()
+
+
+class _HookHandler(SocketServer.BaseRequestHandler):
+    def handle(self):
+        connection = _Connection(self.request)
+        worker = self.server.assign_worker()
+        self.server.connection_opened()
+        try:
+            while True:
+                try:
+                    message = recv_message(self.request)
+                except (socket.error, ValueError):
+                    message = None
+                if message is None:
+                    break
+                worker.put((connection, message))
+        finally:
+            # Wait for this connection's hooks to run before the socket is closed
+            worker.put((connection, None))
+            connection.finished.wait()
+            self.server.connection_closed()
+
+
+class UnixHookServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Runs hooks sent by :py:class:`UnixHookClient` on a :py:class:`riggerlib.Rigger`
+
+    Args:
+        path: Path of the socket to listen on
+        rigger: The :py:class:`riggerlib.Rigger` to run hooks on
+        workers: Number of threads running hooks
+
+    """
+    daemon_threads = True
+
+    def __init__(self, path, rigger, workers=1):
+        if os.path.exists(path):
+            os.remove(path)
+        SocketServer.UnixStreamServer.__init__(self, path, _HookHandler)
+        self.rigger = rigger
+        self._serving = False
+        self._connections = 0
+        self._connections_changed = threading.Condition()
+        self._worker_queues = [Queue.Queue() for i in range(max(workers, 1))]
+        self._workers = []
+        self._next_worker = count()
+        for worker_queue in self._worker_queues:
+            worker = threading.Thread(target=self._run_hooks, args=(worker_queue,),
+                name='artifactor-worker')
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def connection_opened(self):
+        with self._connections_changed:
+            self._connections += 1
+
+    def connection_closed(self):
+        with self._connections_changed:
+            self._connections -= 1
+            self._connections_changed.notify_all()
+
+    def assign_worker(self):
+        return self._worker_queues[next(self._next_worker) % len(self._worker_queues)]
+
+    def _run_hooks(self, worker_queue):
+        while True:
+            connection, message = worker_queue.get()
+            if connection is None:
+                # Stopped by close()
+                break
+            if message is None:
+                connection.finished.set()
+                continue
+            result = None
+            try:
+                local, global_data = self.rigger.process_hook(
+                    message['hook_name'], **message['data'])
+                if message.get('id') is not None:
+                    result = dict(global_data)
+                    result.update(local)
+            except Exception as e:
+                self.rigger.log_message(e)
+            if message.get('id') is not None:
+                try:
+                    send_message(connection.sock, {'id': message['id'], 'result': result})
+                except (socket.error, TypeError, ValueError) as e:
+                    # Client went away, or the result isn't JSON-serializable
+                    self.rigger.log_message(e)
+
+    def serve_in_background(self):
+        """Starts serving in a daemon thread"""
+        server_thread = threading.Thread(target=self.serve_forever, name='artifactor-server')
+        server_thread.daemon = True
+        server_thread.start()
+        self._serving = True
+        return server_thread
+
+    def close(self, timeout=60):
+        """Stops serving, waits for the hooks already received to run, and removes the socket
+
+        The workers are daemon threads, so hooks still queued when the process exits would be
+        lost without this. Clients should be closed first; the hooks of connections that are
+        still open after ``timeout`` seconds may not all be run.
+
+        Args:
+            timeout: Number of seconds to wait for the connections to close, and their hooks to
+                run
+        """
+        if self._serving:
+            self.shutdown()
+            self._serving = False
+        deadline = time.time() + timeout
+        with self._connections_changed:
+            while self._connections and time.time() < deadline:
+                self._connections_changed.wait(deadline - time.time())
+        for worker_queue in self._worker_queues:
+            worker_queue.put((None, None))
+        for worker in self._workers:
+            worker.join(max(deadline - time.time(), 0))
+        self.server_close()
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class _Reply(object):
+    """A reply to a hook sent with :py:meth:`UnixHookClient.send_hook`"""
+    def __init__(self):
+        self._received = threading.Event()
+        self._result = None
+
+    def _set(self, result):
+        self._result = result
+        self._received.set()
+
+    def get(self, timeout=None):
+        """Waits for the reply
+
+        Returns: The result of the hook, or ``None`` if it didn't arrive in time
+        """
+        self._received.wait(timeout)
+        return self._result
+
+
+class UnixHookClient(object):
+    """Fires hooks on a :py:class:`UnixHookServer`
+
+    The same client can be used from many threads, and connects when it is first used. Like
+    :py:class:`riggerlib.RiggerClient`, connection errors are ignored, so tests can carry on if
+    the server goes away.
+
+    Args:
+        path: Path of the server socket
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self._sock = None
+        self._lock = threading.Lock()
+        self._ids = count(1)
+        self._replies = {}
+
+    def _connect(self):
+        # Called with the lock held
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            self._sock = sock
+            reader = threading.Thread(target=self._read_replies, args=(sock,),
+                name='artifactor-replies')
+            reader.daemon = True
+            reader.start()
+        return self._sock
+
+    def _read_replies(self, sock):
+        while True:
+            try:
+                message = recv_message(sock)
+            except (socket.error, ValueError):
+                message = None
+            if message is None:
+                break
+            reply = self._replies.pop(message['id'], None)
+            if reply is not None:
+                reply._set(message['result'])
+        # Connection closed, nothing else is coming back on it
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            replies, self._replies = self._replies, {}
+        for reply in replies.values():
+            reply._set(None)
+
+    def _send(self, message, reply=None):
+        with self._lock:
+            try:
+                sock = self._connect()
+                if reply is not None:
+                    self._replies[message['id']] = reply
+                send_message(sock, message)
+                return True
+            except socket.error:
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+            except TypeError:
+                logger.warning("Could not JSONize data for hook %s", message['hook_name'])
+            if reply is not None:
+                self._replies.pop(message['id'], None)
+                reply._set(None)
+            return False
+
+    def send_hook(self, hook_name, **kwargs):
+        """Fires a hook without waiting for its result
+
+        Returns: A :py:class:`_Reply`, whose ``get()`` method waits for the result of the hook.
+            Any number of hooks can be sent before waiting for their results.
+        """
+        reply = _Reply()
+        self._send({'id': next(self._ids), 'hook_name': hook_name, 'data': kwargs}, reply)
+        return reply
+
+    def fire_hook(self, hook_name, grab_result=False, **kwargs):
+        """Fires a hook
+
+        Args:
+            hook_name: The name of the hook to fire
+            grab_result: Wait for, and return the result of the hook. Otherwise, the hook is
+                fired and forgotten.
+            kwargs: The kwargs to pass to the hooks
+
+        Returns: The result of the hook if ``grab_result`` is ``True``, otherwise ``None``
+        """
+        if grab_result:
+            return self.send_hook(hook_name, **kwargs).get()
+        self._send({'id': None, 'hook_name': hook_name, 'data': kwargs})
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                # The reply reader still has the socket open, shutting it down ends the
+                # connection for the server too
+                try:
+                    self._sock.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+                self._sock.close()
+                self._sock = None
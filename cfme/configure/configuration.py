@@ -14,7 +14,7 @@ from utils.log import logger
 from utils.timeutil import parsetime
 from utils.update import Updateable
 from utils.wait import wait_for, TimedOutError
-from utils import version
+from utils import db_queries, version
 
 access_tree = partial(accordion.tree, "Access Control")
 database_tree = partial(accordion.tree, "Database")
@@ -569,6 +569,9 @@ class BasicInformation(Updateable):
         """
         sel.force_navigate("cfg_settings_currentserver_server")
         fill(self.basic_information, self.details, action=form_buttons.save)
+        if self.details['appliance_name']:
+            # The server name is cached
+            db_queries.clear_cache()
 
 
 class SMTPSettings(Updateable):
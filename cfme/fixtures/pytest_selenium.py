@@ -10,6 +10,7 @@ Members of this module are available in the the pytest.sel namespace, e.g.::
 
 :var ajax_wait_js: A Javascript function for ajax wait checking
 """
+import threading
 from time import sleep, time
 from collections import Iterable
 from textwrap import dedent
@@ -18,7 +19,8 @@ from utils import conf
 from selenium.common.exceptions import \
     (ErrorInResponseException, InvalidSwitchToTargetException, NoSuchAttributeException,
      NoSuchElementException, NoAlertPresentException, UnexpectedAlertPresentException,
-     InvalidElementStateException, MoveTargetOutOfBoundsException, WebDriverException)
+     InvalidElementStateException, MoveTargetOutOfBoundsException, WebDriverException,
+     StaleElementReferenceException)
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions
@@ -29,9 +31,10 @@ from multimethods import singledispatch, multidispatch
 
 import pytest
 from cfme import exceptions, js
+import utils.browser
 from utils.browser import browser, ensure_browser_open
 from utils.log import logger
-from utils.wait import wait_for
+from utils.wait import TimedOutError, wait_for
 
 
 class ByValue(object):
@@ -137,17 +140,95 @@ def _nothing_in_flight():
     The element visibility check is complex because lightbox_div invokes visibility of spinner_div
     although it is not visible.
     """
-    return execute_script(js.nothing_in_flight)
+    return browser().execute_script(js.nothing_in_flight)
 
 
-def wait_for_ajax():
+class _Quiescence(threading.local):
+    """Keeps track of when the page was last seen with no ajax in flight
+
+    Anything in this module that could start an ajax request calls :py:meth:`invalidate`,
+    so waits for ajax that come right after a confirmed quiet page, with nothing done to the
+    page in between, can be skipped.
+
+    """
+    #: Seconds after being confirmed during which a quiet page is trusted to still be quiet
+    window = 1.0
+
+    def __init__(self):
+        self.confirmed = None
+        self.browser = None
+
+    def confirm(self):
+        self.confirmed = time()
+
+    def invalidate(self):
+        self.confirmed = None
+
+    def recent(self):
+        return self.confirmed is not None and time() - self.confirmed < self.window
+
+_quiescence = _Quiescence()
+
+
+def _ajax_wait_mode():
+    return conf.env.get('browser', {}).get('ajax_wait', 'async')
+
+
+def _wait_for_ajax_in_browser(num_sec):
+    """Block inside the browser until no ajax is in flight
+
+    One round trip to the browser is all it takes to check a quiet page.
+    """
+    b = browser()
+    if _quiescence.browser is not b:
+        # Async scripts time out immediately unless a timeout is set
+        b.set_script_timeout(num_sec + 5)
+        _quiescence.browser = b
+    deadline = time() + num_sec
+    while True:
+        remaining = deadline - time()
+        if remaining <= 0:
+            logger.error('Could not complete wait for ajax in time')
+            raise TimedOutError('Could not do wait for ajax in time')
+        try:
+            if b.execute_async_script(js.wait_for_quiescence, int(remaining * 1000)):
+                return
+        except UnexpectedAlertPresentException:
+            # Nothing will happen until the alert is dealt with, leave that to the caller
+            raise
+        except StaleElementReferenceException:
+            # The page was unloaded while waiting, try again on the new page
+            sleep(0.1)
+        except WebDriverException as e:
+            if 'unloaded' not in str(e).lower():
+                raise
+            # The document was unloaded while waiting, try again on the new page
+            sleep(0.1)
+
+
+def wait_for_ajax(coalesce=False):
     """
     Waits unti lall ajax timers are complete, in other words, waits until there are no
     more pending ajax requests, page load should be finished completely.
+
+    By default, the wait happens inside the browser with one asynchronous script, which returns
+    as soon as the page is quiet. Set ``ajax_wait`` to ``poll`` in the ``browser`` section of
+    env.yaml to poll the page from here instead.
+
+    Args:
+        coalesce: If True, skip the wait if the page was found to be quiet within the last
+            moment, and nothing has been done to the page since. Used to avoid redundant
+            waits within a single action. (Default False)
     """
-    wait_for(
-        _nothing_in_flight,
-        num_sec=30, delay=0.1, message="wait for ajax", quiet=True)
+    if coalesce and _quiescence.recent():
+        return
+    if _ajax_wait_mode() == 'poll':
+        wait_for(
+            _nothing_in_flight,
+            num_sec=30, delay=0.1, message="wait for ajax", quiet=True)
+    else:
+        _wait_for_ajax_in_browser(30)
+    _quiescence.confirm()
 
 
 def is_displayed(loc):
@@ -223,6 +304,7 @@ def handle_alert(cancel=False, wait=30.0, squash=False):
         popup = browser().switch_to_alert()
         answer = 'cancel' if cancel else 'ok'
         logger.info('Handling popup "%s", clicking %s' % (popup.text, answer))
+        _quiescence.invalidate()
         popup.dismiss() if cancel else popup.accept()
         wait_for_ajax()
         return True
@@ -256,6 +338,7 @@ def click(loc, wait_ajax=True, no_custom_handler=False):
     # Move mouse cursor to element
     move_to_element(loc)
     # and then click on current mouse position
+    _quiescence.invalidate()
     ActionChains(browser()).click().perform()
     # -> using this approach, we don't check if we clicked a specific element
     if wait_ajax:
@@ -272,7 +355,7 @@ def move_to_element(loc, **kwargs):
         the element that it is being moved to.
     """
     brand = "//div[@id='page_header_div']//div[contains(@class, 'brand')]"
-    wait_for_ajax()
+    wait_for_ajax(coalesce=True)
     el = element(loc, **kwargs)
     move_to = ActionChains(browser()).move_to_element(el)
     try:
@@ -377,7 +460,9 @@ def send_keys(loc, text):
         text: The text to inject into the element.
     """
     if text is not None:
-        move_to_element(loc).send_keys(text)
+        el = move_to_element(loc)
+        _quiescence.invalidate()
+        el.send_keys(text)
         wait_for_ajax()
 
 
@@ -447,6 +532,7 @@ def get(url):
     Args:
         url: URL to navigate to.
     """
+    _quiescence.invalidate()
     return browser().get(url)
 
 
@@ -454,6 +540,7 @@ def refresh():
     """
     Refreshes the current browser window.
     """
+    _quiescence.invalidate()
     browser().refresh()
 
 
@@ -579,8 +666,15 @@ def force_navigate(page_name, _tries=0, *args, **kwargs):
     logger.debug('force_navigate to %s, try %d' % (page_name, _tries))
     # circular import prevention: cfme.login uses functions in this module
     from cfme import login
-    # Import the top-level nav menus for convenience
-    from cfme.web_ui import menu
+    # Import the top-level nav menus, which adds them to the nav tree
+    from cfme.web_ui import menu  # NOQA
+    from cfme.web_ui import navigation
+
+    # Keep warm browsers ready for recycling, if configured to
+    pool_size = conf.env.get('browser', {}).get('pool_size', 0)
+    if pool_size and utils.browser.pool is None:
+        utils.browser.start_pool(
+            pool_size, warmup=login.warm_up_session, adopt=login.adopt_warm_session)
 
     # browser fixture should do this, but it's needed for subsequent calls
     ensure_browser_open()
@@ -605,7 +699,7 @@ def force_navigate(page_name, _tries=0, *args, **kwargs):
         else:  # we recycled and want to log back in
             login.login(current_user.username, current_user.password)
         logger.info('Navigating to %s' % page_name)
-        menu.nav.go_to(page_name, *args, **kwargs)
+        navigation.go_to(page_name, *args, **kwargs)
     except (KeyboardInterrupt, ValueError):
         # KeyboardInterrupt: Don't block this while navigating
         # ValueError: ui_navigate.go_to can't handle this page, give up
@@ -656,7 +750,10 @@ def force_navigate(page_name, _tries=0, *args, **kwargs):
             raise
 
     if recycle:
-        browser().quit()  # login.current_user() will be retained for next login
+        # login.current_user() will be retained for next login, and if there is a browser pool,
+        # a warm browser will be used instead of starting a new one
+        utils.browser.quit()
+        navigation.forget()
         logger.debug('browser killed on try %d' % _tries)
         # If given a "start" nav destination, it won't be valid after quitting the browser
         kwargs.pop("start", None)
@@ -711,6 +808,7 @@ def detect_observed_field(loc):
         interval = default_wait
 
     logger.debug('  Observed field detected, pausing %.1f seconds' % interval)
+    _quiescence.invalidate()
     sleep(interval)
     wait_for_ajax()
 
@@ -726,6 +824,7 @@ def set_text(loc, text):
     """
     if text is not None:
         el = move_to_element(loc)
+        _quiescence.invalidate()
         el.clear()
         send_keys(el, text)
 
@@ -794,6 +893,7 @@ def select_by_text(select_element, text):
         text: The select element option's visible text.
     """
     if text is not None:
+        _quiescence.invalidate()
         select_element.select_by_visible_text(text)
         wait_for_ajax()
 
@@ -807,6 +907,7 @@ def select_by_value(select_element, value):
         value: The select element's option value.
     """
     if value is not None:
+        _quiescence.invalidate()
         select_element.select_by_value(value)
         wait_for_ajax()
 
@@ -820,6 +921,7 @@ def deselect_by_text(select_element, text):
         text: The select element option's visible text.
     """
     if text is not None:
+        _quiescence.invalidate()
         select_element.deselect_by_visible_text(text)
         wait_for_ajax()
 
@@ -833,6 +935,7 @@ def deselect_by_value(select_element, value):
         value: The select element's option value.
     """
     if value is not None:
+        _quiescence.invalidate()
         select_element.deselect_by_value(value)
         wait_for_ajax()
 
@@ -864,4 +967,5 @@ def execute_script(script, *args, **kwargs):
 
     It also provides our library which is stored in data/lib.js file.
     """
+    _quiescence.invalidate()
     return browser().execute_script(dedent(script), *args, **kwargs)
@@ -7,6 +7,7 @@ import ui_navigate as nav
 from cfme.exceptions import NoVmFound, NoOptionAvailable, ParmRequired
 from cfme.fixtures import pytest_selenium as sel
 from cfme.web_ui import Form, Region, Quadicon, CheckboxTree, Tree, paginator, accordion, toolbar
+from cfme.web_ui import search
 from functools import partial
 from selenium.common.exceptions import NoSuchElementException
 from utils.log import logger
@@ -218,14 +219,12 @@ class Vm():
             toolbar.set_vms_grid_view()
         if refresh:
             sel.refresh()
-        for page in paginator.pages():
-            quadicon = Quadicon(self.name, "vm")
-            if sel.is_displayed(quadicon):
-                if mark:
-                    sel.click(quadicon.checkbox())
-                return quadicon
-        else:
+        quadicon = Quadicon(self.name, "vm")
+        if not paginator.find_element(quadicon, max_per_page=True):
             raise NoVmFound("VM '{}' not found in UI!".format(self.name))
+        if mark:
+            sel.click(quadicon.checkbox())
+        return quadicon
 
     def does_vm_exist_on_provider(self):
         """Check if VM exists on provider itself"""
@@ -441,7 +440,8 @@ def _method_setup(vm_names, provider_crud=None):
         provider_crud.load_all_provider_vms()
     else:
         sel.force_navigate('infra_vms')
-    # TODO: add a paginator call to display 1000
+    search.ensure_no_filter_applied()
+    paginator.max_results_per_page()
     for vm_name in vm_names:
         sel.click(Quadicon(vm_name, 'vm').checkbox())
 
@@ -455,12 +455,11 @@ def find_quadicon(vm_name, do_not_navigate=False):
     """
     if not do_not_navigate:
         sel.force_navigate('infra_vms')
-    for page in paginator.pages():
-        quadicon = Quadicon(vm_name, "vm")
-        if sel.is_displayed(quadicon):
-            return quadicon
-    else:
+        search.ensure_no_filter_applied()
+    quadicon = Quadicon(vm_name, "vm")
+    if not paginator.find_element(quadicon, max_per_page=True):
         raise NoVmFound("VM '{}' not found in UI!".format(vm_name))
+    return quadicon
 
 
 def remove(vm_names, cancel=True, provider_crud=None):
@@ -595,9 +594,10 @@ def get_all_vms(do_not_navigate=False):
     """Returns list of all vms"""
     if not do_not_navigate:
         sel.force_navigate('infra_vms')
+        search.ensure_no_filter_applied()
     vms = set([])
     try:
-        for page in paginator.pages():
+        for page in paginator.pages(max_per_page=True):
             for title in sel.elements(
                     "//div[@id='quadicon']/../../../tr/td/a[contains(@href,'vm_infra/x_show')" +
                     " or contains(@href, '/show/')]"):  # for provider specific vm/template page
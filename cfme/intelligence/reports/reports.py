@@ -318,12 +318,15 @@ class CustomSavedReport(Updateable):
         """
         self.navigate()
         try:
-            headers = tuple([sel.text(hdr).encode("utf-8") for hdr in self._table.headers])
+            headers = None
             body = []
-            for page in paginator.pages():
-                for row in self._table.rows():
-                    row_data = tuple([sel.text(row[header]).encode("utf-8") for header in headers])
-                    body.append(row_data)
+            for page in paginator.pages(max_per_page=True):
+                # Read each page at once, reading cell by cell is very slow on big reports
+                page_headers, rows = self._table.read_all()
+                if headers is None:
+                    headers = tuple([hdr.encode("utf-8") for hdr in page_headers])
+                for row in rows:
+                    body.append(tuple([cell.encode("utf-8") for cell in row]))
         except sel.NoSuchElementException:
             # No data found
             return SavedReportData([], [])
@@ -2,7 +2,7 @@ xpath = """
 return document.evaluate(path, document, null, 9, null).singleNodeValue;
 """
 
-nothing_in_flight = """
+_in_flight_functions = """
 function isHidden(el) {
     if(el === null) return true;
     return el.offsetParent === null;
@@ -14,6 +14,127 @@ function miqActive() { return window.miqAjaxTimers > 0; }
 function spinnerDisplayed() { return (!isHidden(document.getElementById("spinner_div")))
  && isHidden(document.getElementById("lightbox_div")); }
 function documentComplete() { return document.readyState == "complete"; }
+"""
+
+nothing_in_flight = _in_flight_functions + """
 return !(jqueryActive() || prototypeActive() || miqActive() || spinnerDisplayed()
  || !(documentComplete()));
 """
+
+# Installs window.cfmeQuiescence on the page if it isn't there yet, which checks the same things
+# as nothing_in_flight, then blocks in the browser until nothing is in flight, polling every 25ms.
+# Arguments are the in-browser timeout in ms and the webdriver callback; the callback gets true
+# when quiet, or false if the timeout was reached.
+# Libraries missing from the page count as having nothing in flight.
+wait_for_quiescence = """
+var timeout = arguments[0];
+var callback = arguments[arguments.length - 1];
+if (typeof window.cfmeQuiescence === "undefined") {
+    window.cfmeQuiescence = (function() {
+        """ + _in_flight_functions + """
+        return {
+            inFlight: function() {
+                return (typeof jQuery !== "undefined" && jqueryActive())
+                    || (typeof Ajax !== "undefined" && prototypeActive())
+                    || miqActive() || spinnerDisplayed() || !documentComplete();
+            }
+        };
+    })();
+}
+var started = new Date().getTime();
+(function check() {
+    var inFlight;
+    try {
+        inFlight = window.cfmeQuiescence.inFlight();
+    } catch (e) {
+        inFlight = true;
+    }
+    if (!inFlight) {
+        callback(true);
+    } else if (new Date().getTime() - started > timeout) {
+        callback(false);
+    } else {
+        setTimeout(check, 25);
+    }
+})();
+"""
+
+_table_functions = """
+function cellText(el) {
+    var text = (typeof el.innerText !== "undefined") ? el.innerText : el.textContent;
+    return text.replace(/\\u00a0/g, " ").replace(/^\\s+|\\s+$/g, "");
+}
+function childElements(el, tags) {
+    var children = [];
+    for (var i = 0; i < el.children.length; i++) {
+        if (tags.indexOf(el.children[i].tagName.toLowerCase()) >= 0) {
+            children.push(el.children[i]);
+        }
+    }
+    return children;
+}
+"""
+
+# Reads the text of a table's header and body cells in one go. Arguments are the header row
+# element, the body element and the number of body rows to skip. Returns a list of header texts
+# and a list of lists of body cell texts, with the same whitespace handling as WebElement.text.
+table_contents = _table_functions + """
+var headerRow = arguments[0], body = arguments[1], bodyOffset = arguments[2];
+function childTexts(el, tags) {
+    var texts = [];
+    var children = childElements(el, tags);
+    for (var i = 0; i < children.length; i++) {
+        texts.push(cellText(children[i]));
+    }
+    return texts;
+}
+var rows = [];
+var rowElements = childElements(body, ["tr"]);
+for (var i = bodyOffset; i < rowElements.length; i++) {
+    rows.push(childTexts(rowElements[i], ["td"]));
+}
+return [childTexts(headerRow, ["td", "th"]), rows];
+"""
+
+# Finds the body rows of a table whose cells match the given values. Arguments are the body
+# element, the number of body rows to skip, a list of [column index, value] pairs, and whether
+# cells only have to contain their value instead of being equal to it. Returns the matching
+# row elements.
+table_find_rows = _table_functions + """
+var body = arguments[0], bodyOffset = arguments[1], cells = arguments[2], partial = arguments[3];
+var matches = [];
+var rowElements = childElements(body, ["tr"]);
+for (var i = bodyOffset; i < rowElements.length; i++) {
+    var columns = childElements(rowElements[i], ["td"]);
+    var matched = true;
+    for (var j = 0; j < cells.length && matched; j++) {
+        var column = columns[cells[j][0]];
+        if (column === undefined) {
+            matched = false;
+        } else if (partial) {
+            matched = cellText(column).indexOf(cells[j][1]) >= 0;
+        } else {
+            matched = cellText(column) == cells[j][1];
+        }
+    }
+    if (matched) {
+        matches.push(rowElements[i]);
+    }
+}
+return matches;
+"""
+
+# Returns a list of strings that identify the page the browser is on: the URL, the title, the
+# explorer title bars, the selected tree nodes, and the open accordions.
+location_fingerprint = """
+function texts(selector, parent) {
+    var found = document.querySelectorAll(selector);
+    var texts = [];
+    for (var i = 0; i < found.length; i++) {
+        texts.push((parent ? found[i].parentNode : found[i]).textContent);
+    }
+    return texts.join("|");
+}
+return [window.location.href, document.title, texts("div[class^='dhtmlxInfoBarLabel']"),
+    texts(".selectedTreeRow, .dynatree-active"), texts("div.dhx_acc_item_arrow.item_opened", true)];
+"""
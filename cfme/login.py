@@ -114,6 +114,40 @@ def login_admin(**kwargs):
         login(username, password, **kwargs)
 
 
+def warm_up_session():
+    """
+    Logs a browser started by the browser pool in as admin
+
+    See :py:class:`utils.browser.BrowserPool`.
+
+    Returns: The :py:class:`User` that was logged in
+    """
+    login_admin()
+    return current_user()
+
+
+def adopt_warm_session(user):
+    """
+    Updates the login state after a browser warmed up by :py:func:`warm_up_session` is swapped in
+
+    Args:
+        user: The :py:class:`User` the browser is logged in as
+
+    Returns: ``False`` if the browser's session expired while it waited in the pool
+    """
+    # The page was loaded when the browser was warmed up, reload it to see if it's still logged in
+    sel.refresh()
+    if not logged_in():
+        return False
+    previous_user = current_user()
+    if previous_user is None:
+        thread_locals.current_user = user
+    elif previous_user.username != user.username:
+        # Logged in as someone else, log out so the previous user can be logged back in
+        logout()
+        thread_locals.current_user = previous_user
+
+
 def logout():
     """
     Logs out of CFME.
@@ -142,7 +176,8 @@ def current_full_name():
 
 
 def current_user():
-    return thread_locals.current_user
+    # threads other than the one that imported this module start out logged out
+    return getattr(thread_locals, 'current_user', None)
 
 
 def current_username():
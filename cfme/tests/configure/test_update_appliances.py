@@ -105,11 +105,9 @@ def appliance_set(cfme_data):
     yield appliance_set
 
     # Unregister and destroy all
-    for appliance in appliance_set.all_appliances:
-        with appliance.ssh_client() as ssh:
-            ssh.run_command('subscription-manager remove --all')
-            ssh.run_command('subscription-manager unregister')
-        appliance.destroy()
+    appliance_set.run_command(
+        'subscription-manager remove --all; subscription-manager unregister')
+    appliance_set.run('destroy')
 
 
 def update_registration(appliance_set, rh_updates_data, reg_method):
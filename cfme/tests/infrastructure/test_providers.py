@@ -123,7 +123,10 @@ def test_providers_discovery(provider_crud):
 
 
 @pytest.mark.usefixtures('has_no_infra_providers')
-def test_provider_add_with_bad_credentials(provider_crud):
+def test_provider_add_with_bad_credentials(request, provider_crud):
+    # provider_crud is shared by the whole session, so give it back its good credentials
+    good_credentials = provider_crud.credentials
+    request.addfinalizer(lambda: setattr(provider_crud, 'credentials', good_credentials))
     provider_crud.credentials = provider.get_credentials_from_config('bad_credentials')
     if isinstance(provider_crud, provider.VMwareProvider):
         with error.expected('Cannot complete login due to an incorrect user name or password.'):
@@ -135,13 +138,15 @@ def test_provider_add_with_bad_credentials(provider_crud):
 
 @pytest.mark.smoke
 @pytest.mark.usefixtures('has_no_infra_providers')
-def test_provider_crud(provider_crud):
+def test_provider_crud(request, provider_crud):
     """ Tests that a provider can be added """
+    # provider_crud is shared by the whole session, so give it back its name if renaming fails
+    old_name = provider_crud.name
+    request.addfinalizer(lambda: setattr(provider_crud, 'name', old_name))
     provider_crud.create()
     # Fails on upstream, all provider types - BZ1087476
     provider_crud.validate()
 
-    old_name = provider_crud.name
     with update(provider_crud):
         provider_crud.name = str(uuid.uuid4())  # random uuid
 
@@ -6,6 +6,7 @@
 
   * :py:class:`Region`
   * :py:mod:`cfme.web_ui.menu`
+  * :py:mod:`cfme.web_ui.navigation`
 
 * **Elemental**
 
@@ -49,7 +50,7 @@ from selenium.common.exceptions import NoSuchElementException, MoveTargetOutOfBo
 from multimethods import multimethod, multidispatch, Anything
 
 import cfme.fixtures.pytest_selenium as sel
-from cfme import exceptions
+from cfme import exceptions, js
 from cfme.fixtures.pytest_selenium import browser
 from utils import version
 # For backward compatibility with code that pulls in Select from web_ui instead of sel
@@ -220,6 +221,15 @@ class Table(object):
             # All of these will work, though the first is preferred
             row.row_name, row['row_name'], row['Row Name']
 
+    The text of a whole page of the table can be read in one go, which is much faster than
+    reading it cell by cell through rows, and can be searched without going back to the browser::
+
+        headers, rows = table.read_all()
+        for row in table.iter_dicts():
+            row['row_name']
+        snapshot = table.snapshot()
+        sel.click(snapshot.find_row('name', 'Mike'))
+
     When doing bulk opererations, such as selecting rows in a table based on their content,
     the ``*_by_cells`` methods are able to find matching row much more quickly than iterating,
     as the work can be done with fewer selenium calls.
@@ -306,8 +316,9 @@ class Table(object):
         attribute.
         """
         self._headers = sel.elements('td | th', root=self.header_row)
+        # Comparing WebElements is a selenium call, so don't use self.headers.index(cell)
         self._header_indexes = {
-            self._convert_header(cell.text): self.headers.index(cell) for cell in self.headers}
+            self._convert_header(cell.text): index for index, cell in enumerate(self.headers)}
 
     def rows(self):
         """A generator method holding the Row objects
@@ -322,6 +333,42 @@ class Table(object):
         for row_element in row_elements[index:]:
             yield self.create_row_from_element(row_element)
 
+    def read_all(self):
+        """Reads the text of every cell on the current page of this table at once
+
+        Unlike :py:meth:`rows`, which needs a selenium call for every cell that gets looked at,
+        the whole table is read in a single javascript call.
+
+        Returns: A tuple of ``(headers, rows)``, where ``headers`` is a list of the header cell
+            texts, and ``rows`` is a list of the lists of cell texts in each body row.
+
+        """
+        return browser().execute_script(
+            js.table_contents, self.header_row, self.body, self.body_offset)
+
+    def iter_dicts(self):
+        """A generator of the contents of the rows on the current page of this table
+
+        Reads the table with :py:meth:`read_all`.
+
+        Yields:
+            A dict of converted header name: cell text for each row, with header names
+            converted the same way as :py:attr:`header_indexes`.
+        """
+        headers, rows = self.read_all()
+        headers = map(self._convert_header, headers)
+        for row in rows:
+            yield dict(zip(headers, row))
+
+    def snapshot(self):
+        """Reads the current page of this table with :py:meth:`read_all` for local lookups
+
+        Returns: A :py:class:`Table.Snapshot` of this table
+
+        """
+        headers, rows = self.read_all()
+        return Table.Snapshot(self, headers, rows)
+
     def find_row(self, header, value):
         """
         Finds a row in the Table by iterating through each visible item.
@@ -360,12 +407,26 @@ class Table(object):
         except IndexError:
             return None
 
+    def _column_index(self, header, header_indexes=None):
+        """Column index for a header name or index, see :py:meth:`Table.Row.__getitem__`
+
+        Header names are looked up in ``header_indexes`` if given, instead of
+        :py:attr:`header_indexes`.
+        """
+        if isinstance(header, int):
+            return header
+        if header_indexes is None:
+            header_indexes = self.header_indexes
+        return header_indexes[self._convert_header(header)]
+
     def find_rows_by_cells(self, cells, partial_check=False):
         """A fast row finder, based on cell content.
 
         Args:
             cells: A dict of ``header: value`` pairs or a sequence of
                 nested ``(header, value)`` pairs.
+            partial_check: If ``True``, cells only have to contain their value, instead of
+                being equal to it (default ``False``)
 
         Returns: A list of containing :py:class:`Table.Row` objects whose contents
             match all of the header: value pairs in ``cells``
@@ -373,38 +434,12 @@ class Table(object):
         """
         # accept dicts or supertuples
         cells = dict(cells)
-        cell_text_loc = './/td/descendant-or-self::*[contains(text(), "%s")]/ancestor::tr[1]'
-        matching_rows_list = list()
-        for value in cells.values():
-            # Get a root locator ready, self._body_loc is the SplitTable body locator
-            root = sel.move_to_element(self._root_loc)
-            # Get all td elements that contain the value text
-            matching_rows_list.append(sel.elements(cell_text_loc % value, root=root))
-
-        # Now, find the common row elements that matched all the input cells
-        # (though not yet matching values to headers)
-        # Why not use set intersection here? Good question!
-        # https://code.google.com/p/selenium/issues/detail?id=7011
-        rows_elements = reduce(lambda l1, l2: [item for item in l1 if item in l2],
-            matching_rows_list)
-
-        # Convert them to rows
-        # This is slow, which is why we do it after reducing the row element pile,
-        # and not when building matching_rows_list, but it makes comparing header
-        # names and expected values easy
-        rows = [self.create_row_from_element(element) for element in rows_elements]
-
-        # Only include rows where the expected values are in the right columns
-        matching_rows = list()
-        if partial_check:
-            matching_row_filter = lambda heading, value: value in row[heading].text
-        else:
-            matching_row_filter = lambda heading, value: row[heading].text == value
-        for row in rows:
-            if all(matching_row_filter(*cell) for cell in cells.items()):
-                matching_rows.append(row)
-
-        return matching_rows
+        # Match every row against every cell in the browser, which takes one selenium call
+        # no matter how big the table is
+        column_cells = [[self._column_index(header), value] for header, value in cells.items()]
+        rows_elements = browser().execute_script(
+            js.table_find_rows, self.body, self.body_offset, column_cells, bool(partial_check))
+        return [self.create_row_from_element(element) for element in rows_elements]
 
     def find_row_by_cells(self, cells, partial_check=False):
         """Find the first row containing cells
@@ -571,6 +606,113 @@ class Table(object):
             # table.create_row_from_element(row_instance) might actually work...
             return sel.move_to_element(self.row_element)
 
+    class Snapshot(object):
+        """The text contents of a :py:class:`Table` page, as read by :py:meth:`Table.snapshot`
+
+        Rows can be found without going back to the browser, and a row's elements are only
+        looked up when they are needed, such as when clicking on a row.
+
+        Args:
+            table: The :py:class:`Table` this snapshot was taken of
+            headers: A list of header cell texts
+            rows: A list of the lists of cell texts in each body row
+
+        Usage:
+
+            snapshot = table.snapshot()
+            row = snapshot.find_row_by_cells({'name': 'Mike', 'animal': 'Tiger'})
+            row.size  # 'Large', without any selenium calls
+            sel.click(row)
+
+        Note:
+
+            The snapshot is not updated if the table changes, so take a new one afterwards.
+
+        """
+        def __init__(self, table, headers, rows):
+            self.table = table
+            self.headers = headers
+            self.header_indexes = {
+                table._convert_header(header): index for index, header in enumerate(headers)}
+            self.rows = [Table.Snapshot.Row(self, index, row) for index, row in enumerate(rows)]
+
+        def column_index(self, header):
+            """Column index for a header name or index, see :py:meth:`Table.Row.__getitem__`"""
+            return self.table._column_index(header, self.header_indexes)
+
+        def find_row(self, header, value):
+            """See :py:meth:`Table.find_row`"""
+            return self.find_row_by_cells({header: value})
+
+        def find_rows_by_cells(self, cells, partial_check=False):
+            """See :py:meth:`Table.find_rows_by_cells`"""
+            cells = [(self.column_index(header), value) for header, value in dict(cells).items()]
+            if partial_check:
+                matches = lambda text, value: value in text
+            else:
+                matches = lambda text, value: text == value
+            return [row for row in self.rows
+                if all(matches(row[index], value) for index, value in cells)]
+
+        def find_row_by_cells(self, cells, partial_check=False):
+            """See :py:meth:`Table.find_row_by_cells`"""
+            try:
+                return self.find_rows_by_cells(cells, partial_check=partial_check)[0]
+            except IndexError:
+                return None
+
+        class Row(object):
+            """A row in a :py:class:`Table.Snapshot`
+
+            Works like :py:class:`Table.Row`, except that cells are accessed as their text.
+
+            Args:
+                snapshot: :py:class:`Table.Snapshot` containing this row
+                index: Index of this row in the table body, not counting the body offset
+                columns: A list of cell texts in this row
+
+            """
+            def __init__(self, snapshot, index, columns):
+                self.snapshot = snapshot
+                self.index = index
+                self.columns = columns
+
+            def __getattr__(self, name):
+                """
+                Returns cell text by header name
+                """
+                if name.startswith('_') or name in ('snapshot', 'columns'):
+                    raise AttributeError(name)
+                try:
+                    return self.columns[self.snapshot.header_indexes[name]]
+                except (KeyError, IndexError):
+                    raise AttributeError(name)
+
+            def __getitem__(self, index):
+                """
+                Returns cell text by header index or name
+                """
+                return self.columns[self.snapshot.column_index(index)]
+
+            def __str__(self):
+                return ", ".join(["'%s'" % text for text in self.columns])
+
+            @property
+            def row_element(self):
+                """The ``<tr>`` WebElement of this row, looked up when requested"""
+                table = self.snapshot.table
+                # xpath is 1-indexed
+                return sel.element(
+                    'tr[%d]' % (table.body_offset + self.index + 1), root=table.body)
+
+            def element(self, index):
+                """The ``<td>`` WebElement of a cell in this row, by header index or name"""
+                return sel.elements('td', root=self.row_element)[
+                    self.snapshot.column_index(index)]
+
+            def locate(self):
+                return sel.move_to_element(self.row_element)
+
 
 class SplitTable(Table):
     """:py:class:`Table` that supports the header and body rows being in separate tables
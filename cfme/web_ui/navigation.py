@@ -0,0 +1,147 @@
+"""Navigation that keeps track of where the browser is.
+
+:py:func:`go_to` navigates the :py:mod:`ui_navigate` tree just like :py:func:`ui_navigate.go_to`,
+but it remembers which destination it reached, along with a fingerprint of that page (the URL,
+title, explorer title bar, selected tree node and open accordion). The next time it navigates,
+if the browser is still on that page and the destination is that page or one below it in the nav
+tree, the steps that led there are skipped instead of being taken again from the top menu. The
+destination's own step is always taken, so that it is reloaded fresh, without anything left
+filled in on it.
+
+Every navigation step that is skipped is counted in :py:data:`stats`, which is written to the
+perflog at the end of the test run, so the gain across a run can be measured.
+
+Usage:
+
+    from cfme.web_ui import navigation
+
+    navigation.go_to('infrastructure_provider', context={'provider': provider})
+    # Only the step from the provider page to its edit page is taken
+    navigation.go_to('infrastructure_provider_edit', context={'provider': provider})
+
+Note:
+
+    A shortened navigation that fails is retried once from the top of the nav tree, in case the
+    page only looked like the one that was navigated to last.
+
+"""
+import threading
+
+import ui_navigate as nav
+
+from cfme import js
+from cfme.fixtures import pytest_selenium as sel
+from utils.log import logger, perflog
+
+#: Navigation counters for the whole test run
+stats = {
+    # calls to go_to
+    'navigations': 0,
+    # nav steps taken
+    'steps': 0,
+    # nav steps skipped because the browser was already past them
+    'steps_skipped': 0,
+    # shortened navigations that failed and were taken again from the top
+    'retries': 0,
+}
+
+# The last (destination, context, fingerprint) reached in this thread's browser
+_state = threading.local()
+# Nav step names and functions by destination, for the nav tree they were found in
+_paths = {'tree': None}
+
+
+def _fingerprint():
+    return tuple(sel.browser().execute_script(js.location_fingerprint))
+
+
+def _path(dest):
+    """Names and functions of the nav steps from the top of the nav tree to dest"""
+    tree = nav.nav_tree
+    if _paths['tree'] is not tree:
+        # Branches were added, which replaces the tree
+        _paths.clear()
+        _paths['tree'] = tree
+    if dest not in _paths:
+        path = nav.tree_path(dest, tree)
+        if path is None:
+            raise ValueError("Destination not found in navigation tree: %s" % dest)
+        _paths[dest] = ([tree[0]] + path, nav.tree_find(tree, path))
+    return _paths[dest]
+
+
+def forget():
+    """Forget where the browser is, so the next navigation starts from the top"""
+    _state.location = None
+
+
+def current_location():
+    """Name of the nav destination the browser is on, if :py:func:`go_to` took it there
+
+    Returns: The destination name, or ``None`` if the browser has moved on since, or the
+        destination isn't known.
+    """
+    location = getattr(_state, 'location', None)
+    if location is not None:
+        try:
+            if _fingerprint() == location[2]:
+                return location[0]
+        except Exception:
+            # No browser, or a page the fingerprint can't be taken on
+            pass
+    forget()
+    return None
+
+
+def _take_steps(steps, context):
+    for step in steps:
+        step(context)
+        stats['steps'] += 1
+
+
+def go_to(dest, start=None, context=None):
+    """Navigates to dest, skipping the steps the browser has already taken
+
+    Takes the same arguments as :py:func:`ui_navigate.go_to`. If ``start`` is given, the
+    navigation is left to :py:mod:`ui_navigate` without any steps being skipped.
+
+    Raises:
+        ValueError: If dest isn't in the nav tree
+    """
+    stats['navigations'] += 1
+    if start is not None:
+        forget()
+        nav.go_to(dest, start=start, context=context)
+        return
+
+    names, steps = _path(dest)
+    here = current_location()
+    location = getattr(_state, 'location', None)
+    skip = 0
+    if here in names and location[1] == context:
+        # Already at dest or on the way there with the same context, carry on from here. The
+        # fingerprint doesn't cover forms or flash messages, so dest's own step is always taken
+        skip = min(names.index(here) + 1, len(names) - 1)
+        logger.debug('Already at %s, skipping %d navigation steps to %s' % (here, skip, dest))
+    forget()
+    try:
+        _take_steps(steps[skip:], context)
+    except Exception:
+        if not skip:
+            raise
+        logger.info('Navigating to %s from %s failed, navigating from the top' % (dest, here))
+        stats['retries'] += 1
+        skip = 0
+        _take_steps(steps, context)
+    stats['steps_skipped'] += skip
+    try:
+        _state.location = (dest, context, _fingerprint())
+    except Exception:
+        # Can't take the fingerprint of the page, so there's no telling if it's still there later
+        pass
+
+
+def log_stats():
+    """Writes :py:data:`stats` to the perflog"""
+    perflog.logger.info('navigation: %(navigations)d navigations, %(steps)d steps taken, '
+        '%(steps_skipped)d steps skipped, %(retries)d retries' % stats)
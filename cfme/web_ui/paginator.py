@@ -1,9 +1,25 @@
-"""A set of functions for dealing with the paginator controls."""
+"""A set of functions for dealing with the paginator controls.
+
+Looping over every page of a long list is slow, as each page is a page load. To keep that to a
+minimum, :py:func:`pages` and the functions built on it can first raise the number of results
+per page to its maximum, so that whatever is being looked for is most likely on the first page::
+
+    # Find a VM's quadicon
+    paginator.find_element(Quadicon(vm_name, 'vm'), max_per_page=True)
+
+    # Loop over all pages, with as many results per page as possible
+    for page in paginator.pages(max_per_page=True):
+        pass
+
+:py:func:`go_to_page` goes to a page by its number, using the First and Last buttons to avoid
+stepping through pages where possible.
+"""
 from cfme.web_ui import Select
 import cfme.fixtures.pytest_selenium as sel
 import re
 from selenium.common.exceptions import NoSuchElementException
 from functools import partial
+from math import ceil
 
 _locator = '(//div[@id="paging_div"] | //div[@id="records_div"])'
 _next = '//img[@alt="Next"]'
@@ -68,6 +84,35 @@ def results_per_page(num):
     sel.select(Select(select), sel.ByText(str(num)))
 
 
+def results_per_page_options():
+    """ Returns the available numbers of results per page, as ints."""
+    select = Select(sel.element(_locator + _num_results))
+    return [int(sel.text(option)) for option in select.options]
+
+
+def current_results_per_page():
+    """ Returns the number of results per page currently selected."""
+    select = Select(sel.element(_locator + _num_results))
+    return int(sel.text(select.first_selected_option))
+
+
+def max_results_per_page():
+    """ Changes the number of results on a page to the largest available, if not already set.
+
+    Does nothing if there is no results per page setting on the page.
+
+    Returns: ``True`` if the setting was changed, ``False`` otherwise
+    """
+    try:
+        num = max(results_per_page_options())
+        if current_results_per_page() == num:
+            return False
+    except NoSuchElementException:
+        return False
+    results_per_page(num)
+    return True
+
+
 def sort_by(sort):
     """ Changes the sort by field.
 
@@ -102,21 +147,75 @@ def rec_total():
         return None
 
 
+def _records():
+    # (offset, end, total) of the current page, as ints
+    nums = _page_nums()
+    offset = int(re.search('\((Item|Items)*\s*(\d+)', nums).groups()[1])
+    total = re.search('(\d+)\)', nums)
+    total = int(total.groups()[0]) if total else 0
+    end = re.search('-(\d+)', nums)
+    end = int(end.groups()[0]) if end else total
+    return offset, end, total
+
+
+def current_page():
+    """ Returns the number of the current page, starting from 1."""
+    offset, end, total = _records()
+    return (offset - 1) // current_results_per_page() + 1
+
+
+def page_count():
+    """ Returns the total number of pages."""
+    offset, end, total = _records()
+    return max(int(ceil(float(total) / current_results_per_page())), 1)
+
+
+def go_to_page(page):
+    """ Goes to a page by its number, starting from 1.
+
+    The paginator has no control for going to a page directly, so First or Last are used to get
+    as close to the page as possible, before going page by page from there.
+
+    Args:
+        page: Number of the page to go to
+
+    Raises:
+        ValueError: If the page does not exist
+    """
+    count = page_count()
+    if not 1 <= page <= count:
+        raise ValueError('Page {} does not exist, there are {} pages'.format(page, count))
+    current = current_page()
+    # Start from wherever is closest to the page; the current page, the first, or the last
+    start = min([current, 1, count], key=lambda start: abs(page - start))
+    if start != current:
+        sel.click(first() if start == 1 else last())
+    step = next if page > start else previous
+    for i in range(abs(page - start)):
+        sel.click(step())
+
+
 def reset():
     """Reset the paginator to the first page or do nothing if no pages"""
     if 'dimmed' not in first().get_attribute('class'):
         sel.click(first())
 
 
-def pages():
+def pages(max_per_page=False):
     """A generator to facilitate looping over pages
 
+    Args:
+        max_per_page: If ``True``, set the number of results per page to the maximum first,
+            so that there are as few pages as possible (default ``False``)
+
     Usage:
 
         for page in pages():
             # Do seleniumy things here, like finding and clicking elements
 
     """
+    if max_per_page:
+        max_results_per_page()
     # Reset the paginator, then yield the first page
     reset()
     yield
@@ -126,19 +225,33 @@ def pages():
         yield
 
 
-def find(pred):
-    """Advance the pages until pred (a no-arg function) is true."""
-    for page in pages():
+def find(pred, max_per_page=False):
+    """Advance the pages until pred (a no-arg function) is true.
+
+    Args:
+        pred: A no-arg function that returns ``True`` on the page that is being looked for
+        max_per_page: See :py:func:`pages`
+
+    Returns: ``True`` if pred was true on any page, otherwise ``False``
+    """
+    for page in pages(max_per_page=max_per_page):
         if pred():
-            break
+            return True
+    return False
+
+
+def find_element(el, **kwargs):
+    '''Advance the pages until the given element is displayed
 
+    Takes the same keyword arguments as :py:func:`find`.
+    '''
+    return find(partial(sel.is_displayed, el), **kwargs)
 
-def find_element(el):
-    '''Advance the pages until the given element is displayed'''
-    find(partial(sel.is_displayed, el))
 
+def click_element(el, **kwargs):
+    '''Advance the page until the given element is displayed, and click it
 
-def click_element(el):
-    '''Advance the page until the given element is displayed, and click it'''
-    find_element(el)
+    Takes the same keyword arguments as :py:func:`find`.
+    '''
+    find_element(el, **kwargs)
     sel.click(el)
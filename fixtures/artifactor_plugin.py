@@ -17,9 +17,14 @@
 
 ``reuse_dir`` if this is False and Artifactor comes across a dir that has
 already been used, it will die
+
+``transport`` is ``tcp`` (default) or ``unix``. The ``unix`` transport keeps a connection open
+from each slave to a unix domain socket at ``server_socket``, and runs hooks on
+``server_workers`` threads; see :py:mod:`artifactor.transport`.
 """
 
 from artifactor import ArtifactorClient
+from artifactor.transport import UnixHookClient, default_socket_path
 import pytest
 from urlparse import urlparse
 from utils import log
@@ -40,11 +45,16 @@ class DummyClient(object):
 art_config = env.get('artifactor', {})
 
 if art_config:
-    # If server_port isn't set, pick a random port
-    if 'server_port' not in art_config:
-        port = random_port()
-        art_config['server_port'] = port
-    art_client = ArtifactorClient(art_config['server_address'], art_config['server_port'])
+    if art_config.get('transport', 'tcp') == 'unix':
+        if 'server_socket' not in art_config:
+            art_config['server_socket'] = default_socket_path()
+        art_client = UnixHookClient(art_config['server_socket'])
+    else:
+        # If server_port isn't set, pick a random port
+        if 'server_port' not in art_config:
+            port = random_port()
+            art_config['server_port'] = port
+        art_client = ArtifactorClient(art_config['server_address'], art_config['server_port'])
 else:
     art_client = DummyClient()
 
@@ -64,7 +74,10 @@ def pytest_configure(config):
         return
 
     if SLAVEID:
-        art_client.port = config.option.artifactor_port
+        if isinstance(art_client, UnixHookClient):
+            art_client.path = config.option.artifactor_socket
+        else:
+            art_client.port = config.option.artifactor_port
     else:
         import artifactor
         from artifactor.plugins import merkyl, logger, video, filedump, reporter
@@ -95,16 +108,24 @@ def pytest_configure(config):
         art.fire_hook('start_session', run_id=config.getvalue('run_id'))
 
         # Stash this where slaves can find it
-        config.option.artifactor_port = art_client.port
-        log.logger.info('artifactor listening on port %d', art_client.port)
+        if isinstance(art_client, UnixHookClient):
+            config.option.artifactor_socket = art_client.path
+            log.logger.info('artifactor listening on %s', art_client.path)
+        else:
+            config.option.artifactor_port = art_client.port
+            log.logger.info('artifactor listening on port %d', art_client.port)
 
 
 def pytest_runtest_protocol(item):
+    # Send any log messages queued so far, so they don't end up in this test's log
+    log.logger.flush()
     art_client.fire_hook('start_test', test_location=item.location[0], test_name=item.location[2],
                          slaveid=SLAVEID)
 
 
 def pytest_runtest_teardown(item, nextitem):
+    # Make sure the test's log is complete before finishing it
+    log.logger.flush()
     art_client.fire_hook('finish_test', test_location=item.location[0], test_name=item.location[2],
                          slaveid=SLAVEID)
 
@@ -123,6 +144,13 @@ def pytest_runtest_logreport(report):
 @pytest.mark.trylast
 def pytest_unconfigure():
     if not SLAVEID:
-        art_client.fire_hook('finish_session')
+        if isinstance(art_client, UnixHookClient):
+            # Wait for the final report, the server goes away with this process
+            import artifactor
+            art_client.fire_hook('finish_session', grab_result=True)
+            art_client.close()
+            artifactor.artifactor.stop_server()
+        else:
+            art_client.fire_hook('finish_session')
 
 atexit.register(art_client.fire_hook, 'finish_session')
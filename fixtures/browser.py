@@ -1,3 +1,5 @@
+import sys
+
 import pytest
 from py.error import ENOENT
 from selenium.common.exceptions import WebDriverException
@@ -84,6 +86,11 @@ def pytest_exception_interact(node, call, report):
 
 
 def pytest_sessionfinish(session, exitstatus):
+    # Log navigation stats if anything was navigated to in this process
+    cfme_navigation = sys.modules.get('cfme.web_ui.navigation')
+    if cfme_navigation is not None and cfme_navigation.stats['navigations']:
+        cfme_navigation.log_stats()
+
     failed_tests_template = template_env.get_template('failed_browser_tests.html')
     outfile = log_path.join('failed_browser_tests.html')
 
@@ -32,3 +32,7 @@ def db(uses_db):
 def db_yamls(db):
     """Returns a mapping of database yaml names to the yaml contents serialized in python"""
     return utils.db.db_yamls(db)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    utils.db.log_pool_stats()
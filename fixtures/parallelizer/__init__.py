@@ -1,6 +1,6 @@
 import difflib
 import Queue as queue
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict, deque
 
 import execnet
 import py
@@ -10,11 +10,16 @@ from _pytest import runner
 from fixtures.terminalreporter import reporter
 from utils.conf import env, runtime
 from utils.log import create_sublogger
+from utils.timedb import TimingDB
 
 
 _appliance_help = '''specify appliance URLs to use for distributed testing.
 this option can be specified more than once, and must be specified at least two times'''
 
+_scheduler_help = '''test scheduler to use for distributed testing, one of "modscope" (the default),
+which sends tests to slaves one module at a time in collection order, or "duration", which uses
+test durations from previous runs to balance the load between slaves'''
+
 env_base_urls = env.get('parallel_base_urls', [])
 if env_base_urls:
     runtime['env']['base_url'] = env_base_urls[0]
@@ -28,6 +33,8 @@ def pytest_addoption(parser):
     group = parser.getgroup("cfme")
     group._addoption('--appliance', dest='appliances', action='append',
         default=env_base_urls, metavar='base_url', help=_appliance_help)
+    group._addoption('--scheduler', dest='scheduler', default='modscope',
+        choices=('modscope', 'duration'), help=_scheduler_help)
 
 # -------------------------------------------------------------------------
 # distributed testing initialization
@@ -54,6 +61,7 @@ class DSession(object):
         self.log = create_sublogger('dsession')
         self.maxfail = config.getvalue("maxfail")
         self.queue = queue.Queue()
+        self.timings = TimingDB()
         self._failed_collection_errors = {}
         self.terminal = reporter()
         self.trdist = TerminalDistReporter(config)
@@ -78,6 +86,10 @@ class DSession(object):
         if nm is not None:
             nm.teardown_nodes()
 
+    def pytest_unconfigure(self, config):
+        # Not in sessionfinish, pytest_terminal_summary still reads the timings after that
+        self.timings.close()
+
     def pytest_collection(self):
         # prohibit collection of test items in master process
         return True
@@ -85,7 +97,11 @@ class DSession(object):
     def pytest_runtestloop(self):
         # Should be one node per appliance
         numnodes = len(self.nodemanager.specs)
-        self.sched = ModscopeScheduling(numnodes)
+        self.durations = self.timings.test_durations()
+        if self.config.getvalue('scheduler') == 'duration':
+            self.sched = DurationScheduling(numnodes, self.durations)
+        else:
+            self.sched = ModscopeScheduling(numnodes)
         self.shouldstop = False
         self.session_finished = False
         while not self.session_finished:
@@ -151,8 +167,8 @@ class DSession(object):
         if not self.sched.hasnodes():
             self.session_finished = True
 
-    def slave_collectionfinish(self, node, ids):
-        self.sched.addnode_collection(node, ids)
+    def slave_collectionfinish(self, node, ids, groups=None):
+        self.sched.addnode_collection(node, ids, groups)
         if self.terminal:
             self.trdist.setstatus(node.gateway.spec, "[%d]" % (len(ids)))
 
@@ -162,9 +178,28 @@ class DSession(object):
                 self.terminal.write_line("")
                 self.terminal.write_line("scheduling tests via %s" % (
                     self.sched.__class__.__name__))
+                self.report_estimate(ids)
 
             self.sched.init_distribute()
 
+    def report_estimate(self, ids):
+        known = [self.durations[nodeid] for nodeid in ids if nodeid in self.durations]
+        if not known:
+            return
+        numnodes = len(self.nodemanager.specs)
+        self.report_line("timing data known for %d of %d tests, estimated %d minutes of "
+            "testing, about %d minutes on %d appliances" % (len(known), len(ids),
+            sum(known) / 60, sum(known) / 60 / numnodes, numnodes))
+
+    def pytest_terminal_summary(self, terminalreporter):
+        regressions = self.timings.regressions()
+        if not regressions:
+            return
+        terminalreporter.write_sep("=", "tests slower than usual")
+        for nodeid, duration, stats in regressions:
+            terminalreporter.write_line("%.1fs (95%% of %d previous runs under %.1fs) %s" % (
+                duration, stats.count, stats.p95, nodeid))
+
     def slave_logstart(self, node, nodeid, location):
         self.config.hook.pytest_runtest_logstart(
             nodeid=nodeid, location=location)
@@ -174,6 +209,8 @@ class DSession(object):
             if rep.when in ("setup", "call"):
                 self.sched.remove_item(node, rep.item_index, rep.duration)
         # self.report_line("testreport %s: %s" %(rep.id, rep.status))
+        self.timings.record_report(rep, node.slaveinfo.get('appliance_version'),
+            getattr(rep, 'provider', None))
         rep.node = node
         self.config.hook.pytest_runtest_logreport(report=rep)
         self._handlefailures(rep)
@@ -226,6 +263,7 @@ class ModscopeScheduling(object):
         self.numnodes = numnodes
         self.node2pending = OrderedDict()
         self.node2collection = OrderedDict()
+        self.node2groups = OrderedDict()
         self.log = create_sublogger('scheduler')
         self.pending = []
         self.collection_is_completed = False
@@ -246,11 +284,12 @@ class ModscopeScheduling(object):
         #        return False
         return True
 
-    def addnode_collection(self, node, collection):
+    def addnode_collection(self, node, collection, groups=None):
         self.log.debug('addnode collection: %r', collection)
         assert not self.collection_is_completed
         assert node in self.node2pending
         self.node2collection[node] = list(collection)
+        self.node2groups[node] = groups
         if len(self.node2collection) >= self.numnodes:
             self.collection_is_completed = True
 
@@ -278,6 +317,15 @@ class ModscopeScheduling(object):
         return crashitem
 
     def init_distribute(self):
+        col = self._check_collections()
+        self.pending[:] = range(len(col))
+        if not col:
+            return
+
+        for node in self.node2pending:
+            self.send_tests(node)
+
+    def _check_collections(self):
         assert self.collection_is_completed
         # XXX allow nodes to have different collections
         node_collection_items = list(self.node2collection.items())
@@ -291,12 +339,7 @@ class ModscopeScheduling(object):
             )
 
         self.collection = col
-        self.pending[:] = range(len(col))
-        if not col:
-            return
-
-        for node in self.node2pending:
-            self.send_tests(node)
+        return col
 
     # f = open("/tmp/sent", "w")
     def send_tests(self, node):
@@ -347,6 +390,153 @@ class ModscopeScheduling(object):
                     module_indices_cache[:] = []
 
 
+class DurationScheduling(ModscopeScheduling):
+    """Longest-processing-time-first scheduling with work stealing
+
+    Tests are split into groups that are safe to run apart from each other (see
+    :py:func:`fixtures.parallelizer.remote.scheduling_group`). Using the test durations recorded
+    by previous runs, whole modules are queued up for slaves longest module first, each going
+    to the slave with the least work queued. Slaves are sent one group at a time, and a slave
+    with nothing left in its queue steals the last group queued for the busiest slave.
+
+    Tests that have never been run are assumed to take as long as the average test in their
+    module, or the average of all known tests if nothing in their module has been run before.
+
+    Args:
+        numnodes: Number of slave nodes
+        durations: Mapping of test nodeids to their expected durations, in seconds, usually
+            from :py:meth:`utils.timedb.TimingDB.test_durations`
+
+    """
+    #: Estimated duration, in seconds, of tests when no durations are known at all
+    default_duration = 1.0
+
+    def __init__(self, numnodes, durations):
+        super(DurationScheduling, self).__init__(numnodes)
+        self.durations = durations
+        # Queues of (estimated duration, test indices) groups, not sent to the slave yet
+        self.node2queue = OrderedDict()
+        # Nodes that asked for tests when there were none left to give them
+        self.idle = set()
+
+    def addnode(self, node):
+        super(DurationScheduling, self).addnode(node)
+        self.node2queue[node] = deque()
+
+    def tests_finished(self):
+        if not self.collection_is_completed:
+            return False
+        return not any(self.node2queue.values())
+
+    def remove_node(self, node):
+        pending = self.node2pending.pop(node)
+        queue = self.node2queue.pop(node)
+        self.idle.discard(node)
+        crashitem = None
+        if pending:
+            # the node must have crashed on the item if there are pending ones
+            crashitem = self.collection[pending.pop(0)]
+            if pending:
+                queue.appendleft((self._estimate_group(pending), pending))
+        # Hand the dead node's work to whoever has the least work queued
+        for group in queue:
+            if not self.node2queue:
+                self.log.error('no nodes left to run %d tests' % len(group[1]))
+                continue
+            self._least_busy().append(group)
+        # Slaves that already ran out of tests won't be asking for more on their own
+        for idle_node in list(self.idle):
+            self.send_tests(idle_node)
+        return crashitem
+
+    def init_distribute(self):
+        collection = self._check_collections()
+        if not collection:
+            return
+
+        groups = self.node2groups.values()[0]
+        if groups is None:
+            groups = [nodeid.split('::')[0] for nodeid in collection]
+
+        # module fspath -> group name -> test indices, all in collection order
+        modules = OrderedDict()
+        for index, (nodeid, group) in enumerate(zip(collection, groups)):
+            module = nodeid.split('::')[0]
+            modules.setdefault(module, OrderedDict()).setdefault(group, []).append(index)
+
+        self._estimates = self._estimate_collection(collection)
+        module_groups = []
+        for module, module_group in modules.items():
+            module_groups.append([(self._estimate_group(indices), indices)
+                for indices in module_group.values()])
+        module_groups.sort(key=lambda groups: sum(group[0] for group in groups), reverse=True)
+
+        for groups in module_groups:
+            self._least_busy().extend(groups)
+
+        for node, queue in self.node2queue.items():
+            self.log.info('%s: %d tests queued, estimated at %d seconds' %
+                (node.gateway.id, sum(len(group[1]) for group in queue), self._queued_time(node)))
+
+        for node in self.node2pending:
+            self.send_tests(node)
+
+    def send_tests(self, node):
+        queue = self.node2queue[node]
+        if not queue:
+            busiest = max(self.node2queue, key=self._queued_time)
+            if not self.node2queue[busiest]:
+                self.log.debug('ran out of tests!')
+                self.idle.add(node)
+                return
+            queue.append(self.node2queue[busiest].pop())
+            self.log.info('%s stole %d tests from %s' %
+                (node.gateway.id, len(queue[0][1]), busiest.gateway.id))
+
+        estimate, test_indices = queue.popleft()
+        self.idle.discard(node)
+        node.send_runtest_some(test_indices)
+        self.node2pending[node].extend(test_indices)
+        self.log.info('sending %d tests starting at %s, estimated at %d seconds' %
+            (len(test_indices), self.collection[test_indices[0]], estimate))
+
+    def _least_busy(self):
+        return self.node2queue[min(self.node2queue, key=self._queued_time)]
+
+    def _queued_time(self, node):
+        return sum(group[0] for group in self.node2queue[node])
+
+    def _estimate_group(self, indices):
+        return sum(self._estimates[index] for index in indices)
+
+    def _estimate_collection(self, collection):
+        known = {}
+        module_known = defaultdict(list)
+        for index, nodeid in enumerate(collection):
+            duration = self.durations.get(nodeid)
+            if duration is not None:
+                known[index] = duration
+                module_known[nodeid.split('::')[0]].append(duration)
+
+        if known:
+            default = sum(known.values()) / len(known)
+        else:
+            default = self.default_duration
+        self.log.info('known durations for %d of %d tests' % (len(known), len(collection)))
+
+        estimates = []
+        for index, nodeid in enumerate(collection):
+            if index in known:
+                estimates.append(known[index])
+            else:
+                module_durations = module_known.get(nodeid.split('::')[0])
+                if module_durations:
+                    estimates.append(sum(module_durations) / len(module_durations))
+                else:
+                    estimates.append(default)
+        return estimates
+
+
 def report_collection_diff(from_collection, to_collection, from_id, to_id):
     """Report the collected test difference between two nodes.
 
@@ -588,7 +778,8 @@ class SlaveController(object):
                     rep.item_index = item_index
                 self.notify_inproc(eventname, node=self, rep=rep)
             elif eventname == "collectionfinish":
-                self.notify_inproc(eventname, node=self, ids=kwargs['ids'])
+                self.notify_inproc(eventname, node=self, ids=kwargs['ids'],
+                    groups=kwargs.get('groups'))
             elif eventname == "needs_tests":
                 self.notify_inproc(eventname, node=self)
             elif eventname == "message":
@@ -2,9 +2,15 @@
 import os
 import sys
 
+from _pytest.python import scopes
+
 from utils import conf
+from utils.version import current_version
 import utils.log
 
+# Parameters and fixtures in this scope or broader have to stay on one slave
+_class_scopenum = scopes.index('class')
+
 
 class SlaveInteractor:
     def __init__(self, config, channel):
@@ -29,6 +35,8 @@ class SlaveInteractor:
     def pytest_sessionstart(self, session):
         self.session = session
         slaveinfo = getinfodict()
+        appliance_version = current_version()
+        slaveinfo['appliance_version'] = str(appliance_version) if appliance_version else None
         self.sendevent("slaveready", slaveinfo=slaveinfo)
 
     def pytest_sessionfinish(self, __multicall__, exitstatus):
@@ -83,7 +91,8 @@ class SlaveInteractor:
         self.log.debug('collection finished')
         self.sendevent("collectionfinish",
             topdir=str(session.fspath),
-            ids=[item.nodeid for item in session.items])
+            ids=[item.nodeid for item in session.items],
+            groups=[scheduling_group(item) for item in session.items])
 
     def pytest_runtest_logstart(self, nodeid, location):
         self.sendevent("logstart", nodeid=nodeid, location=location)
@@ -91,7 +100,9 @@ class SlaveInteractor:
     def pytest_runtest_logreport(self, report):
         data = serialize_report(report)
         data["item_index"] = self.item_index
-        assert self.session.items[self.item_index].nodeid == report.nodeid
+        item = self.session.items[self.item_index]
+        assert item.nodeid == report.nodeid
+        data["provider"] = item_provider(item)
         self.sendevent("testreport", data=data)
 
     def pytest_collectreport(self, report):
@@ -99,6 +110,43 @@ class SlaveInteractor:
         self.sendevent("collectreport", data=data)
 
 
+def scheduling_group(item):
+    """Name the group of tests that ``item`` needs to be run with on a single slave
+
+    Tests parametrized in the module (or broader) scope are grouped by their module and the
+    indices of those parameters, e.g. by provider key, so each group only sets up its module
+    fixtures once. Other tests that use module or class scoped fixtures keep their module
+    together in one group. Everything else is grouped by module and parametrization id.
+
+    """
+    module = item.nodeid.split('::')[0]
+    callspec = getattr(item, 'callspec', None)
+    if callspec is not None:
+        scoped_args = sorted('%s=%d' % (arg, callspec.indices.get(arg, 0))
+            for arg, scopenum in callspec._arg2scopenum.items()
+            if scopenum <= _class_scopenum)
+        if scoped_args:
+            return '%s[%s]' % (module, ','.join(scoped_args))
+
+    fixtureinfo = getattr(item, '_fixtureinfo', None)
+    fixturedefs = fixtureinfo.name2fixturedefs.values() if fixtureinfo else []
+    if any(fixturedef.scope in ('module', 'class')
+            for defs in fixturedefs for fixturedef in defs):
+        return module
+
+    if callspec is not None:
+        return '%s[%s]' % (module, callspec.id)
+    return module
+
+
+def item_provider(item):
+    """Get the key of the provider ``item`` was parametrized with, if any"""
+    funcargs = getattr(getattr(item, 'callspec', None), 'funcargs', {})
+    if 'provider_key' in funcargs:
+        return funcargs['provider_key']
+    return getattr(funcargs.get('provider_crud'), 'key', None)
+
+
 def serialize_report(rep):
     import py
     d = rep.__dict__.copy()
@@ -1,59 +1,148 @@
+import calendar
+import csv
 import datetime
+import math
+import random
+from cStringIO import StringIO
+
+
+class Waveform(object):
+    """Synthetic metric values, varying sinusoidally over time with random noise
+
+    Args:
+        base: The average value
+        amplitude: How far the value swings above and below ``base`` (default 0)
+        period: Length of one swing, as a :py:class:`datetime.timedelta` (default one day)
+        noise: Standard deviation of the random noise added to each value (default 0)
+        minimum: Values are never lower than this (default 0)
+
+    Usage:
+
+        # CPU usage peaking at 900 in the middle of the day, bottoming out at 100 at midnight
+        Waveform(500, 400, noise=50)
+
+    """
+    def __init__(self, base, amplitude=0, period=datetime.timedelta(days=1), noise=0,
+            minimum=0):
+        self.base = base
+        self.amplitude = amplitude
+        self.period = period.total_seconds()
+        self.noise = noise
+        self.minimum = minimum
+
+    def values(self, timestamps, rng=random):
+        """Values of the waveform at each of the given timestamps"""
+        radians = 2 * math.pi / self.period
+        # Troughs are at multiples of the period since the epoch, so at midnight for daily waves
+        values = [self.base - self.amplitude * math.cos(radians * calendar.timegm(ts.timetuple()))
+                  for ts in timestamps]
+        if self.noise:
+            values = [value + rng.gauss(0, self.noise) for value in values]
+        return [max(value, self.minimum) for value in values]
+
+
+def _timestamps(start, end, interval):
+    timestamps = []
+    while start <= end:
+        timestamps.append(start)
+        start += interval
+    return timestamps
+
+
+def _copy_rows(connection, table_name, column_names, rows):
+    # Loads the rows with postgres' COPY, which is much faster than INSERTs
+    data = StringIO()
+    csv.writer(data).writerows(rows)
+    data.seek(0)
+    cursor = connection.cursor()
+    cursor.copy_expert('COPY {} ({}) FROM STDIN WITH CSV'.format(
+        table_name, ', '.join('"{}"'.format(name) for name in column_names)), data)
+
+
+def insert_metrics(db, resources, start, end, interval, columns, table_name='metrics',
+        capture_interval_name='realtime', seed=None, batch_size=10000):
+    """Generates metrics for many resources over a time range, and inserts them in bulk
+
+    Rows are generated a column at a time for each resource, and loaded into the database with
+    ``COPY`` in batches of ``batch_size`` rows, all in one transaction.
+
+    Args:
+        db: A :py:class:`utils.db.Db`
+        resources: A list of resource ids, or a dict of resource ids to dicts of columns that
+            are specific to that resource, like ``resource_name``
+        start: :py:class:`datetime.datetime` of the first sample
+        end: :py:class:`datetime.datetime` of the last sample
+        interval: :py:class:`datetime.timedelta` between samples
+        columns: A dict of column names to values, which are either constants or
+            :py:class:`Waveform` s
+        table_name: ``metrics`` for realtime data, or ``metric_rollups`` (default ``metrics``)
+        capture_interval_name: ``realtime``, ``hourly`` or ``daily`` (default ``realtime``)
+        seed: Seed for the random noise, to generate the same metrics every time
+        batch_size: Number of rows sent to the database at once (default 10000)
+
+    Returns: The number of rows inserted
+
+    Usage:
+
+        # Four weeks of realtime metrics for a few VMs
+        end = datetime.datetime.utcnow().replace(microsecond=0)
+        insert_metrics(db, {vm.id: {'resource_name': vm.name} for vm in vms},
+            end - datetime.timedelta(weeks=4), end, datetime.timedelta(seconds=20),
+            {'resource_type': 'VmOrTemplate', 'cpu_usagemhz_rate_average': Waveform(500, 400)})
+
+    """
+    if not isinstance(resources, dict):
+        resources = {resource_id: {} for resource_id in resources}
+    rng = random.Random(seed)
+    timestamps = _timestamps(start, end, interval)
+    timestamp_strings = [ts.isoformat() for ts in timestamps]
+    column_names = sorted(set(columns).union(*resources.values()))
+    all_columns = ['resource_id', 'timestamp', 'capture_interval_name'] + column_names
+
+    rows = 0
+    connection = db.engine.raw_connection()
+    try:
+        for resource_id, resource_columns in sorted(resources.items()):
+            values = dict(columns, **resource_columns)
+            column_values = [[resource_id] * len(timestamps), timestamp_strings,
+                             [capture_interval_name] * len(timestamps)]
+            for name in column_names:
+                value = values.get(name)
+                if isinstance(value, Waveform):
+                    column_values.append(value.values(timestamps, rng))
+                else:
+                    column_values.append([value] * len(timestamps))
+            resource_rows = zip(*column_values)
+            for i in range(0, len(resource_rows), batch_size):
+                _copy_rows(connection, table_name, all_columns, resource_rows[i:i + batch_size])
+            rows += len(resource_rows)
+        connection.commit()
+    except:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return rows
+
+
+def _midnight_week_ago():
+    date = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return date - datetime.timedelta(days=7)
 
 
 def insert_previous_hour_raw_metric_data(db, resource_id, columns):
-    date = datetime.datetime.utcnow()
-    date = date.replace(microsecond=0)
-    date = date.replace(second=0)
-    #date = date.replace(minute=0)
-    current_time = date
-    date = date - datetime.timedelta(hours=1)
-    #previous_hour = date.hour
-    capture_interval_name = 'realtime'
-    with db.transaction:
-        while date <= current_time:
-            new_user = db['metrics'](resource_id=resource_id)
-            db.session.add(new_user)
-            new_user.timestamp = date
-            new_user.capture_interval_name = capture_interval_name
-            date = date + datetime.timedelta(seconds=20)
-            for key, value in columns.items():
-                setattr(new_user, key, value)
+    current_time = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+    insert_metrics(db, [resource_id], current_time - datetime.timedelta(hours=1), current_time,
+        datetime.timedelta(seconds=20), columns, 'metrics', 'realtime')
 
 
 def insert_previous_weeks_hourly_rollups(db, resource_id, columns):
-    date = datetime.datetime.utcnow()
-    capture_interval_name = 'hourly'
-    date = date.replace(microsecond=0)
-    date = date.replace(second=0)
-    date = date.replace(minute=0)
-    date = date.replace(hour=0)
-    date = date - datetime.timedelta(days=7)
-    with db.transaction:
-        for x in range(0, 168):
-            new_user = db['metric_rollups'](resource_id=resource_id)
-            db.session.add(new_user)
-            new_user.timestamp = date
-            new_user.capture_interval_name = capture_interval_name
-            date = date + datetime.timedelta(hours=1)
-            for key, value in columns.items():
-                setattr(new_user, key, value)
+    date = _midnight_week_ago()
+    insert_metrics(db, [resource_id], date, date + datetime.timedelta(hours=167),
+        datetime.timedelta(hours=1), columns, 'metric_rollups', 'hourly')
 
 
 def insert_previous_weeks_daily_rollups(db, resource_id, columns):
-    date = datetime.datetime.utcnow()
-    capture_interval_name = 'daily'
-    date = date.replace(microsecond=0)
-    date = date.replace(second=0)
-    date = date.replace(minute=0)
-    date = date.replace(hour=0)
-    date = date - datetime.timedelta(days=7)
-    with db.transaction:
-        for x in range(0, 7):
-            new_user = db['metric_rollups'](resource_id=resource_id)
-            db.session.add(new_user)
-            new_user.timestamp = date
-            new_user.capture_interval_name = capture_interval_name
-            date = date + datetime.timedelta(days=1)
-            for key, value in columns.items():
-                setattr(new_user, key, value)
+    date = _midnight_week_ago()
+    insert_metrics(db, [resource_id], date, date + datetime.timedelta(days=6),
+        datetime.timedelta(days=1), columns, 'metric_rollups', 'daily')
@@ -1,10 +1,31 @@
+def delete_metrics(db, resource_ids, start=None, end=None, table_name='metrics',
+        capture_interval_name=None):
+    """Deletes metrics for many resources at once, in a single ``DELETE``
+
+    Args:
+        db: A :py:class:`utils.db.Db`
+        resource_ids: The resource ids to delete metrics for
+        start: Only delete metrics from this :py:class:`datetime.datetime` on
+        end: Only delete metrics up to and including this :py:class:`datetime.datetime`
+        table_name: ``metrics`` or ``metric_rollups`` (default ``metrics``)
+        capture_interval_name: Only delete metrics of this interval (default all)
+
+    Returns: The number of rows deleted
+    """
+    table = db[table_name].__table__
+    where = table.c.resource_id.in_(list(resource_ids))
+    if start is not None:
+        where &= table.c.timestamp >= start
+    if end is not None:
+        where &= table.c.timestamp <= end
+    if capture_interval_name is not None:
+        where &= table.c.capture_interval_name == capture_interval_name
+    return db.engine.execute(table.delete().where(where)).rowcount
+
+
 def delete_raw_metric_data(db, resource_id):
-    metrics = db['metrics']
-    with db.transaction:
-        db.session.query(metrics).filter(metrics.resource_id == resource_id).delete()
+    delete_metrics(db, [resource_id], table_name='metrics')
 
 
 def delete_metric_rollup_data(db, resource_id):
-    metric_rollups = db['metric_rollups']
-    with db.transaction:
-        db.session.query(metric_rollups).filter(metric_rollups.resource_id == resource_id).delete()
+    delete_metrics(db, [resource_id], table_name='metric_rollups')
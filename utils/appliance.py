@@ -1,23 +1,138 @@
 import os
 import subprocess
+import sys
+import time
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
 
 import requests
 
 from time import sleep
-from utils import conf, db, lazycache
+from utils import conf, db, db_queries, lazycache
 from utils.browser import browser_session
 from utils.log import logger
 from utils.path import scripts_path
 from utils.providers import provider_factory
 from utils.randomness import generate_random_string
 from utils.ssh import SSHClient
-from utils.wait import wait_for
+from utils.wait import TimedOutError, wait_for
 
 
 class ApplianceException(Exception):
     pass
 
 
+class FanOutResult(object):
+    """The outcome of running something on one of many appliances at once
+
+    Attributes:
+        appliance: The appliance (or other item) it was run on
+        value: What was returned, ``None`` if it failed
+        exc_info: ``sys.exc_info()`` of the exception raised, ``None`` if it succeeded. Runs
+            that didn't finish in time have a :py:class:`utils.wait.TimedOutError`.
+
+    """
+    def __init__(self, appliance, value=None, exc_info=None):
+        self.appliance = appliance
+        self.value = value
+        self.exc_info = exc_info
+
+    @property
+    def ok(self):
+        return self.exc_info is None
+
+    @property
+    def error(self):
+        return None if self.ok else self.exc_info[1]
+
+    def __repr__(self):
+        return '<FanOutResult {!r}: {}>'.format(
+            self.appliance, 'ok' if self.ok else repr(self.error))
+
+
+def fan_out(func, items, func_args=[], func_kwargs={}, num_sec=None):
+    """Calls ``func(item, *func_args, **func_kwargs)`` for all items at once, in threads
+
+    A failure for one item doesn't stop the others; see :py:meth:`FanOutResults.raise_failures`.
+
+    Args:
+        func: A function to be run for every item
+        items: The items to run func for, usually :py:class:`Appliance` s
+        func_args: A list of positional arguments to be passed to func after the item
+        func_kwargs: A dict of keyword arguments to be passed to func
+        num_sec: Number of seconds to wait for all of the calls to finish (default no limit).
+            Calls that are still running after that are reported as timed out, and left to
+            finish in the background.
+
+    Returns: A :py:class:`FanOutResults` of the calls, in the same order as ``items``
+
+    """
+    items = list(items)
+    results = FanOutResults()
+    if not items:
+        return results
+
+    def call(item):
+        try:
+            return FanOutResult(item, func(item, *func_args, **func_kwargs))
+        except Exception:
+            return FanOutResult(item, exc_info=sys.exc_info())
+
+    deadline = None if num_sec is None else time.time() + num_sec
+    pool = ThreadPool(len(items))
+    try:
+        async_results = [pool.apply_async(call, [item]) for item in items]
+        for item, async_result in zip(items, async_results):
+            try:
+                if deadline is None:
+                    # AsyncResult.get without a timeout can't be interrupted with ctrl-c
+                    while not async_result.ready():
+                        async_result.wait(1)
+                    results.append(async_result.get())
+                else:
+                    results.append(async_result.get(max(deadline - time.time(), 0)))
+            except TimeoutError:
+                try:
+                    raise TimedOutError('{!r} did not finish in {} seconds'.format(item, num_sec))
+                except TimedOutError:
+                    results.append(FanOutResult(item, exc_info=sys.exc_info()))
+    finally:
+        pool.close()
+    for result in results.failed:
+        logger.error('%r failed: %r', result.appliance, result.error)
+    return results
+
+
+class FanOutResults(list):
+    """A list of :py:class:`FanOutResult` s, returned by :py:func:`fan_out`"""
+    @property
+    def values(self):
+        return [result.value for result in self]
+
+    @property
+    def succeeded(self):
+        return [result for result in self if result.ok]
+
+    @property
+    def failed(self):
+        return [result for result in self if not result.ok]
+
+    def raise_failures(self):
+        """Raises an :py:class:`ApplianceException` if any of the calls failed
+
+        Returns: The values returned for each item, if all of the calls succeeded
+        """
+        failed = self.failed
+        if len(failed) == 1:
+            exc_info = failed[0].exc_info
+            raise exc_info[0], exc_info[1], exc_info[2]
+        elif failed:
+            raise ApplianceException('{} of {} failed:\n{}'.format(
+                len(failed), len(self), '\n'.join(
+                    '{!r}: {!r}'.format(result.appliance, result.error) for result in failed)))
+        return self.values
+
+
 class Appliance(object):
     """Appliance represents an already provisioned cfme appliance vm
 
@@ -37,6 +152,9 @@ class Appliance(object):
         self._provider_name = provider_name
         self.vmname = vm_name
 
+    def __repr__(self):
+        return '<Appliance {} ({})>'.format(self.name, self.vm_name)
+
     @property
     def _provider(self):
         """
@@ -150,6 +268,7 @@ class Appliance(object):
         Note:
 
             The credentials default to those found under ``ssh`` key in ``credentials.yaml``.
+            The connection to the appliance is pooled, see :py:class:`utils.ssh.TransportPool`.
         """
         connect_kwargs['hostname'] = connect_kwargs.get('hostname', self.address)
 
@@ -175,6 +294,8 @@ class Appliance(object):
         args = [str(script), self.address]
         with open(os.devnull, 'w') as f_devnull:
             status = subprocess.call(args, stdout=f_devnull)
+        # The appliance may be in another region now
+        db_queries.clear_cache()
         if status != 0:
             raise ApplianceException('Appliance {} failed to enable internal DB'
                                      .format(self.address))
@@ -193,6 +314,8 @@ class Appliance(object):
         args = [str(script), self.address, db_address, '--region', str(region)]
         with open(os.devnull, 'w') as f_devnull:
             status = subprocess.call(args, stdout=f_devnull)
+        # The appliance may be in another region now
+        db_queries.clear_cache()
         if status != 0:
             raise ApplianceException('Appliance {} failed to enable external DB running on {}'
                                      .format(self.address, db_address))
@@ -210,6 +333,7 @@ class Appliance(object):
         vmdb_config = db.get_yaml_config('vmdb', self.db)
         vmdb_config['server']['name'] = new_name
         db.set_yaml_config('vmdb', vmdb_config, self.address)
+        db_queries.clear_cache()
         self.name = new_name
 
     def restart_evm_service(self):
@@ -301,6 +425,47 @@ class ApplianceSet(object):
         all_appliances.append(self.primary)
         return all_appliances
 
+    def run(self, func, func_args=[], func_kwargs={}, num_sec=None, appliances=None):
+        """Runs something on all appliances at once
+
+        Args:
+            func: An :py:class:`Appliance` method name, or a function taking an appliance
+            func_args: A list of positional arguments to be passed to func
+            func_kwargs: A dict of keyword arguments to be passed to func
+            num_sec: Number of seconds to wait for all appliances (default no limit)
+            appliances: The appliances to run on (default :py:attr:`all_appliances`)
+
+        Returns: A :py:class:`FanOutResults`, see :py:func:`fan_out`
+
+        Usage:
+
+            appliance_set.run('fix_ntp_clock').raise_failures()
+            results = appliance_set.run('wait_for_web_ui', func_kwargs={'timeout': 900})
+            for result in results.failed:
+                logger.error('%s did not come up: %s', result.appliance.name, result.error)
+
+        """
+        if not callable(func):
+            method_name = func
+
+            def func(appliance, *args, **kwargs):
+                return getattr(appliance, method_name)(*args, **kwargs)
+        if appliances is None:
+            appliances = self.all_appliances
+        return fan_out(func, appliances, func_args, func_kwargs, num_sec)
+
+    def run_command(self, command, num_sec=None, appliances=None):
+        """Runs a shell command on all appliances at once
+
+        Takes the same ``num_sec`` and ``appliances`` arguments as :py:meth:`run`.
+
+        Returns: A :py:class:`FanOutResults` with ``(exit_status, output)`` values
+        """
+        def run_command(appliance):
+            with appliance.ssh_client() as ssh:
+                return ssh.run_command(command)
+        return self.run(run_command, num_sec=num_sec, appliances=appliances)
+
     def find_by_name(self, appliance_name):
         """Finds appliance of given name
 
@@ -406,25 +571,42 @@ def provision_appliance_set(appliance_set_data, vm_name_prefix='cfme'):
     secondary_data = appliance_set_data.get('secondary_appliances') or []
     all_appliances_data = [primary_data] + secondary_data
 
+    # Appliances are provisioned at the same time, then secondaries are configured at the
+    # same time once the primary's database is ready for them
+    def provision(appliance_data):
+        return provision_appliance(appliance_data['version'], vm_name_prefix)
+
+    def configure_secondary(pair):
+        appliance, appliance_data = pair
+        appliance.configure(db_address=appliance_set.primary.address,
+                            name_to_set=appliance_data['name'])
+
     logger.info('Provisioning appliances')
-    provisioned_appliances = []
-    try:
-        for appliance_data in all_appliances_data:
-            app = provision_appliance(appliance_data['version'], vm_name_prefix)
-            provisioned_appliances.append(app)
-    except:
+    provisioned = fan_out(provision, all_appliances_data)
+    if provisioned.failed:
+        # Don't leave the appliances that were provisioned behind; failures are logged by fan_out
+        logger.info('Destroying the appliances that were provisioned')
+        fan_out(lambda appliance: appliance.destroy(),
+                [result.value for result in provisioned.succeeded])
         raise ApplianceException(
             'Failed to provision appliance set - error in provisioning stage\n'
-            'Check cfme_data yaml for errors in template names and provider setup'
+            'Check cfme_data yaml for errors in template names and provider setup\n{}'.format(
+                '\n'.join('{!r}: {!r}'.format(result.appliance, result.error)
+                          for result in provisioned.failed))
         )
-    appliance_set = ApplianceSet(provisioned_appliances[0], provisioned_appliances[1:])
+    appliance_set = ApplianceSet(provisioned.values[0], provisioned.values[1:])
     logger.info('Done - provisioning appliances')
 
     logger.info('Configuring appliances')
-    appliance_set.primary.configure(name_to_set=primary_data['name'])
-    for i, appliance in enumerate(appliance_set.secondary):
-        appliance.configure(db_address=appliance_set.primary.address,
-                            name_to_set=secondary_data[i]['name'])
+    try:
+        appliance_set.primary.configure(name_to_set=primary_data['name'])
+        fan_out(configure_secondary, zip(appliance_set.secondary, secondary_data)).raise_failures()
+    except Exception:
+        # Don't leave a half configured appliance set behind either
+        exc_info = sys.exc_info()
+        logger.info('Configuring the appliance set failed, destroying its appliances')
+        appliance_set.run('destroy')
+        raise exc_info[0], exc_info[1], exc_info[2]
     logger.info('Done - configuring appliances')
 
     return appliance_set
@@ -28,6 +28,13 @@ if 'thread_locals' not in globals():
 #: After starting a firefox browser, this will be set to the temporary
 #: directory where files are downloaded.
 firefox_profile_tmpdir = None
+# Browsers may be started in more than one thread at once with a browser pool
+_firefox_profile_lock = threading.Lock()
+
+
+#: The :py:class:`BrowserPool` used by :py:func:`start`, if one was started with
+#: :py:func:`start_pool`
+pool = None
 
 
 def browser():
@@ -40,11 +47,12 @@ def browser():
         The current browser instance.
 
     """
-    return thread_locals.browser
+    # threads other than the one that imported this module start out without a browser
+    return getattr(thread_locals, 'browser', None)
 
 
 def wharf():
-    return thread_locals.wharf
+    return getattr(thread_locals, 'wharf', None)
 
 
 def ensure_browser_open():
@@ -77,6 +85,9 @@ def start(webdriver_name=None, base_url=None, **kwargs):
 
     If a previous browser was open, it will be closed before starting the new browser
 
+    If a browser :py:data:`pool` was started, and the browser isn't being customized with
+    any arguments, a warm browser will be taken from the pool if there is one ready.
+
     Args:
         webdriver_name: The name of the selenium Webdriver to use. Default: 'Firefox'
         base_url: Optional, will use ``utils.conf.env['base_url']`` by default
@@ -84,9 +95,19 @@ def start(webdriver_name=None, base_url=None, **kwargs):
 
     """
     # Try to clean up an existing browser session if starting a new one
-    if thread_locals.browser is not None:
+    if browser() is not None:
         quit()
 
+    if (pool is not None and webdriver_name is None and not kwargs and
+            (base_url or conf.env['base_url']) == pool.base_url):
+        if pool.use_browser():
+            return thread_locals.browser
+
+    return _start(webdriver_name, base_url, **kwargs)
+
+
+def _start(webdriver_name=None, base_url=None, **kwargs):
+    # Starts a new web browser in the current thread, see start()
     browser_conf = conf.env.get('browser', {})
 
     if webdriver_name is None:
@@ -99,7 +120,8 @@ def start(webdriver_name=None, base_url=None, **kwargs):
         base_url = conf.env['base_url']
 
     # Pull in browser kwargs from browser yaml
-    browser_kwargs = browser_conf.get('webdriver_options', {})
+    # Copied, since browsers may be started in more than one thread with a browser pool
+    browser_kwargs = dict(browser_conf.get('webdriver_options', {}))
 
     # Handle firefox profile for Firefox or Remote webdriver
     if webdriver_name == 'Firefox':
@@ -115,7 +137,8 @@ def start(webdriver_name=None, base_url=None, **kwargs):
         # desired_capabilities is only for Remote driver, but can sneak in
         del(browser_kwargs['desired_capabilities'])
 
-    if webdriver_name == 'Remote' and 'webdriver_wharf' in browser_conf and not thread_locals.wharf:
+    if (webdriver_name == 'Remote' and 'webdriver_wharf' in browser_conf and
+            not getattr(thread_locals, 'wharf', None)):
         # Configured to use wharf, but it isn't configured yet; check out a webdriver container
         wharf = Wharf(browser_conf['webdriver_wharf'])
         # TODO: Error handling! :D
@@ -123,7 +146,7 @@ def start(webdriver_name=None, base_url=None, **kwargs):
         atexit.register(wharf.checkin)
         thread_locals.wharf = wharf
 
-    if thread_locals.wharf:
+    if getattr(thread_locals, 'wharf', None):
         # Wharf is configured, make sure to use its command_executor
         wharf_config = thread_locals.wharf.config
         browser_kwargs['command_executor'] = wharf_config['webdriver_url']
@@ -157,6 +180,170 @@ def quit():
         thread_locals.browser = None
 
 
+class BrowserPool(object):
+    """A pool of warm browsers, started and warmed up in background threads
+
+    Starting a browser, and logging in with it, takes a while. With a pool, :py:func:`start`
+    can swap in a browser that is ready to go, while a replacement is started in the background.
+
+    When a browser is started for the pool and there is a ``webdriver_wharf`` configured, a
+    webdriver container is checked out for that browser, which goes along with it when it's
+    taken from the pool.
+
+    Args:
+        size: Number of warm browsers to keep ready
+        base_url: URL to start the browsers with, ``utils.conf.env['base_url']`` by default
+        warmup: A function to run after starting each browser, such as logging in. It is run
+            in the background thread that started the browser, so :py:func:`browser` returns the
+            browser being warmed up. Its return value is passed to ``adopt``.
+        adopt: A function to run after a warm browser is taken from the pool, in the thread that
+            is going to use it, which is passed the return value of ``warmup``. If it returns
+            ``False`` or raises, such as when the browser has been logged out while it was
+            waiting in the pool, the browser is discarded and the next one is tried.
+
+    Usage:
+
+        start_pool(2, warmup=login.warm_up_session, adopt=login.adopt_warm_session)
+        # start() now takes warm browsers from the pool when one is ready
+        start()
+
+    """
+    def __init__(self, size, base_url=None, warmup=None, adopt=None):
+        self.size = size
+        self.base_url = base_url or conf.env['base_url']
+        self.warmup = warmup
+        self.adopt = adopt
+        self._ready = []
+        self._starting = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def fill(self):
+        """Starts browsers in the background until there are enough ready or starting"""
+        with self._lock:
+            if self._closed:
+                return
+            needed = max(self.size - len(self._ready) - self._starting, 0)
+            self._starting += needed
+        for i in range(needed):
+            thread = threading.Thread(target=self._start_browser, name='browser-pool')
+            thread.daemon = True
+            thread.start()
+
+    def _start_browser(self):
+        # Runs in a background thread, which has its own thread_locals
+        state, started = None, False
+        try:
+            _start(base_url=self.base_url)
+            state = self.warmup() if self.warmup else None
+            started = True
+        except Exception:
+            logger.exception('Could not start a browser for the browser pool')
+        entry = (browser(), wharf(), state)
+        thread_locals.browser = None
+        thread_locals.wharf = None
+        with self._lock:
+            self._starting -= 1
+            if started and not self._closed:
+                self._ready.append(entry)
+                return
+        # Either the browser didn't start, or the pool was closed while it was starting
+        self._discard(entry)
+
+    @staticmethod
+    def _discard(entry):
+        pooled_browser, pooled_wharf, state = entry
+        try:
+            pooled_browser.quit()
+        except:
+            # Diaper Pattern, see quit()
+            pass
+        if pooled_wharf:
+            pooled_wharf.checkin()
+
+    def get(self):
+        """Takes a warm browser from the pool, and starts a replacement in the background
+
+        Returns: A ``(browser, wharf, state)`` tuple, or ``None`` if no browser is ready, where
+            ``wharf`` is the :py:class:`Wharf` of the browser, if any, and ``state`` is what
+            ``warmup`` returned.
+        """
+        while True:
+            with self._lock:
+                entry = self._ready.pop(0) if self._ready else None
+            if entry is None:
+                break
+            try:
+                # Make sure the browser didn't die while waiting in the pool
+                entry[0].current_url
+                break
+            except:
+                self._discard(entry)
+        self.fill()
+        return entry
+
+    def use_browser(self):
+        """Makes a warm browser from the pool the current browser
+
+        The current browser should have been quit already, its webdriver container will be
+        checked in if the warm browser has a different one.
+
+        Returns: ``True`` if a warm browser was ready, otherwise ``False``
+        """
+        while True:
+            entry = self.get()
+            if entry is None:
+                return False
+            pooled_browser, pooled_wharf, state = entry
+            if pooled_wharf:
+                if wharf() and wharf() is not pooled_wharf:
+                    wharf().checkin()
+                thread_locals.wharf = pooled_wharf
+            thread_locals.browser = pooled_browser
+            try:
+                adopted = self.adopt(state) if self.adopt else True
+            except Exception:
+                logger.exception('Could not adopt a warm browser from the browser pool')
+                adopted = False
+            if adopted is not False:
+                logger.info('Using a warm browser from the browser pool')
+                return True
+            logger.info('Discarding a warm browser from the browser pool that can\'t be used')
+            thread_locals.browser = None
+            thread_locals.wharf = None
+            self._discard(entry)
+
+    def close(self):
+        """Quits all of the warm browsers, and stops starting new ones"""
+        with self._lock:
+            self._closed = True
+            entries, self._ready = self._ready, []
+        for entry in entries:
+            self._discard(entry)
+
+
+def start_pool(size, base_url=None, warmup=None, adopt=None):
+    """Starts the browser :py:data:`pool` used by :py:func:`start`
+
+    Takes the same arguments as :py:class:`BrowserPool`. Any previous pool is closed.
+
+    Returns: The new :py:class:`BrowserPool`
+    """
+    global pool
+    stop_pool()
+    pool = BrowserPool(size, base_url, warmup, adopt)
+    pool.fill()
+    return pool
+
+
+def stop_pool():
+    """Closes the browser :py:data:`pool`, if there is one"""
+    global pool
+    if pool is not None:
+        pool.close()
+        pool = None
+
+
 @contextmanager
 def browser_session(*args, **kwargs):
     """A context manager that can be used to start and stop a browser.
@@ -180,20 +367,21 @@ def browser_session(*args, **kwargs):
 def _load_firefox_profile():
     # create a firefox profile using the template in data/firefox_profile.js.template
     global firefox_profile_tmpdir
-    if firefox_profile_tmpdir is None:
-        firefox_profile_tmpdir = mkdtemp(prefix='firefox_profile_')
-        # Clean up tempdir at exit
-        atexit.register(rmtree, firefox_profile_tmpdir)
+    with _firefox_profile_lock:
+        if firefox_profile_tmpdir is None:
+            firefox_profile_tmpdir = mkdtemp(prefix='firefox_profile_')
+            # Clean up tempdir at exit
+            atexit.register(rmtree, firefox_profile_tmpdir)
 
-    template = data_path.join('firefox_profile.js.template').read()
-    profile_json = Template(template).substitute(profile_dir=firefox_profile_tmpdir)
-    profile_dict = json.loads(profile_json)
+        template = data_path.join('firefox_profile.js.template').read()
+        profile_json = Template(template).substitute(profile_dir=firefox_profile_tmpdir)
+        profile_dict = json.loads(profile_json)
 
-    profile = FirefoxProfile(firefox_profile_tmpdir)
-    for pref in profile_dict.iteritems():
-        profile.set_preference(*pref)
-    profile.update_preferences()
-    return profile
+        profile = FirefoxProfile(firefox_profile_tmpdir)
+        for pref in profile_dict.iteritems():
+            profile.set_preference(*pref)
+        profile.update_preferences()
+        return profile
 
 
 class DuckwebQaTestSetup(object):
@@ -261,3 +449,4 @@ class Wharf(object):
 # Convenience name, duckwebqa is stateless, so we can just make one here
 testsetup = DuckwebQaTestSetup()
 atexit.register(quit)
+atexit.register(stop_pool)
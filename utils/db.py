@@ -1,3 +1,6 @@
+import cPickle as pickle
+import os
+import time
 from collections import Mapping
 from contextlib import contextmanager
 from itertools import izip
@@ -6,33 +9,142 @@ from tempfile import NamedTemporaryFile
 
 import yaml
 from sqlalchemy import MetaData, create_engine, event, inspect
-from sqlalchemy.exc import ArgumentError, DisconnectionError, InvalidRequestError
+from sqlalchemy.exc import ArgumentError, InvalidRequestError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import Pool
+from sqlalchemy.pool import QueuePool
+from threading import Lock
 
 from utils import conf, lazycache
 from utils.datafile import load_data_file
-from utils.log import logger
-from utils.path import data_path
+from utils.log import logger, perflog
+from utils.path import data_path, log_path
 from utils.ssh import SSHClient
 
+#: Where reflected database schemas are kept between runs, see :py:attr:`Db.metadata`
+reflection_cache_path = log_path.join('db_reflection')
 
-@event.listens_for(Pool, "checkout")
-def ping_connection(dbapi_connection, connection_record, connection_proxy):
-    """ping_connection event hook, used to reconnect db sessions that time out
 
-    Note:
+class PoolStats(object):
+    """Connection pool statistics for one database, see :py:func:`pool_stats`
 
-        See also: :ref:`Connection Invalidation <sqlalchemy:pool_connection_invalidation>`
+    Attributes:
+        checkouts: Number of times a connection was taken from the pool
+        connects: Number of new database connections made
+        waits: Number of checkouts that had to wait for another connection to be returned
+        wait_time: Total time spent waiting, in seconds
+        reconnects: Number of connections thrown away because they were disconnected, to be
+            replaced by new ones
 
     """
-    cursor = dbapi_connection.cursor()
-    try:
-        cursor.execute("SELECT 1")
-    except StandardError:
-        raise DisconnectionError
-    cursor.close()
+    def __init__(self):
+        self.checkouts = 0
+        self.connects = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.reconnects = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class _MonitoredQueuePool(QueuePool):
+    # QueuePool that keeps PoolStats, including across being recreated after a disconnect
+    def __init__(self, *args, **kwargs):
+        super(_MonitoredQueuePool, self).__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super(_MonitoredQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _create_connection(self):
+        self.stats.connects += 1
+        return super(_MonitoredQueuePool, self)._create_connection()
+
+    def _do_get(self):
+        if self._overflow >= self._max_overflow > -1 and self._pool.empty():
+            # Every connection is in use, so this is going to wait for one
+            start = time.time()
+            try:
+                return super(_MonitoredQueuePool, self)._do_get()
+            finally:
+                self.stats.waits += 1
+                self.stats.wait_time += time.time() - start
+        return super(_MonitoredQueuePool, self)._do_get()
+
+
+_engines = dict()
+_engines_lock = Lock()
+
+
+def get_engine(db_url):
+    """Gets the shared :py:class:`Engine <sqlalchemy:sqlalchemy.engine.Engine>` for a database
+
+    There is one engine, and so one connection pool, for each database URL, which includes
+    the host and credentials. The pool is configured by the ``db`` section of ``env.yaml``::
+
+        db:
+            # Connections kept open, and extra connections allowed when they are all in use
+            pool_size: 5
+            max_overflow: 10
+            # Seconds to wait for a connection when the pool is exhausted
+            pool_timeout: 30
+            # Connections older than this many seconds are replaced before being used
+            pool_recycle: 3600
+
+    Connections aren't pinged when they are checked out. Connections that have been open for
+    longer than ``pool_recycle`` are replaced instead. If the database goes away anyway, the
+    statement that finds out fails, and the pool is refilled with new connections.
+
+    """
+    with _engines_lock:
+        if db_url not in _engines:
+            pool_conf = conf.env.get('db', {})
+            engine = create_engine(db_url, poolclass=_MonitoredQueuePool,
+                pool_size=pool_conf.get('pool_size', 5),
+                max_overflow=pool_conf.get('max_overflow', 10),
+                pool_timeout=pool_conf.get('pool_timeout', 30),
+                pool_recycle=pool_conf.get('pool_recycle', 3600))
+
+            @event.listens_for(engine, 'checkout')
+            def count_checkout(dbapi_connection, connection_record, connection_proxy):
+                engine.pool.stats.checkouts += 1
+
+            @event.listens_for(engine, 'invalidate')
+            def count_reconnect(dbapi_connection, connection_record, exception):
+                engine.pool.stats.reconnects += 1
+            _engines[db_url] = engine
+        return _engines[db_url]
+
+
+def _pool_name(engine):
+    return '{}@{}'.format(engine.url.username, engine.url.host)
+
+
+def pool_stats():
+    """Statistics for the connection pools of all databases used so far
+
+    Returns: A dict of ``username@hostname`` to dicts of :py:class:`PoolStats` attributes,
+        along with ``size`` and ``checked_out``, the current number of connections in the pool
+        and in use.
+    """
+    stats = dict()
+    for engine in _engines.values():
+        engine_stats = engine.pool.stats.as_dict()
+        engine_stats['size'] = engine.pool.checkedin() + engine.pool.checkedout()
+        engine_stats['checked_out'] = engine.pool.checkedout()
+        stats[_pool_name(engine)] = engine_stats
+    return stats
+
+
+def log_pool_stats():
+    """Writes :py:func:`pool_stats` to the perflog"""
+    for name, stats in sorted(pool_stats().items()):
+        perflog.logger.info('db pool %s: %d checkouts, %d connects, %d reconnects, '
+            '%d waits (%f waiting)', name, stats['checkouts'], stats['connects'],
+            stats['reconnects'], stats['waits'], stats['wait_time'])
 
 
 class Db(Mapping):
@@ -66,13 +178,14 @@ class Db(Mapping):
 
     Note:
 
-        Creating a table object requires a call to the database so that SQLAlchemy can do
-        reflection to determine the table's structure (columns, keys, indices, etc). On
-        a latent connection, this can be extremely slow, which will affect methods that return
-        tables, like the mapping interface or :py:meth:`values`.
+        Creating a table object requires SQLAlchemy to reflect the table's structure (columns,
+        keys, indices, etc) from the database. On a latent connection, this can be extremely
+        slow, so reflected tables are kept on disk for later runs. See :py:attr:`metadata`.
 
     '''
     _table_cache = dict()
+    # Reflected metadata, by hostname and schema version
+    _metadata_cache = dict()
 
     def __init__(self, hostname=None, credentials=None):
         if hostname is None:
@@ -156,11 +269,16 @@ class Db(Mapping):
     def engine(self):
         """The :py:class:`Engine <sqlalchemy:sqlalchemy.engine.Engine>` for this database
 
-        It uses pessimistic disconnection handling, checking that the database is still
-        connected before executing commands.
+        The engine, and its connection pool, are shared by all :py:class:`Db` instances for
+        the same database and credentials; see :py:func:`get_engine`.
 
         """
-        return create_engine(self.db_url, echo_pool=True)
+        return get_engine(self.db_url)
+
+    @property
+    def pool_stats(self):
+        """:py:func:`pool_stats` for this database"""
+        return pool_stats().get(_pool_name(self.engine))
 
     @lazycache
     def sessionmaker(self):
@@ -180,19 +298,42 @@ class Db(Mapping):
         """
         return declarative_base(metadata=self.metadata)
 
+    @lazycache
+    def schema_version(self):
+        """Identifies the schema of this database
+
+        By the version of the appliances using it, and the migrations that have been run on it.
+        """
+        appliance_version, latest, count = self.engine.execute(
+            'SELECT (SELECT max(version) FROM miq_servers), max(version), count(*) '
+            'FROM schema_migrations').first()
+        return '{}-{}-{}'.format(appliance_version, latest, count)
+
     @lazycache
     def metadata(self):
         """:py:class:`MetaData <sqlalchemy:sqlalchemy.schema.MetaData>` for this database
 
         This can be used for introspection of reflected items.
 
+        Tables are reflected as they are used, and saved under :py:attr:`reflection_cache_path`
+        by :py:attr:`schema_version`. Any database with the same schema version, in this run or
+        later ones, loads the saved tables instead of reflecting them again. The metadata is
+        also shared by all :py:class:`Db` instances for the same host and schema version.
+
         Note:
 
-            Tables that haven't been reflected won't show up in metadata. To reflect a table,
-            use :py:meth:`reflect_table`.
+            Tables that haven't been reflected, in this run or an earlier one, won't show up in
+            metadata. To reflect a table, use :py:meth:`reflect_table`.
 
         """
-        return MetaData(bind=self.engine)
+        key = (self.hostname, self.schema_version)
+        if key not in self._metadata_cache:
+            metadata = _load_metadata(self.schema_version)
+            if metadata is None:
+                metadata = MetaData()
+            metadata.bind = self.engine
+            self._metadata_cache[key] = metadata
+        return self._metadata_cache[key]
 
     @lazycache
     def db_url(self):
@@ -250,15 +391,18 @@ class Db(Mapping):
             table_name: The name of a table to reflect
 
         """
-        self.metadata.reflect(only=[table_name])
+        if table_name not in self.metadata.tables:
+            self.metadata.reflect(only=[table_name])
+            _save_metadata(self.schema_version, self.metadata)
 
     def _table(self, table_name):
         """Retrieves, reflects, and caches table objects
 
         Actual implementation of __getitem__
         """
+        cache_key = (self.hostname, self.schema_version, table_name)
         try:
-            return self._table_cache[table_name]
+            return self._table_cache[cache_key]
         except KeyError:
             self.reflect_table(table_name)
             table = self.metadata.tables[table_name]
@@ -269,7 +413,7 @@ class Db(Mapping):
 
             try:
                 table_cls = type(str(table_name), (self.table_base,), table_dict)
-                self._table_cache[table_name] = table_cls
+                self._table_cache[cache_key] = table_cls
                 return table_cls
             except ArgumentError:
                 # This usually happens on join tables with no PKs
@@ -277,6 +421,38 @@ class Db(Mapping):
                 return None
 
 
+def _reflection_cache_file(schema_version):
+    return reflection_cache_path.join('{}.pickle'.format(schema_version))
+
+
+def _load_metadata(schema_version):
+    # Load reflected metadata saved by _save_metadata, or None if there isn't any
+    cache_file = _reflection_cache_file(schema_version)
+    if not cache_file.check():
+        return None
+    try:
+        with cache_file.open('rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logger.warning('Unable to load reflected schema from %s: %s', cache_file, e)
+        return None
+
+
+def _save_metadata(schema_version, metadata):
+    # Processes reflecting different tables at the same time each save only their own, and
+    # the ones that lose reflect theirs again in a later run
+    cache_file = _reflection_cache_file(schema_version)
+    try:
+        reflection_cache_path.ensure(dir=True)
+        # Write to a temporary file first, so other processes never load a partial file
+        temp_file = cache_file.new(basename='{}.{}'.format(cache_file.basename, os.getpid()))
+        with temp_file.open('wb') as f:
+            pickle.dump(metadata, f, pickle.HIGHEST_PROTOCOL)
+        temp_file.rename(cache_file)
+    except Exception as e:
+        logger.warning('Unable to save reflected schema to %s: %s', cache_file, e)
+
+
 def db_yamls(db=None):
     """Returns the yamls from the db configuration table as a dict
 
@@ -1,7 +1,72 @@
 # -*- coding: utf-8 -*-
+"""Quick, read-only lookups in the appliance database
+
+These use SQLAlchemy Core queries on lightweight table definitions, so they need neither table
+reflection nor the ORM. Results are cached for :py:data:`cache_ttl` seconds, since they are
+looked up again and again while navigating the UI; call :py:func:`clear_cache` after changing
+what they return, e.g. renaming the appliance.
+"""
+from functools import wraps
+from threading import Lock
+from time import time
+
+from sqlalchemy.sql import and_, column, select, table
 
 from utils.db import cfmedb, database_on_server
 
+#: Number of seconds query results are cached for
+cache_ttl = 300
+
+# Sequence factor: ids in each region start at region number * SEQ_FACT
+SEQ_FACT = 1000000000000
+
+miq_regions = table('miq_regions', column('region'))
+miq_servers = table('miq_servers', column('id'), column('name'), column('ipaddress'))
+
+_cache = dict()
+_cache_lock = Lock()
+
+
+def _cached(func):
+    # Caches the results of func for cache_ttl seconds, by its arguments
+    @wraps(func)
+    def wrapper(*args):
+        key = (func.__name__,) + args
+        with _cache_lock:
+            if key in _cache and time() - _cache[key][0] < cache_ttl:
+                return _cache[key][1]
+        result = func(*args)
+        with _cache_lock:
+            _cache[key] = (time(), result)
+        return result
+    return wrapper
+
+
+def clear_cache():
+    """Forgets all cached query results"""
+    with _cache_lock:
+        _cache.clear()
+
+
+@_cached
+def _configuration_details(ip_address):
+    # Each region is joined to the server with the given address, if it's in that region
+    server_in_region = and_(
+        miq_servers.c.id >= miq_regions.c.region * SEQ_FACT,
+        miq_servers.c.id < (miq_regions.c.region + 1) * SEQ_FACT,
+        miq_servers.c.ipaddress == ip_address)
+    query = select([miq_regions.c.region, miq_servers.c.name, miq_servers.c.id])\
+        .select_from(miq_regions.outerjoin(miq_servers, server_in_region))\
+        .order_by(miq_regions.c.region)
+    with database_on_server(ip_address) as db:
+        rows = db.engine.execute(query).fetchall()
+    if not rows:
+        return None
+    for region, name, server_id in rows:
+        if server_id is not None:
+            return region, name, server_id
+    return None, None, None
+
 
 def get_configuration_details(ip_address=None):
     """Return details that are necessary to navigate through Configuration accordions.
@@ -16,26 +81,7 @@ def get_configuration_details(ip_address=None):
     """
     if ip_address is None:
         ip_address = cfmedb.hostname
-
-    with database_on_server(ip_address) as db:
-        SEQ_FACT = 1000000000000
-        miq_servers = db['miq_servers']
-        for region in db.session.query(db['miq_regions']):
-            reg_min = region.region * SEQ_FACT
-            reg_max = reg_min + SEQ_FACT
-            servers = list(
-                db.session.query(miq_servers).filter(
-                    miq_servers.id >= reg_min,
-                    miq_servers.id < reg_max,
-                    miq_servers.ipaddress == ip_address
-                )
-            )
-            if servers:
-                return region.region, servers[0].name, servers[0].id
-            else:
-                return None, None, None
-        else:
-            return None
+    return _configuration_details(ip_address)
 
 
 def get_server_id(ip_address=None):
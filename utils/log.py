@@ -130,8 +130,11 @@ Members
 ^^^^^^^
 
 """
+import atexit
 import logging
+import Queue
 import sys
+import threading
 import warnings
 import datetime as dt
 
@@ -387,10 +390,42 @@ if '_original_excepthook' not in globals():
     _original_excepthook = sys.excepthook
 
 
+class _Flush(object):
+    # Marks a point in the MultiLogger queue; sent is set when everything before it was sent
+    def __init__(self):
+        self.sent = threading.Event()
+
+
 class MultiLogger(object):
+    """Logs to all of its loggers, and sends the log records to artifactor
+
+    Log records are not sent to artifactor straight away, as that would take a request to the
+    artifactor server for every message. Instead, they're put on a queue, which is sent to
+    artifactor in batches by a background thread.
+
+    The queue, batch size and batch interval can be configured in env.yaml:
+
+    .. code-block:: yaml
+
+        artifactor:
+            # Most log records waiting to be sent; when full, new records are dropped
+            log_queue_size: 10000
+            # Most log records sent at once
+            log_batch_size: 100
+            # Longest time, in seconds, to wait for a batch to fill up before sending it
+            log_batch_interval: 0.5
+
+    Call :py:meth:`flush` to wait for everything logged so far to be sent.
+
+    """
     def __init__(self):
         self.loggers = []
         self._art_instance = None
+        self._queue = None
+        self._lock = threading.Lock()
+        #: Number of log records that were not sent to artifactor because the queue was full
+        self.dropped = 0
+        self._dropped_unreported = 0
 
     def add_logger(self, logger):
         self.loggers.append(logger)
@@ -400,15 +435,85 @@ class MultiLogger(object):
 
     @property
     def _art(self):
-        if not self._art_instance:
+        if self._art_instance is None:
             from fixtures.artifactor_plugin import art_client, SLAVEID
             self._slaveid = SLAVEID
             self._art_instance = art_client
         return self._art_instance
 
+    def _start_sender(self):
+        # Set up the queue and its sender thread when the first record is sent to artifactor
+        with self._lock:
+            if self._queue is None:
+                art_conf = conf.env.get('artifactor', {})
+                self._batch_size = art_conf.get('log_batch_size', 100)
+                self._batch_interval = art_conf.get('log_batch_interval', 0.5)
+                self._queue = Queue.Queue(art_conf.get('log_queue_size', 10000))
+                sender = threading.Thread(target=self._send_batches, name='log-sender')
+                sender.daemon = True
+                sender.start()
+        return self._queue
+
+    def _send_batches(self):
+        # Runs in the sender thread; flush() puts _Flush markers on the queue
+        while True:
+            batch, flushes = [], []
+            item = self._queue.get()
+            deadline = time() + self._batch_interval
+            while True:
+                if isinstance(item, _Flush):
+                    flushes.append(item)
+                    break
+                batch.append(item)
+                remaining = deadline - time()
+                if len(batch) >= self._batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except Queue.Empty:
+                    break
+            self._send(batch)
+            for flushed in flushes:
+                flushed.sent.set()
+
+    def _send(self, batch):
+        with self._lock:
+            dropped, self._dropped_unreported = self._dropped_unreported, 0
+        if dropped:
+            batch.insert(0, {'level': 'warning', 'extra': None,
+                'message': '%d log messages were dropped, the log queue was full' % dropped})
+        if not batch:
+            return
+        try:
+            self._art.fire_hook('log_messages', log_records=batch, slaveid=self._slaveid)
+        except Exception:
+            # Nowhere to log this without recursing, so the batch is lost
+            pass
+
+    def flush(self, timeout=30):
+        """Waits for the log records logged so far to be sent to artifactor
+
+        Args:
+            timeout: Longest time to wait, in seconds
+
+        Returns: ``True`` if the records were sent, or ``False`` if it timed out
+        """
+        if self._queue is None:
+            return True
+        flushed = _Flush()
+        try:
+            self._queue.put(flushed, timeout=timeout)
+        except Queue.Full:
+            return False
+        flushed.sent.wait(timeout)
+        return flushed.sent.is_set()
+
     def log_me(self, name, *args, **kwargs):
         for logger in self.loggers:
             getattr(logger, name)(*args, **kwargs)
+        if not self._art:
+            # Not using artifactor
+            return
         extra_info = kwargs.get('extra', None)
         if extra_info:
             if not isinstance(extra_info['source_file'], basestring):
@@ -416,13 +521,20 @@ class MultiLogger(object):
         log_record = {'level': name,
                       'message': str(args[0]),
                       'extra': extra_info}
-        self._art.fire_hook('log_message', log_record=log_record, slaveid=self._slaveid)
+        try:
+            self._start_sender().put_nowait(log_record)
+        except Queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._dropped_unreported += 1
 
 
 cfme_logger = create_logger('cfme')
 
 logger = MultiLogger()
 logger.add_logger(cfme_logger)
+# Send whatever is left in the artifactor log queue when exiting
+atexit.register(logger.flush, 5)
 
 perflog = Perflog()
 
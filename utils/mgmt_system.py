@@ -3,20 +3,520 @@
 
 Used to communicate with providers without using CFME facilities
 """
+import atexit
+import os
 import re
 import time
 import boto
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict, defaultdict, namedtuple
+from functools import wraps
+from threading import Event, Lock, Thread, Timer, current_thread
 from boto.ec2 import EC2Connection, get_region
 from ovirtsdk.api import API
 from ovirtsdk.xml import params
 from pysphere import VIServer, MORTypes, VITask, VIMor
 from pysphere.resources import VimService_services as VI
-from pysphere.resources.vi_exception import VIException
+from pysphere.resources.vi_exception import FaultTypes, VIException
+from pysphere.vi_virtual_machine import VIVirtualMachine
 from novaclient.v1_1 import client as osclient
 from utils.log import logger
 from utils.wait import wait_for, TimedOutError
 
+#: A VM or template in an :py:class:`Inventory`; ``obj`` is the backend's own object for it
+InventoryItem = namedtuple('InventoryItem', ['name', 'id', 'state', 'ip', 'template', 'obj'])
+
+
+class Inventory(object):
+    """A snapshot of all the VMs and templates on a management system
+
+    Taken in one go by :py:meth:`MgmtSystemAPIBase.inventory`, and indexed by name and by id so
+    that looking up VMs doesn't need any more calls to the backend.
+
+    Args:
+        items: The :py:class:`InventoryItem` s on the system
+    """
+    def __init__(self, items):
+        self.taken = time.time()
+        self.items = list(items)
+        self.by_id = {}
+        self.by_name = {}
+        for item in self.items:
+            self.by_id[item.id] = item
+            if item.name is not None:
+                self.by_name.setdefault(item.name, []).append(item)
+
+    @property
+    def age(self):
+        """Number of seconds since the snapshot was taken"""
+        return time.time() - self.taken
+
+    @property
+    def vms(self):
+        return [item for item in self.items if not item.template]
+
+    @property
+    def templates(self):
+        return [item for item in self.items if item.template]
+
+    def find(self, name=None, item_id=None, template=None):
+        """Finds items by name, or by id
+
+        Args:
+            name: Name of the VM or template
+            item_id: Id of the VM or template, used instead of the name if given
+            template: ``True`` to only find templates, ``False`` to only find VMs,
+                ``None`` (default) for either
+        Returns: A list of matching :py:class:`InventoryItem` s, as names need not be unique
+        """
+        if item_id is not None:
+            items = [self.by_id[item_id]] if item_id in self.by_id else []
+        else:
+            items = self.by_name.get(name, [])
+        return [item for item in items if template is None or item.template == template]
+
+
+class VMActionResult(object):
+    """The outcome of an action on one of many VMs
+
+    Attributes:
+        vm_name: The VM acted on
+        value: What the action returned, as the single VM method would, ``None`` if it failed
+        error: The exception the action failed with, ``None`` if it succeeded. VMs the action
+            didn't finish on in time have a :py:class:`utils.wait.TimedOutError`.
+    """
+    def __init__(self, vm_name, value=None, error=None):
+        self.vm_name = vm_name
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<VMActionResult %s: %s>' % (self.vm_name, 'ok' if self.ok else repr(self.error))
+
+
+class VMActionResults(OrderedDict):
+    """:py:class:`VMActionResult` s of an action on many VMs, by VM name, in the order given"""
+    @property
+    def succeeded(self):
+        return [result for result in self.itervalues() if result.ok]
+
+    @property
+    def failed(self):
+        return [result for result in self.itervalues() if not result.ok]
+
+    def followed_by(self, later):
+        """Combines these results with those of a later step, done on the VMs that succeeded here
+
+        Args:
+            later: The :py:class:`VMActionResults` of the later step
+        Returns: :py:class:`VMActionResults` with the later results, or these ones for VMs
+            that failed here
+        """
+        return VMActionResults((name, later[name] if result.ok else result)
+                               for name, result in self.iteritems())
+
+    def raise_failures(self):
+        """Raises the error if the action failed on a VM, or :py:class:`VMActionsFailed` if on more
+
+        Returns: A dict of VM names to what the action returned, if it succeeded on all of them
+        """
+        failed = self.failed
+        if len(failed) == 1:
+            raise failed[0].error
+        elif failed:
+            raise VMActionsFailed(failed, len(self))
+        return {name: result.value for name, result in self.iteritems()}
+
+
+class _VMActionThread(Thread):
+    # Does a single VM action for MgmtSystemAPIBase._run_threaded; once the thread is done, its
+    # result is what the action returned, or the exception it raised
+    def __init__(self, action, call, vm_name):
+        super(_VMActionThread, self).__init__(name='%s %s' % (action, vm_name))
+        self.daemon = True
+        self.call = call
+        self.vm_name = vm_name
+        self.result = None
+
+    def run(self):
+        try:
+            self.result = self.call(self.vm_name)
+        except Exception as e:
+            self.result = e
+
+
+def _invalidates_inventory(method):
+    # Actions that change what's on the system throw the inventory snapshot away, both before
+    # they start, so they act on what's there now, and after they're done
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.invalidate_inventory()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.invalidate_inventory()
+    return wrapper
+
+
+class VMStateWatcher(object):
+    """Follows the states of all the VMs on a management system, for any number of waiters
+
+    A background thread keeps its own connection to the system, and subclasses feed it the
+    state changes the system reports in :py:meth:`_follow`. Waiting for a VM state then costs
+    nothing on the backend; waiters are woken as soon as their VM changes state.
+
+    In case a change is missed, each waiter reads its VM's state from the backend every
+    ``resync_interval`` seconds. While the watcher isn't following the system, e.g. while it's
+    (re)connecting, waiters poll the backend every ``poll_interval`` seconds instead, as they
+    would without a watcher.
+
+    Watchers are shared by all the mgmt system objects connecting to the same system; use
+    :py:meth:`MgmtSystemAPIBase.vm_state_watcher` to get one.
+
+    Args:
+        mgmt: The :py:class:`MgmtSystemAPIBase` to get connection details from
+    """
+    resync_interval = 30
+    poll_interval = 2
+    retry_delay = 10
+
+    def __init__(self, mgmt):
+        self.mgmt = mgmt
+        self.ready = False
+        self._states = {}
+        self._waiters = {}
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread = None
+
+    @classmethod
+    def key(cls, mgmt):
+        """Identifies the system the mgmt system object connects to, to share watchers by"""
+        raise NotImplementedError('key not implemented.')
+
+    def _follow(self):
+        """Connects to the system and follows its VM states until the watcher is stopped
+
+        Implementations should call :py:meth:`_set_states` with the states of all VMs first, then
+        with each change, and return once ``self._stopped`` is set.
+        """
+        raise NotImplementedError('_follow not implemented.')
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = Thread(target=self._run,
+                                      name='%s(%s)' % (type(self).__name__, self.key(self.mgmt)))
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self, timeout=30):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._follow()
+            except Exception as e:
+                logger.warning('Watching VM states on %s failed, retrying in %d seconds: %s' %
+                    (self.key(self.mgmt), self.retry_delay, e))
+            with self._lock:
+                self.ready = False
+            self._stopped.wait(self.retry_delay)
+
+    def _set_states(self, states, deleted=(), complete=False):
+        """Records new VM states, and wakes anyone waiting on those VMs
+
+        Args:
+            states: A dict of VM names to states
+            deleted: Names of VMs that don't exist anymore
+            complete: ``states`` are all of the VMs on the system, so forget any others
+        """
+        with self._lock:
+            old_states = self._states
+            if complete:
+                self._states = dict(states)
+                self.ready = True
+            else:
+                self._states = dict(old_states)
+                self._states.update(states)
+            for name in deleted:
+                self._states.pop(name, None)
+            changed = set(old_states) ^ set(self._states)
+            changed.update(name for name in self._states
+                           if self._states[name] != old_states.get(name))
+            for name in changed:
+                for wake in self._waiters.get(name, []):
+                    wake.set()
+
+    def state(self, vm_name):
+        """The VM's last known state, or ``None`` if it isn't known"""
+        with self._lock:
+            if self.ready:
+                return self._states.get(vm_name)
+
+    def wait_for_state(self, vm_name, states, read_state, num_sec=120, message=None):
+        """Waits for a VM to be in one of the given states
+
+        Args:
+            vm_name: Name of the VM
+            states: The states to wait for
+            read_state: A function reading a VM's state from the backend, given its name
+            num_sec: Timeout, in seconds
+            message: Message for :py:func:`utils.wait.wait_for`
+        Returns: What :py:func:`utils.wait.wait_for` returned
+        Raises:
+            TimedOutError: If the VM isn't in one of the states in time
+        """
+        wake = Event()
+        last_read = [None]
+
+        def in_state():
+            state = self.state(vm_name)
+            now = time.time()
+            if last_read[0] is None and state is not None:
+                # The watcher knows the VM, so it can be trusted for a while
+                last_read[0] = now
+            if state is None or now - last_read[0] >= self.resync_interval:
+                state = read_state(vm_name)
+                last_read[0] = now
+            return state in states
+
+        with self._lock:
+            self._waiters.setdefault(vm_name, set()).add(wake)
+        try:
+            return wait_for(in_state, num_sec=num_sec, delay=self.poll_interval, wake=wake,
+                            message=message or 'VM %s in state %s' % (vm_name, '/'.join(states)))
+        finally:
+            with self._lock:
+                self._waiters[vm_name].discard(wake)
+                if not self._waiters[vm_name]:
+                    del self._waiters[vm_name]
+
+
+class VMWareStateWatcher(VMStateWatcher):
+    """Follows vSphere VM states with a PropertyCollector filter and ``WaitForUpdatesEx``
+
+    Besides the power state of every VM, the filter follows vCenter's recent tasks, so VMs
+    being powered on, off and so on are in the same states as pysphere's
+    ``VIVirtualMachine.get_status`` gives them, like ``POWERING ON``.
+    """
+    #: Longest time ``WaitForUpdatesEx`` blocks for, so that stopping doesn't take longer
+    max_wait = 10
+
+    # (task description id, power states it applies in or None for any, VM state while running)
+    _task_states = [
+        ('VirtualMachine.powerOff', ('poweredOn', 'suspended'), 'POWERING OFF'),
+        ('VirtualMachine.revertToCurrentSnapshot', None, 'REVERTING TO SNAPSHOT'),
+        ('vm.Snapshot.revert', None, 'REVERTING TO SNAPSHOT'),
+        ('VirtualMachine.reset', ('poweredOn', 'suspended'), 'RESETTING'),
+        ('VirtualMachine.suspend', ('poweredOn',), 'SUSPENDING'),
+        ('Drm.ExecuteVmPowerOnLRO', ('poweredOff', 'suspended'), 'POWERING ON'),
+        ('VirtualMachine.powerOn', ('poweredOff', 'suspended'), 'POWERING ON'),
+    ]
+
+    @classmethod
+    def key(cls, mgmt):
+        return 'vsphere://%s@%s' % (mgmt.username, mgmt.hostname)
+
+    def _call(self, api, method, this, **elements):
+        # Calls a vSphere API method on the managed object this, with the given arguments
+        request = getattr(VI, '%sRequestMsg' % method)()
+        _this = request.new__this(this)
+        _this.set_attribute_type(this.get_attribute_type())
+        request.set_element__this(_this)
+        for name, value in elements.iteritems():
+            if hasattr(value, 'get_attribute_type'):
+                mor = getattr(request, 'new_%s' % name)(value)
+                mor.set_attribute_type(value.get_attribute_type())
+                value = mor
+            getattr(request, 'set_element_%s' % name)(value)
+        return getattr(api._proxy, method)(request)._returnval
+
+    def _filter_spec(self, view, task_manager):
+        spec = VI.CreateFilterRequestMsg().new_spec()
+        vm_props = spec.new_propSet()
+        vm_props.set_element_type(MORTypes.VirtualMachine)
+        vm_props.set_element_pathSet(['name', 'runtime.powerState', 'runtime.question'])
+        task_props = spec.new_propSet()
+        task_props.set_element_type(MORTypes.Task)
+        task_props.set_element_pathSet(['info.state', 'info.descriptionId', 'info.entity'])
+        spec.set_element_propSet([vm_props, task_props])
+
+        object_sets = []
+        # All VMs in the container view, and all of the task manager's recent tasks
+        for obj, path in [(view, 'view'), (task_manager, 'recentTask')]:
+            object_set = spec.new_objectSet()
+            mor = object_set.new_obj(obj)
+            mor.set_attribute_type(obj.get_attribute_type())
+            object_set.set_element_obj(mor)
+            object_set.set_element_skip(True)
+            traversal = VI.ns0.TraversalSpec_Def(path).pyclass()
+            traversal.set_element_name(path)
+            traversal.set_element_type(obj.get_attribute_type())
+            traversal.set_element_path(path)
+            traversal.set_element_skip(False)
+            object_set.set_element_selectSet([traversal])
+            object_sets.append(object_set)
+        spec.set_element_objectSet(object_sets)
+        return spec
+
+    def _vm_states(self, vms, tasks):
+        running = {}
+        for task in tasks.itervalues():
+            if task.get('info.state') in ('queued', 'running'):
+                running.setdefault(str(task.get('info.entity')), set()).add(
+                    task.get('info.descriptionId'))
+        states = {}
+        for mor, props in vms.iteritems():
+            if props.get('name') is None:
+                continue
+            power_state = props.get('runtime.powerState')
+            state = VMWareSystem._power_states.get(power_state, 'UNKNOWN')
+            for description, power_states, task_state in self._task_states:
+                if description in running.get(mor, ()) and (
+                        power_states is None or power_state in power_states):
+                    state = task_state
+                    break
+            if props.get('runtime.question') is not None:
+                state = 'BLOCKED ON MSG'
+            states[props['name']] = state
+        return states
+
+    def _follow(self):
+        api = VIServer()
+        api.connect(self.mgmt.hostname, self.mgmt.username, self.mgmt.password)
+        collector = view = None
+        try:
+            content = api._do_service_content
+            # A collector of our own, so its updates are only the ones asked for here
+            collector = self._call(api, 'CreatePropertyCollector', content.PropertyCollector)
+            view = self._call(api, 'CreateContainerView', content.ViewManager,
+                container=content.RootFolder, type=[MORTypes.VirtualMachine], recursive=True)
+            self._call(api, 'CreateFilter', collector,
+                spec=self._filter_spec(view, content.TaskManager), partialUpdates=False)
+
+            version = ''
+            vms, tasks = {}, {}
+            while not self._stopped.is_set():
+                request = VI.WaitForUpdatesExRequestMsg()
+                _this = request.new__this(collector)
+                _this.set_attribute_type(collector.get_attribute_type())
+                request.set_element__this(_this)
+                request.set_element_version(version)
+                options = request.new_options()
+                options.set_element_maxWaitSeconds(self.max_wait)
+                request.set_element_options(options)
+                update_set = api._proxy.WaitForUpdatesEx(request)._returnval
+                if update_set is None:
+                    # Nothing changed in max_wait seconds
+                    continue
+                version = update_set.Version
+                for filter_update in update_set.FilterSet:
+                    for update in filter_update.ObjectSet:
+                        objects = tasks if update.Obj.get_attribute_type() == MORTypes.Task else vms
+                        if update.Kind == 'leave':
+                            objects.pop(str(update.Obj), None)
+                            continue
+                        props = objects.setdefault(str(update.Obj), {})
+                        for change in update.ChangeSet:
+                            if change.Op in ('remove', 'indirectRemove'):
+                                props.pop(change.Name, None)
+                            else:
+                                props[change.Name] = getattr(change, 'Val', None)
+                self._set_states(self._vm_states(vms, tasks), complete=True)
+        finally:
+            for method, mor in [('DestroyPropertyCollector', collector), ('DestroyView', view)]:
+                if mor is not None:
+                    try:
+                        self._call(api, method, mor)
+                    except Exception as e:
+                        logger.debug('Could not %s on %s: %s' % (method, self.key(self.mgmt), e))
+            api.disconnect()
+
+
+class RHEVMStateWatcher(VMStateWatcher):
+    """Follows RHEV VM states by reading new events since the last one seen
+
+    Each poll is a single request for the events collection, however many VMs are being waited
+    on; only the VMs named in new events are read again.
+    """
+    #: Number of seconds between reading the events
+    event_interval = 3
+
+    @classmethod
+    def key(cls, mgmt):
+        return '%s@%s' % (mgmt._api_kwargs['username'], mgmt._api_kwargs['url'])
+
+    def _read_all(self, api):
+        # Reads the states of all the VMs; returns the last event before they were read, and the
+        # VMs' names by id. Events are listed newest first.
+        last_event = max([int(event.id) for event in api.events.list(max=1)] or [0])
+        names = {}
+        states = {}
+        for vm in api.vms.list():
+            names[vm.id] = vm.name
+            states[vm.name] = vm.get_status().get_state()
+        self._set_states(states, complete=True)
+        return last_event, names
+
+    def _follow(self):
+        api = API(**self.mgmt._api_kwargs)
+        try:
+            last_event, names = self._read_all(api)
+            last_read = time.time()
+
+            while not self._stopped.wait(self.event_interval):
+                if time.time() - last_read >= self.resync_interval:
+                    # In case events were missed, e.g. purged before they were read
+                    last_event, names = self._read_all(api)
+                    last_read = time.time()
+                    continue
+                changed = set()
+                new_events = []
+                for event in api.events.list(from_event_id=str(last_event)):
+                    # Newest first, so last_event can only move on once they've all been seen
+                    if int(event.id) <= last_event:
+                        continue
+                    new_events.append(int(event.id))
+                    if event.get_vm() is not None:
+                        changed.add(event.get_vm().get_id())
+                if new_events:
+                    last_event = max(new_events)
+                states, deleted = {}, []
+                for vm_id in changed:
+                    vm = api.vms.get(id=vm_id)
+                    if vm is None:
+                        if vm_id in names:
+                            deleted.append(names.pop(vm_id))
+                    else:
+                        names[vm_id] = vm.name
+                        states[vm.name] = vm.get_status().get_state()
+                self._set_states(states, deleted)
+        finally:
+            api.disconnect()
+
+
+_watchers = {}
+_watchers_lock = Lock()
+
+
+def stop_vm_state_watchers():
+    """Stops all the VM state watchers, closing their connections"""
+    with _watchers_lock:
+        watchers = _watchers.values()
+        _watchers.clear()
+    for watcher in watchers:
+        watcher.stop()
+atexit.register(stop_vm_state_watchers)
+
 
 class MgmtSystemAPIBase(object):
     """Base interface class for Management Systems
@@ -24,10 +524,24 @@ class MgmtSystemAPIBase(object):
     Interface notes:
 
     * Initializers of subclasses must support \*\*kwargs in their
-      signtures
+      signtures, and pass them on to this class' initializer
     * Action methods (start/stop/etc) should block until the requested
       action is complete
+    * Listing and looking up VMs is served from an :py:class:`Inventory`
+      snapshot, taken by :py:meth:`_take_inventory` and reused for
+      ``inventory_ttl`` seconds. Actions that change the VMs on the system
+      should be decorated with ``_invalidates_inventory``. VM states used to
+      wait for actions to finish are always read from the backend.
+    * Systems with a :py:class:`VMStateWatcher` wait for VM states through it,
+      instead of polling the backend.
+    * Actions on many VMs (``start_vms``, ``deploy_templates``, etc.) submit
+      the action for all of them before waiting on any, and report per VM in
+      :py:class:`VMActionResults`. By default they run the single VM methods
+      in threads; systems override them to use their own tasks instead.
 
+    Args:
+        inventory_ttl: Overrides :py:attr:`inventory_ttl`, e.g. from the provider's yaml
+        watch_vm_states: Overrides :py:attr:`watch_vm_states`, e.g. from the provider's yaml
     """
     __metaclass__ = ABCMeta
 
@@ -35,6 +549,101 @@ class MgmtSystemAPIBase(object):
     # default True
     can_suspend = True
 
+    #: Number of seconds an inventory snapshot is reused for, 0 to take one for every lookup
+    inventory_ttl = 30
+
+    #: Whether to wait for VM states with a :py:class:`VMStateWatcher`, if the system has one
+    watch_vm_states = True
+
+    # The VMStateWatcher subclass for the system, if any
+    _watcher_class = None
+
+    #: The states a VM is in when nothing is being done to it, if the system can tell
+    steady_states = None
+
+    def __init__(self, **kwargs):
+        self.inventory_ttl = kwargs.get('inventory_ttl', self.inventory_ttl)
+        self.watch_vm_states = kwargs.get('watch_vm_states', self.watch_vm_states)
+        self._inventory = None
+        self._inventory_lock = Lock()
+
+    def vm_state_watcher(self):
+        """Returns the running :py:class:`VMStateWatcher` for this system, starting it if need be
+
+        Returns: The watcher, or ``None`` if the system doesn't have one or isn't to be watched
+        """
+        if self._watcher_class is None or not self.watch_vm_states:
+            return None
+        key = self._watcher_class.key(self)
+        with _watchers_lock:
+            if key not in _watchers:
+                _watchers[key] = self._watcher_class(self)
+            watcher = _watchers[key]
+        watcher.start()
+        return watcher
+
+    def _wait_vm_state(self, vm_name, states, num_sec=120, message=None):
+        """Waits for the VM to be in one of the given states
+
+        With the system's :py:class:`VMStateWatcher` if it has one, by polling
+        :py:meth:`vm_status` otherwise.
+
+        Returns: What :py:func:`utils.wait.wait_for` returned
+        """
+        message = message or 'VM %s in state %s' % (vm_name, '/'.join(states))
+        watcher = self.vm_state_watcher()
+        if watcher is None:
+            return wait_for(lambda: self.vm_status(vm_name) in states, num_sec=num_sec, delay=2,
+                            message=message)
+        return watcher.wait_for_state(vm_name, states, self.vm_status, num_sec, message)
+
+    def _known_vm_status(self, vm_name):
+        """The VM's state as its watcher knows it, or from the backend if it isn't known"""
+        watcher = self.vm_state_watcher()
+        state = watcher.state(vm_name) if watcher is not None else None
+        if state is None:
+            state = self.vm_status(vm_name)
+        return state
+
+    def _take_inventory(self):
+        """Gets all the VMs and templates from the backend, in as few calls as possible
+
+        Returns: An iterable of :py:class:`InventoryItem`
+        """
+        raise NotImplementedError('_take_inventory not implemented.')
+
+    def inventory(self, refresh=False):
+        """Returns a snapshot of the VMs and templates on the system
+
+        Args:
+            refresh: Take a new snapshot even if the current one is younger than
+                :py:attr:`inventory_ttl` (default ``False``)
+        Returns: An :py:class:`Inventory`
+        """
+        with self._inventory_lock:
+            if (refresh or self._inventory is None
+                    or self._inventory.age >= self.inventory_ttl):
+                self._inventory = Inventory(self._take_inventory())
+            return self._inventory
+
+    def invalidate_inventory(self):
+        """Throws away the inventory snapshot, so the next lookup takes a new one"""
+        with self._inventory_lock:
+            self._inventory = None
+
+    def _find_in_inventory(self, name=None, item_id=None, template=None):
+        """Looks up VMs in the inventory, taking a new snapshot if the current one misses them
+
+        Arguments are as for :py:meth:`Inventory.find`.
+        """
+        current = self._inventory
+        inventory = self.inventory()
+        items = inventory.find(name, item_id, template)
+        if not items and inventory is current:
+            # Created since the snapshot was taken, maybe
+            items = self.inventory(refresh=True).find(name, item_id, template)
+        return items
+
     @abstractmethod
     def start_vm(self, vm_name):
         """Starts a vm.
@@ -265,6 +874,9 @@ class MgmtSystemAPIBase(object):
     def stats(self, *requested_stats):
         """Returns all available stats, if none are explicitly requested
 
+        Stats counting VMs and templates are served from the inventory snapshot, so polling
+        them doesn't list everything on the backend every time.
+
         Args:
             *requested_stats: A list giving the name of the stats to return. Stats are defined
                 in the _stats_available attibute of the specific class.
@@ -280,6 +892,8 @@ class MgmtSystemAPIBase(object):
             vm_name: VM name
         Returns: boolean
         """
+        if self.steady_states is not None:
+            return self._known_vm_status(vm_name) in self.steady_states
         return (
             self.is_vm_running(vm_name)
             or self.is_vm_stopped(vm_name)
@@ -293,6 +907,9 @@ class MgmtSystemAPIBase(object):
             vm_name: VM name
             num_sec: Timeout for wait_for
         """
+        if self.steady_states is not None:
+            return self._wait_vm_state(vm_name, self.steady_states, num_sec=num_sec,
+                                       message="VM %s in steady state" % vm_name)
         return wait_for(
             lambda: self.in_steady_state(vm_name),
             num_sec=num_sec,
@@ -300,6 +917,352 @@ class MgmtSystemAPIBase(object):
             message="VM %s in steady state" % vm_name
         )
 
+    def _run_on_vms(self, action, vm_names, submit, poll, num_sec, submit_all=None, delay=5):
+        """Does an action on many VMs, submitting it for all of them before waiting for any
+
+        Args:
+            action: What is being done, for logging, e.g. ``'Starting'``
+            vm_names: The VMs to act on
+            submit: Function taking a VM name, which starts the action on it and returns a
+                handle to check on it with, e.g. the backend's task. ``None`` if the VM needs
+                nothing doing.
+            poll: Function taking a dict of VM names to the handles of the actions still
+                running, which checks on all of them at once. Returns a dict of VM names to
+                results for the ones that have finished; exceptions for those that failed.
+            num_sec: Number of seconds to wait for all the actions to finish
+            submit_all: Function taking the dict of VM names to handles once they're all
+                submitted, for backends that start an action on many VMs in one call
+            delay: Number of seconds between polls
+        Returns: :py:class:`VMActionResults`
+        """
+        results = VMActionResults((vm_name, None) for vm_name in vm_names)
+        pending = {}
+        for vm_name in results:
+            try:
+                handle = submit(vm_name)
+            except Exception as e:
+                logger.error(' %s VM %s failed: %s' % (action, vm_name, e))
+                results[vm_name] = VMActionResult(vm_name, error=e)
+            else:
+                if handle is None:
+                    results[vm_name] = VMActionResult(vm_name, True)
+                else:
+                    pending[vm_name] = handle
+        if submit_all is not None and pending:
+            try:
+                submit_all(dict(pending))
+            except Exception as e:
+                logger.error(' %s VMs %s failed: %s' % (action, ', '.join(pending), e))
+                for vm_name in pending:
+                    results[vm_name] = VMActionResult(vm_name, error=e)
+                pending = {}
+        logger.info(' %s %d VMs' % (action, len(pending)))
+
+        deadline = time.time() + num_sec
+        while pending:
+            try:
+                finished = poll(dict(pending))
+            except Exception as e:
+                logger.warning(' Checking on %s VMs failed, retrying: %s' % (action.lower(), e))
+                finished = {}
+            for vm_name, value in finished.iteritems():
+                del pending[vm_name]
+                if isinstance(value, Exception):
+                    logger.error(' %s VM %s failed: %s' % (action, vm_name, value))
+                    results[vm_name] = VMActionResult(vm_name, error=value)
+                else:
+                    results[vm_name] = VMActionResult(vm_name, value)
+            if pending:
+                if time.time() >= deadline:
+                    break
+                time.sleep(delay)
+        for vm_name in pending:
+            logger.error(' %s VM %s timed out' % (action, vm_name))
+            results[vm_name] = VMActionResult(vm_name, error=TimedOutError(
+                '%s VM %s did not finish in %d seconds' % (action, vm_name, num_sec)))
+        return results
+
+    def _run_threaded(self, action, vm_names, call, num_sec):
+        """Does an action on many VMs with a single VM method, each VM in a thread of its own
+
+        For systems that have no way of their own to act on many VMs at once.
+
+        Args:
+            call: Function doing the action on the VM name it's given
+        Returns: :py:class:`VMActionResults`
+        """
+        def submit(vm_name):
+            thread = _VMActionThread(action, call, vm_name)
+            thread.start()
+            return thread
+
+        def poll(pending):
+            return {vm_name: thread.result for vm_name, thread in pending.iteritems()
+                    if not thread.is_alive()}
+
+        return self._run_on_vms(action, vm_names, submit, poll, num_sec, delay=1)
+
+    def start_vms(self, vm_names, num_sec=600):
+        """Starts many VMs, submitting all of them before waiting for any
+
+        Failing to start one VM doesn't stop the others being started.
+
+        Args:
+            vm_names: The VMs to start
+            num_sec: Number of seconds to wait for all of them to be running
+        Returns: :py:class:`VMActionResults`
+        """
+        return self._run_threaded('Starting', vm_names, self.start_vm, num_sec)
+
+    def stop_vms(self, vm_names, num_sec=600):
+        """Stops many VMs, submitting all of them before waiting for any
+
+        Failing to stop one VM doesn't stop the others being stopped.
+
+        Args:
+            vm_names: The VMs to stop
+            num_sec: Number of seconds to wait for all of them to be stopped
+        Returns: :py:class:`VMActionResults`
+        """
+        return self._run_threaded('Stopping', vm_names, self.stop_vm, num_sec)
+
+    def delete_vms(self, vm_names, num_sec=600):
+        """Deletes many VMs, submitting all of them before waiting for any
+
+        Failing to delete one VM doesn't stop the others being deleted.
+
+        Args:
+            vm_names: The VMs to delete
+            num_sec: Number of seconds to wait for all of them to be gone
+        Returns: :py:class:`VMActionResults`
+        """
+        return self._run_threaded('Deleting', vm_names, self.delete_vm, num_sec)
+
+    def deploy_templates(self, deployments, num_sec=1800):
+        """Deploys many VMs from templates, submitting all of them before waiting for any
+
+        Failing to deploy one VM doesn't stop the others being deployed.
+
+        Args:
+            deployments: Dicts of the arguments to :py:meth:`deploy_template` for each VM,
+                each with the ``template`` and the ``vm_name``
+            num_sec: Number of seconds to wait for all of them to be deployed
+        Returns: :py:class:`VMActionResults`, by the VMs' names
+
+        Usage:
+
+            mgmt.deploy_templates([
+                {'template': 'template1', 'vm_name': 'vm1', 'cluster_name': 'cluster'},
+                {'template': 'template1', 'vm_name': 'vm2', 'cluster_name': 'cluster'},
+            ]).raise_failures()
+        """
+        deployments = OrderedDict((kwargs['vm_name'], kwargs) for kwargs in deployments)
+        return self._run_threaded('Deploying', deployments,
+                                  lambda vm_name: self.deploy_template(**deployments[vm_name]),
+                                  num_sec)
+
+    def _inventory_poll(self, states):
+        """Returns a poll for :py:meth:`_run_on_vms`, finishing VMs once in one of the states
+
+        Each poll reads the states of all the VMs from one new inventory snapshot. VMs that
+        don't exist are in state ``None``.
+        """
+        def poll(pending):
+            inventory = self.inventory(refresh=True)
+            finished = {}
+            for vm_name in pending:
+                items = inventory.find(vm_name, template=False)
+                if (items[0].state if items else None) in states:
+                    finished[vm_name] = True
+            return finished
+        return poll
+
+
+class VIServerPool(object):
+    """Authenticated vSphere sessions, shared by every :py:class:`VMWareSystem` in the process
+
+    pysphere's ``VIServer`` can't be used by more than one thread at a time, so each thread
+    gets a session of its own for every host and credentials, which it keeps until it
+    :py:meth:`release` s it. Released sessions, and those of threads that have finished, are
+    handed out again rather than logging in anew.
+
+    Instead of checking a session before every call, idle sessions are kept alive by a timer
+    every ``keepalive_interval`` seconds, and sessions a thread hasn't used for
+    ``check_interval`` seconds are checked when it next gets them. Should a session expire
+    anyway, the read-only :py:class:`VMWareSystem` methods :py:meth:`discard` it and retry once.
+
+    Since sockets can't be shared with forked processes, a child process starts with an empty
+    pool rather than using the sessions of its parent.
+    """
+    keepalive_interval = 300
+    check_interval = 300
+
+    def __init__(self):
+        self._lock = Lock()
+        self._idle = defaultdict(list)
+        self._owned = {}
+        self._last_used = {}
+        self._pid = os.getpid()
+        self._timer = None
+
+    def _check_pid(self):
+        # Called with the lock held
+        if self._pid != os.getpid():
+            # Forked, and the sessions belong to the parent
+            self._idle, self._owned, self._last_used = defaultdict(list), {}, {}
+            self._pid = os.getpid()
+            self._timer = None
+
+    def _reclaim(self):
+        # Called with the lock held; puts the sessions of finished threads back in the pool
+        for (key, thread), api in self._owned.items():
+            if not thread.is_alive():
+                del self._owned[key, thread]
+                self._idle[key].append(api)
+
+    @staticmethod
+    def _alive(api):
+        try:
+            return api.keep_session_alive()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _connect(hostname, username, password):
+        logger.debug('Connecting to vSphere "%s"' % hostname)
+        api = VIServer()
+        api.connect(hostname, username, password)
+        return api
+
+    def get(self, hostname, username, password):
+        """Gets the calling thread's session
+
+        Returns: A connected ``VIServer``
+        """
+        key = (hostname, username, password)
+        thread = current_thread()
+        with self._lock:
+            self._check_pid()
+            api = self._owned.get((key, thread))
+            if api is not None and time.time() - self._last_used[api] < self.check_interval:
+                self._last_used[api] = time.time()
+                return api
+            if api is None:
+                self._reclaim()
+                if self._idle[key]:
+                    api = self._idle[key].pop()
+        if api is not None and not self._alive(api):
+            logger.debug('vSphere session on "%s" expired' % hostname)
+            api = None
+        if api is None:
+            api = self._connect(hostname, username, password)
+        with self._lock:
+            self._owned[key, thread] = api
+            self._last_used[api] = time.time()
+            if self._timer is None:
+                self._schedule_keepalive()
+        return api
+
+    def release(self, hostname, username, password):
+        """Puts the calling thread's session back in the pool, for any thread to use"""
+        key = (hostname, username, password)
+        with self._lock:
+            api = self._owned.pop((key, current_thread()), None)
+            if api is not None:
+                self._idle[key].append(api)
+
+    def discard(self, hostname, username, password):
+        """Throws the calling thread's session away, so that it gets a new one next time"""
+        with self._lock:
+            api = self._owned.pop(((hostname, username, password), current_thread()), None)
+            self._last_used.pop(api, None)
+        if api is not None:
+            try:
+                api.disconnect()
+            except Exception:
+                pass
+
+    def _schedule_keepalive(self):
+        # Called with the lock held
+        self._timer = Timer(self.keepalive_interval, self._keepalive)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _keepalive(self):
+        # The idle sessions are taken out of the pool while they're checked, so no thread can
+        # get one of them and use it at the same time
+        with self._lock:
+            if self._timer is None:
+                return
+            idle, self._idle = self._idle, defaultdict(list)
+        checked = [(key, api, self._alive(api)) for key, apis in idle.items() for api in apis]
+        with self._lock:
+            closed = self._timer is None
+            for key, api, alive in checked:
+                if alive and not closed:
+                    self._idle[key].append(api)
+                else:
+                    self._last_used.pop(api, None)
+            if not closed:
+                self._schedule_keepalive()
+        if closed:
+            # Closed while checking, so these were missed
+            for key, api, alive in checked:
+                try:
+                    api.disconnect()
+                except Exception:
+                    pass
+
+    def close(self):
+        """Logs out of all of the pooled sessions"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            apis = [api for apis in self._idle.values() for api in apis] + self._owned.values()
+            self._idle, self._owned, self._last_used = defaultdict(list), {}, {}
+            if self._pid != os.getpid():
+                return
+        for api in apis:
+            try:
+                api.disconnect()
+            except Exception:
+                pass
+
+#: The :py:class:`VIServerPool` used by :py:class:`VMWareSystem`
+vi_server_pool = VIServerPool()
+atexit.register(vi_server_pool.close)
+
+
+def _not_authenticated(e):
+    # Whether the exception is vSphere telling us the session has expired
+    if isinstance(e, VIException):
+        fault = e.fault
+    else:
+        try:
+            fault = e.fault.detail[0].typecode.pname
+        except Exception:
+            fault = ''
+    return 'NotAuthenticated' in fault
+
+
+def _reconnects(method):
+    # Retries a VMWareSystem method once, with a new session, if its session has expired. Only
+    # for methods that just read, as the retry runs the whole method again. Methods that change
+    # things read the VM through the inventory first, which reconnects.
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except (VIException, VI.ZSI.FaultException) as e:
+            if self._api is not None or not _not_authenticated(e):
+                raise
+            logger.info('The session to %s "%s" expired, reconnecting' %
+                (type(self).__name__, self.hostname))
+            vi_server_pool.discard(self.hostname, self.username, self.password)
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class VMWareSystem(MgmtSystemAPIBase):
     """Client to Vsphere API
@@ -311,6 +1274,9 @@ class VMWareSystem(MgmtSystemAPIBase):
     Detriments of pysphere:
       - Response often are not detailed enough.
 
+    Sessions come from :py:data:`vi_server_pool`, one per thread, and are given back to it by
+    :py:meth:`disconnect`.
+
     Args:
         hostname: The hostname of the system.
         username: The username to connect with.
@@ -320,6 +1286,10 @@ class VMWareSystem(MgmtSystemAPIBase):
     """
     _api = None
 
+    _watcher_class = VMWareStateWatcher
+
+    steady_states = {"POWERED ON", "POWERED OFF", "SUSPENDED"}
+
     _stats_available = {
         'num_vm': lambda self: len(self.list_vm()),
         'num_host': lambda self: len(self.list_host()),
@@ -328,28 +1298,25 @@ class VMWareSystem(MgmtSystemAPIBase):
         'num_datastore': lambda self: len(self.list_datastore()),
     }
 
+    # Power states in the API, as returned by pysphere's VIVirtualMachine.get_status
+    _power_states = {
+        'poweredOn': 'POWERED ON',
+        'poweredOff': 'POWERED OFF',
+        'suspended': 'SUSPENDED',
+    }
+
     def __init__(self, hostname, username, password, **kwargs):
+        super(VMWareSystem, self).__init__(**kwargs)
         self.hostname = hostname
         self.username = username
         self.password = password
-        self.api = VIServer()
 
     @property
     def api(self):
-        # wrap calls to the API with a keepalive check, reconnect if needed
-        try:
-            keepalive = self._api.keep_session_alive()
-            if not keepalive:
-                logger.debug('The connection to %s "%s" timed out' %
-                    (type(self).__name__, self.hostname))
-        except VIException as ex:
-            if ex.fault == "Not Connected":
-                # set this to trigger a connection below
-                keepalive = None
-            else:
-                raise
-
-        if not keepalive:
+        # The calling thread's session from the pool, unless an api object has been set
+        if self._api is None:
+            return vi_server_pool.get(self.hostname, self.username, self.password)
+        if not self._api.is_connected():
             self._connect()
         return self._api
 
@@ -371,11 +1338,18 @@ class VMWareSystem(MgmtSystemAPIBase):
 
         Returns: a pysphere object.
         """
-        if vm_name is None:
-            raise VMInstanceNotFound('Could not find a VM named %s.' % vm_name)
-        else:
-            vm = self.api.get_vm_by_name(vm_name)
-            return vm
+        # The VM's MOR comes from the inventory, instead of get_vm_by_name traversing all VMs
+        items = self._find_in_inventory(vm_name)
+        if not items:
+            raise VMInstanceNotFound(vm_name)
+        try:
+            return VIVirtualMachine(self.api, items[0].obj)
+        except VIException:
+            # Gone since the snapshot was taken, or replaced by another VM of the same name
+            items = self.inventory(refresh=True).find(vm_name)
+            if not items:
+                raise VMInstanceNotFound(vm_name)
+            return VIVirtualMachine(self.api, items[0].obj)
 
     def does_vm_exist(self, name):
         """ Checks if a vm exists or not.
@@ -404,6 +1378,7 @@ class VMWareSystem(MgmtSystemAPIBase):
         # Just pick the first
         return rps.keys()[0]
 
+    @_reconnects
     def get_ip_address(self, vm_name):
         """ Returns the first IP address for the selected VM.
 
@@ -426,6 +1401,28 @@ class VMWareSystem(MgmtSystemAPIBase):
                     return ip
         return None
 
+    @_reconnects
+    def _take_inventory(self):
+        props = self.api._retrieve_properties_traversal(property_names=['name', 'config.template',
+                                                                        'runtime.connectionState',
+                                                                        'runtime.powerState',
+                                                                        'guest.ipAddress'],
+                                                        from_node=None,
+                                                        obj_type=MORTypes.VirtualMachine)
+        items = []
+        for prop in props:
+            values = {elem.Name: elem.Val for elem in prop.PropSet}
+            if values.get('name') is None or values.get('config.template') is None:
+                continue
+            if values.get('runtime.connectionState') == "inaccessible":
+                continue
+            items.append(InventoryItem(
+                name=values['name'], id=str(prop.Obj),
+                state=self._power_states.get(values.get('runtime.powerState')),
+                ip=values.get('guest.ipAddress'), template=bool(values['config.template']),
+                obj=prop.Obj))
+        return items
+
     def _get_list_vms(self, get_template=False):
         """ Obtains a list of all VMs on the system.
 
@@ -435,31 +1432,11 @@ class VMWareSystem(MgmtSystemAPIBase):
             get_template: A boolean describing if it should return template names also.
         Returns: A list of VMs.
         """
-        template_or_vm_list = []
-
-        props = self.api._retrieve_properties_traversal(property_names=['name', 'config.template',
-                                                                        'runtime.connectionState'],
-                                                        from_node=None,
-                                                        obj_type=MORTypes.VirtualMachine)
-        for prop in props:
-            vm = None
-            template = None
-            connectionState = None
-            for elem in prop.PropSet:
-                if elem.Name == "name":
-                    vm = elem.Val
-                elif elem.Name == "config.template":
-                    template = elem.Val
-                if elem.Name == "runtime.connectionState":
-                    connectionState = elem.Val
-            if vm is None or template is None:
-                continue
-            if connectionState == "inaccessible":
-                continue
-            if template == bool(get_template):
-                template_or_vm_list.append(vm)
-        return template_or_vm_list
+        inventory = self.inventory()
+        items = inventory.templates if get_template else inventory.vms
+        return [item.name for item in items]
 
+    @_invalidates_inventory
     def start_vm(self, vm_name):
         self.wait_vm_steady(vm_name)
         logger.info(" Starting vSphere VM %s" % vm_name)
@@ -472,6 +1449,7 @@ class VMWareSystem(MgmtSystemAPIBase):
             self.wait_vm_running(vm_name)
             return True
 
+    @_invalidates_inventory
     def stop_vm(self, vm_name):
         self.wait_vm_steady(vm_name)
         logger.info(" Stopping vSphere VM %s" % vm_name)
@@ -484,6 +1462,7 @@ class VMWareSystem(MgmtSystemAPIBase):
             self.wait_vm_stopped(vm_name)
             return True
 
+    @_invalidates_inventory
     def delete_vm(self, vm_name):
         self.wait_vm_steady(vm_name)
         logger.info(" Deleting vSphere VM %s" % vm_name)
@@ -492,17 +1471,19 @@ class VMWareSystem(MgmtSystemAPIBase):
         if vm.is_powered_on():
             self.stop_vm(vm_name)
 
+        task = self._destroy_task(vm)
+        status = task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR])
+        return status == task.STATE_SUCCESS
+
+    def _destroy_task(self, vm):
         # When pysphere moves up to 0.1.8, we can just do:
-        # vm.destroy()
+        # vm.destroy(sync_run=False)
         request = VI.Destroy_TaskRequestMsg()
         _this = request.new__this(vm._mor)
         _this.set_attribute_type(vm._mor.get_attribute_type())
         request.set_element__this(_this)
         rtn = self.api._proxy.Destroy_Task(request)._returnval
-
-        task = VITask(rtn, self.api)
-        status = task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR])
-        return status == task.STATE_SUCCESS
+        return VITask(rtn, self.api)
 
     def create_vm(self, vm_name):
         raise NotImplementedError('This function has not yet been implemented.')
@@ -520,49 +1501,55 @@ class VMWareSystem(MgmtSystemAPIBase):
     def list_flavor(self):
         raise NotImplementedError('This function is not supported on this platform.')
 
+    @_reconnects
     def list_host(self):
         return self.api.get_hosts()
 
+    @_reconnects
     def list_datastore(self):
         return self.api.get_datastores()
 
+    @_reconnects
     def list_cluster(self):
         return self.api.get_clusters()
 
+    @_reconnects
     def info(self):
         return '%s %s' % (self.api.get_server_type(), self.api.get_api_version())
 
     def disconnect(self):
-        self.api.disconnect()
+        if self._api is None:
+            vi_server_pool.release(self.hostname, self.username, self.password)
+        else:
+            self._api.disconnect()
 
+    @_reconnects
     def vm_status(self, vm_name):
         state = self._get_vm(vm_name).get_status()
         return state
 
-    def in_steady_state(self, vm_name):
-        return self.vm_status(vm_name) in {"POWERED ON", "POWERED OFF", "SUSPENDED"}
-
     def is_vm_running(self, vm_name):
         return self.vm_status(vm_name) == "POWERED ON"
 
     def wait_vm_running(self, vm_name):
         logger.info(" Waiting for vSphere VM %s to change status to ON" % vm_name)
-        wait_for(self.is_vm_running, [vm_name], num_sec=240)
+        self._wait_vm_state(vm_name, {"POWERED ON"}, num_sec=240)
 
     def is_vm_stopped(self, vm_name):
         return self.vm_status(vm_name) == "POWERED OFF"
 
     def wait_vm_stopped(self, vm_name):
         logger.info(" Waiting for vSphere VM %s to change status to OFF" % vm_name)
-        wait_for(self.is_vm_stopped, [vm_name], num_sec=240)
+        self._wait_vm_state(vm_name, {"POWERED OFF"}, num_sec=240)
 
     def is_vm_suspended(self, vm_name):
         return self.vm_status(vm_name) == "SUSPENDED"
 
     def wait_vm_suspended(self, vm_name):
         logger.info(" Waiting for vSphere VM %s to change status to SUSPENDED" % vm_name)
-        wait_for(self.is_vm_suspended, [vm_name], num_sec=360)
+        self._wait_vm_state(vm_name, {"SUSPENDED"}, num_sec=360)
 
+    @_invalidates_inventory
     def suspend_vm(self, vm_name):
         self.wait_vm_steady(vm_name)
         logger.info(" Suspending vSphere VM %s" % vm_name)
@@ -577,6 +1564,7 @@ class VMWareSystem(MgmtSystemAPIBase):
     def clone_vm(self):
         raise NotImplementedError('clone_vm not implemented.')
 
+    @_invalidates_inventory
     def deploy_template(self, template, *args, **kwargs):
         logger.info(" Deploying vSphere template %s to VM %s" % (template, kwargs["vm_name"]))
         if 'resourcepool' not in kwargs:
@@ -589,6 +1577,64 @@ class VMWareSystem(MgmtSystemAPIBase):
         else:
             raise VMInstanceNotCloned(template)
 
+    def _task_poll(self, pending):
+        # A poll for _run_on_vms, reading the states of all the VMs' tasks in one call
+        vm_names = {str(task._mor): vm_name for vm_name, task in pending.iteritems()}
+        contents = self.api._get_object_properties_bulk(
+            [task._mor for task in pending.itervalues()],
+            {MORTypes.Task: ['info.state', 'info.error']})
+        finished = {}
+        for content in contents or []:
+            props = {prop.Name: prop.Val for prop in getattr(content, 'PropSet', None) or []}
+            vm_name = vm_names[str(content.Obj)]
+            if props.get('info.state') == VITask.STATE_SUCCESS:
+                finished[vm_name] = True
+            elif props.get('info.state') == VITask.STATE_ERROR:
+                error = getattr(props.get('info.error'), 'LocalizedMessage', None)
+                finished[vm_name] = VIException(error or 'Task failed', FaultTypes.TASK_ERROR)
+        return finished
+
+    def _power_task(self, vm_name, done, start_task):
+        # Submits a power task for _run_on_vms, unless done(vm) says there's nothing to do
+        self.wait_vm_steady(vm_name)
+        vm = self._get_vm(vm_name)
+        if done(vm):
+            return None
+        return start_task(vm)
+
+    @_invalidates_inventory
+    def start_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Starting', vm_names, lambda vm_name: self._power_task(
+            vm_name, lambda vm: vm.is_powered_on(), lambda vm: vm.power_on(sync_run=False)),
+            self._task_poll, num_sec)
+
+    @_invalidates_inventory
+    def stop_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Stopping', vm_names, lambda vm_name: self._power_task(
+            vm_name, lambda vm: vm.is_powered_off(), lambda vm: vm.power_off(sync_run=False)),
+            self._task_poll, num_sec)
+
+    @_invalidates_inventory
+    def delete_vms(self, vm_names, num_sec=600):
+        stopped = self.stop_vms(vm_names, num_sec)
+        deleted = self._run_on_vms('Deleting', [result.vm_name for result in stopped.succeeded],
+            lambda vm_name: self._destroy_task(self._get_vm(vm_name)), self._task_poll, num_sec)
+        return stopped.followed_by(deleted)
+
+    @_invalidates_inventory
+    def deploy_templates(self, deployments, num_sec=1800):
+        deployments = OrderedDict((kwargs['vm_name'], kwargs) for kwargs in deployments)
+
+        def submit(vm_name):
+            kwargs = deployments[vm_name]
+            return self._get_vm(kwargs['template']).clone(vm_name, sync_run=False,
+                resourcepool=self._get_resource_pool(kwargs.get('resourcepool')))
+
+        deployed = self._run_on_vms('Deploying', deployments, submit, self._task_poll, num_sec)
+        for result in deployed.succeeded:
+            result.value = result.vm_name
+        return deployed
+
     def remove_host_from_cluster(self, hostname):
         req = VI.DisconnectHost_TaskRequestMsg()
         mor = (key for key, value in self.api.get_hosts().items() if value == hostname).next()
@@ -677,6 +1723,10 @@ class RHEVMSystem(MgmtSystemAPIBase):
     Returns: A :py:class:`RHEVMSystem` object.
     """
 
+    _watcher_class = RHEVMStateWatcher
+
+    steady_states = {"up", "down", "suspended"}
+
     _stats_available = {
         'num_vm': lambda self: self.api.get_summary().get_vms().total,
         'num_host': lambda self: len(self.list_host()),
@@ -686,6 +1736,7 @@ class RHEVMSystem(MgmtSystemAPIBase):
     }
 
     def __init__(self, hostname, username, password, **kwargs):
+        super(RHEVMSystem, self).__init__(**kwargs)
         # generate URL from hostname
 
         if 'port' in kwargs:
@@ -723,6 +1774,20 @@ class RHEVMSystem(MgmtSystemAPIBase):
                 raise VMInstanceNotFound(vm_name)
             return vm
 
+    def _take_inventory(self):
+        for vm in self.api.vms.list():
+            try:
+                ip = vm.get_guest_info().get_ips().get_ip()[0].get_address()
+            except (AttributeError, IndexError):
+                ip = None
+            yield InventoryItem(name=vm.name, id=vm.id, state=vm.get_status().get_state(), ip=ip,
+                                template=False, obj=vm)
+        for template in self.api.templates.list():
+            status = template.get_status()
+            yield InventoryItem(name=template.name, id=template.id,
+                                state=status.get_state() if status is not None else None, ip=None,
+                                template=True, obj=template)
+
     def get_ip_address(self, vm_name):
         try:
             wait_for_me = lambda: self._get_vm(vm_name).get_guest_info()
@@ -742,6 +1807,7 @@ class RHEVMSystem(MgmtSystemAPIBase):
         except VMInstanceNotFound:
             return False
 
+    @_invalidates_inventory
     def start_vm(self, vm_name=None):
         self.wait_vm_steady(vm_name, num_sec=300)
         logger.info(' Starting RHEV VM %s' % vm_name)
@@ -754,6 +1820,7 @@ class RHEVMSystem(MgmtSystemAPIBase):
             self.wait_vm_running(vm_name)
             return True
 
+    @_invalidates_inventory
     def stop_vm(self, vm_name):
         self.wait_vm_steady(vm_name, num_sec=300)
         logger.info(' Stopping RHEV VM %s' % vm_name)
@@ -766,6 +1833,7 @@ class RHEVMSystem(MgmtSystemAPIBase):
             self.wait_vm_stopped(vm_name)
             return True
 
+    @_invalidates_inventory
     def delete_vm(self, vm_name):
         self.wait_vm_steady(vm_name, num_sec=300)
         vm = self._get_vm(vm_name)
@@ -823,6 +1891,8 @@ class RHEVMSystem(MgmtSystemAPIBase):
         # list vm based on kwargs can be buggy
         # i.e. you can't return a list of powered on vm
         # but you can return a vm w/ a matched name
+        if not kwargs:
+            return [vm.name for vm in self.inventory().vms]
         vm_list = self.api.vms.list(**kwargs)
         return [vm.name for vm in vm_list]
 
@@ -842,7 +1912,10 @@ class RHEVMSystem(MgmtSystemAPIBase):
         """
         Note: CFME ignores the 'Blank' template, so we do too
         """
-        template_list = self.api.templates.list(**kwargs)
+        if kwargs:
+            template_list = self.api.templates.list(**kwargs)
+        else:
+            template_list = self.inventory().templates
         return [template.name for template in template_list if template.name != "Blank"]
 
     def list_flavor(self):
@@ -858,30 +1931,28 @@ class RHEVMSystem(MgmtSystemAPIBase):
     def vm_status(self, vm_name=None):
         return self._get_vm(vm_name).get_status().get_state()
 
-    def in_steady_state(self, vm_name):
-        return self.vm_status(vm_name) in {"up", "down", "suspended"}
-
     def is_vm_running(self, vm_name):
         return self.vm_status(vm_name) == "up"
 
     def wait_vm_running(self, vm_name):
         logger.info(" Waiting for RHEV-M VM %s to change status to ON" % vm_name)
-        wait_for(self.is_vm_running, [vm_name], num_sec=360)
+        self._wait_vm_state(vm_name, {"up"}, num_sec=360)
 
     def is_vm_stopped(self, vm_name):
         return self.vm_status(vm_name) == "down"
 
     def wait_vm_stopped(self, vm_name):
         logger.info(" Waiting for RHEV-M VM %s to change status to OFF" % vm_name)
-        wait_for(self.is_vm_stopped, [vm_name], num_sec=360)
+        self._wait_vm_state(vm_name, {"down"}, num_sec=360)
 
     def is_vm_suspended(self, vm_name):
         return self.vm_status(vm_name) == "suspended"
 
     def wait_vm_suspended(self, vm_name):
         logger.info(" Waiting for RHEV-M VM %s to change status to SUSPENDED" % vm_name)
-        wait_for(self.is_vm_suspended, [vm_name], num_sec=720)
+        self._wait_vm_state(vm_name, {"suspended"}, num_sec=720)
 
+    @_invalidates_inventory
     def suspend_vm(self, vm_name):
         self.wait_vm_steady(vm_name, num_sec=300)
         logger.debug(' Suspending RHEV VM %s' % vm_name)
@@ -899,21 +1970,67 @@ class RHEVMSystem(MgmtSystemAPIBase):
     def clone_vm(self, source_name, vm_name):
         raise NotImplementedError('This function has not yet been implemented.')
 
+    @_invalidates_inventory
     def deploy_template(self, template, *args, **kwargs):
         logger.debug(' Deploying RHEV template %s to VM %s' % (template, kwargs["vm_name"]))
+        self._add_vm(template, **kwargs)
+        self.wait_vm_stopped(kwargs['vm_name'])
+        self.start_vm(kwargs['vm_name'])
+        return kwargs['vm_name']
+
+    def _add_vm(self, template, **kwargs):
         vm_placement_policy = None
         if 'placement_policy_host' in kwargs and 'placement_policy_affinity' in kwargs:
             vm_host = params.Host(name=kwargs['placement_policy_host'])
             vm_placement_policy = params.VmPlacementPolicy(host=vm_host,
                 affinity=kwargs['placement_policy_affinity'])
-        self.api.vms.add(params.VM(
+        return self.api.vms.add(params.VM(
             name=kwargs['vm_name'],
             cluster=self.api.clusters.get(kwargs['cluster_name']),
             placement_policy=vm_placement_policy,
             template=self.api.templates.get(template)))
-        self.wait_vm_stopped(kwargs['vm_name'])
-        self.start_vm(kwargs['vm_name'])
-        return kwargs['vm_name']
+
+    def _state_action(self, vm_name, done_state, action):
+        # Submits an action for _run_on_vms, unless the VM is already in done_state
+        self.wait_vm_steady(vm_name, num_sec=300)
+        vm = self._get_vm(vm_name)
+        if vm.status.get_state() == done_state:
+            return None
+        getattr(vm, action)()
+        return vm.id
+
+    @_invalidates_inventory
+    def start_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Starting', vm_names,
+            lambda vm_name: self._state_action(vm_name, 'up', 'start'),
+            self._inventory_poll({'up'}), num_sec)
+
+    @_invalidates_inventory
+    def stop_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Stopping', vm_names,
+            lambda vm_name: self._state_action(vm_name, 'down', 'stop'),
+            self._inventory_poll({'down'}), num_sec)
+
+    @_invalidates_inventory
+    def delete_vms(self, vm_names, num_sec=600):
+        stopped = self.stop_vms(vm_names, num_sec)
+        deleted = self._run_on_vms('Deleting', [result.vm_name for result in stopped.succeeded],
+            lambda vm_name: self._state_action(vm_name, None, 'delete'),
+            self._inventory_poll({None}), num_sec)
+        return stopped.followed_by(deleted)
+
+    @_invalidates_inventory
+    def deploy_templates(self, deployments, num_sec=1800):
+        deployments = OrderedDict((kwargs['vm_name'], kwargs) for kwargs in deployments)
+        # New VMs are down until their disks are copied from the template
+        added = self._run_on_vms('Deploying', deployments,
+            lambda vm_name: self._add_vm(**deployments[vm_name]).id,
+            self._inventory_poll({'down'}), num_sec)
+        deployed = added.followed_by(
+            self.start_vms([result.vm_name for result in added.succeeded], num_sec))
+        for result in deployed.succeeded:
+            result.value = result.vm_name
+        return deployed
 
     def remove_host_from_cluster(self, hostname):
         raise NotImplementedError('remove_host_from_cluster not implemented')
@@ -957,6 +2074,7 @@ class EC2System(MgmtSystemAPIBase):
         username = kwargs.get('username')
         password = kwargs.get('password')
 
+        super(EC2System, self).__init__(**kwargs)
         region = get_region(kwargs.get('region'))
         self.api = EC2Connection(username, password, region=region)
 
@@ -973,15 +2091,19 @@ class EC2System(MgmtSystemAPIBase):
 
     def list_vm(self):
         """Returns a list from instance IDs currently known to EC2"""
-        return [instance.id for instance in self._get_all_instances()]
+        return [instance.id for instance in self.inventory().vms]
 
     def list_template(self):
-        private_images = self.api.get_all_images(owners=['self'],
-                                                 filters={'image-type': 'machine'})
-        shared_images = self.api.get_all_images(executable_by=['self'],
-                                                filters={'image-type': 'machine'})
-        combined_images = list(set(private_images) | set(shared_images))
-        return combined_images
+        return [image.obj for image in self.inventory().templates]
+
+    def _take_inventory(self):
+        for instance in self._get_all_instances():
+            yield InventoryItem(name=instance.tags.get('Name'), id=instance.id,
+                                state=instance.state, ip=instance.ip_address, template=False,
+                                obj=instance)
+        for image in self._get_all_images():
+            yield InventoryItem(name=image.name, id=image.id, state=image.state, ip=None,
+                                template=True, obj=image)
 
     def list_flavor(self):
         raise NotImplementedError('This function is not supported on this platform.')
@@ -1007,6 +2129,7 @@ class EC2System(MgmtSystemAPIBase):
     def create_vm(self):
         raise NotImplementedError('create_vm not implemented.')
 
+    @_invalidates_inventory
     def delete_vm(self, instance_id):
         """Deletes the an instance
 
@@ -1023,6 +2146,7 @@ class EC2System(MgmtSystemAPIBase):
         except ActionTimedOutError:
             return False
 
+    @_invalidates_inventory
     def start_vm(self, instance_id):
         """Start an instance
 
@@ -1039,6 +2163,7 @@ class EC2System(MgmtSystemAPIBase):
         except ActionTimedOutError:
             return False
 
+    @_invalidates_inventory
     def stop_vm(self, instance_id):
         """Stop an instance
 
@@ -1127,6 +2252,7 @@ class EC2System(MgmtSystemAPIBase):
     def clone_vm(self, source_name, vm_name):
         raise NotImplementedError('This function has not yet been implemented.')
 
+    @_invalidates_inventory
     def deploy_template(self, template, *args, **kwargs):
         """Instantiate the requested template image
 
@@ -1154,10 +2280,9 @@ class EC2System(MgmtSystemAPIBase):
         return instances[0].id
 
     def _get_instance_by_id(self, instance_id):
-        inst_list = self._get_all_instances()
-        for instance in inst_list:
-            if instance.id == instance_id:
-                return instance
+        instances = self._find_in_inventory(item_id=instance_id, template=False)
+        if instances:
+            return instances[0].obj
 
     def get_ip_address(self, id):
         return str(self._get_instance_by_id(id).ip_address)
@@ -1170,12 +2295,8 @@ class EC2System(MgmtSystemAPIBase):
             # This is already an instance id, return it!
             return instance_name
 
-        # Filter by the 'Name' tag
-        filters = {
-            'tag:Name': instance_name,
-        }
-        reservations = self.api.get_all_instances(filters=filters)
-        instances = self._get_instances_from_reservations(reservations)
+        # Look up by the 'Name' tag
+        instances = self._find_in_inventory(instance_name, template=False)
         if not instances:
             raise VMInstanceNotFound(instance_name)
         elif len(instances) > 1:
@@ -1207,6 +2328,69 @@ class EC2System(MgmtSystemAPIBase):
         instances = self._get_instances_from_reservations(reservations)
         return instances
 
+    def _get_all_images(self):
+        """Gets all machine images owned by or shared with us"""
+        private_images = self.api.get_all_images(owners=['self'],
+                                                 filters={'image-type': 'machine'})
+        shared_images = self.api.get_all_images(executable_by=['self'],
+                                                filters={'image-type': 'machine'})
+        return list(set(private_images) | set(shared_images))
+
+    def _instances_poll(self, states):
+        # A poll for _run_on_vms, with instance ids as handles, reading them all in one call
+        def poll(pending):
+            reservations = self.api.get_all_instances(list(set(pending.values())))
+            instance_states = {instance.id: instance.state
+                for instance in self._get_instances_from_reservations(reservations)}
+            return {instance_name: True for instance_name, instance_id in pending.iteritems()
+                    if instance_states.get(instance_id) in states}
+        return poll
+
+    @_invalidates_inventory
+    def start_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Starting', vm_names, self._get_instance_id_by_name,
+            self._instances_poll(self.states['running']), num_sec,
+            submit_all=lambda pending: self.api.start_instances(pending.values()))
+
+    @_invalidates_inventory
+    def stop_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Stopping', vm_names, self._get_instance_id_by_name,
+            self._instances_poll(self.states['stopped']), num_sec,
+            submit_all=lambda pending: self.api.stop_instances(pending.values()))
+
+    @_invalidates_inventory
+    def delete_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Terminating', vm_names, self._get_instance_id_by_name,
+            self._instances_poll(self.states['deleted']), num_sec,
+            submit_all=lambda pending: self.api.terminate_instances(pending.values()))
+
+    @_invalidates_inventory
+    def deploy_templates(self, deployments, num_sec=1800):
+        """Instantiates many template images, running all of them before waiting for any
+
+        The ``vm_name`` of each deployment is given to its instance as the ``Name`` tag; the
+        other arguments are passed along to boto's run_instances method.
+
+        Returns: :py:class:`VMActionResults` of the created instances' IDs, by ``vm_name``
+        """
+        deployments = OrderedDict((kwargs['vm_name'], kwargs) for kwargs in deployments)
+        instance_ids = {}
+
+        def submit(vm_name):
+            kwargs = dict(deployments[vm_name], min_count=1, max_count=1)
+            kwargs.pop('vm_name')
+            reservation = self.api.run_instances(kwargs.pop('template'), **kwargs)
+            instance = self._get_instances_from_reservations([reservation])[0]
+            instance.add_tag('Name', vm_name)
+            instance_ids[vm_name] = instance.id
+            return instance.id
+
+        deployed = self._run_on_vms('Deploying', deployments, submit,
+                                    self._instances_poll(self.states['running']), num_sec)
+        for result in deployed.succeeded:
+            result.value = instance_ids[result.vm_name]
+        return deployed
+
     # Prime candidate for a wait_for
     def _block_until(self, instance_id, expected, timeout=90):
         """Blocks until the given instance is in one of the expected states
@@ -1255,8 +2439,10 @@ class OpenstackSystem(MgmtSystemAPIBase):
         username = kwargs['username']
         password = kwargs['password']
         auth_url = kwargs['auth_url']
+        super(OpenstackSystem, self).__init__(**kwargs)
         self.api = osclient.Client(username, password, tenant, auth_url, service_type="compute")
 
+    @_invalidates_inventory
     def start_vm(self, instance_name):
         logger.info(" Starting OpenStack instance %s" % instance_name)
         if self.is_vm_running(instance_name):
@@ -1267,6 +2453,7 @@ class OpenstackSystem(MgmtSystemAPIBase):
         wait_for(lambda: self.is_vm_running(instance_name), message="start %s" % instance_name)
         return True
 
+    @_invalidates_inventory
     def stop_vm(self, instance_name):
         logger.info(" Stopping OpenStack instance %s" % instance_name)
         if self.is_vm_stopped(instance_name):
@@ -1280,23 +2467,49 @@ class OpenstackSystem(MgmtSystemAPIBase):
     def create_vm(self):
         raise NotImplementedError('create_vm not implemented.')
 
+    @_invalidates_inventory
     def delete_vm(self, instance_name):
         logger.info(" Deleting OpenStack instance %s" % instance_name)
         instance = self._find_instance_by_name(instance_name)
         instance.delete()
+        self.invalidate_inventory()
         return self.does_vm_exist(instance_name)
 
     def restart_vm(self, instance_name):
         logger.info(" Restarting OpenStack instance %s" % instance_name)
         return self.stop_vm(instance_name) and self.start_vm(instance_name)
 
+    def _instance_action(self, instance_name, done_state, action):
+        # Submits an action for _run_on_vms, unless the instance is already in done_state
+        instance = self._find_instance_by_name(instance_name)
+        if self.vm_status(instance_name) == done_state:
+            return None
+        getattr(instance, action)()
+        return instance.id
+
+    @_invalidates_inventory
+    def start_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Starting', vm_names,
+            lambda vm_name: self._instance_action(vm_name, 'ACTIVE', 'start'),
+            self._inventory_poll({'ACTIVE'}), num_sec)
+
+    @_invalidates_inventory
+    def stop_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Stopping', vm_names,
+            lambda vm_name: self._instance_action(vm_name, 'SHUTOFF', 'stop'),
+            self._inventory_poll({'SHUTOFF'}), num_sec)
+
+    @_invalidates_inventory
+    def delete_vms(self, vm_names, num_sec=600):
+        return self._run_on_vms('Deleting', vm_names,
+            lambda vm_name: self._instance_action(vm_name, None, 'delete'),
+            self._inventory_poll({None, 'DELETED'}), num_sec)
+
     def list_vm(self, **kwargs):
-        instance_list = self._get_all_instances()
-        return [instance.name for instance in instance_list]
+        return [instance.name for instance in self.inventory().vms]
 
     def list_template(self):
-        template_list = self.api.images.list()
-        return [template.name for template in template_list]
+        return [template.name for template in self.inventory().templates]
 
     def list_flavor(self):
         flavor_list = self.api.flavors.list()
@@ -1313,7 +2526,8 @@ class OpenstackSystem(MgmtSystemAPIBase):
         pass
 
     def vm_status(self, vm_name):
-        return self._find_instance_by_name(vm_name).status
+        # Looked up by name in the inventory, but the state always comes fresh from the backend
+        return self.api.servers.get(self._find_instance_by_name(vm_name).id).status
 
     def is_vm_running(self, vm_name):
         return self.vm_status(vm_name) == 'ACTIVE'
@@ -1334,6 +2548,7 @@ class OpenstackSystem(MgmtSystemAPIBase):
     def wait_vm_stopped(self, instance_id):
         pass
 
+    @_invalidates_inventory
     def suspend_vm(self, instance_name):
         logger.info(" Suspending OpenStack instance %s" % instance_name)
         if self.is_vm_suspended(instance_name):
@@ -1343,6 +2558,7 @@ class OpenstackSystem(MgmtSystemAPIBase):
         instance.suspend()
         wait_for(lambda: self.is_vm_suspended(instance_name), message="suspend %s" % instance_name)
 
+    @_invalidates_inventory
     def resume_vm(self, instance_name):
         logger.info(" Resuming OpenStack instance %s" % instance_name)
         if self.is_vm_running(instance_name):
@@ -1355,6 +2571,7 @@ class OpenstackSystem(MgmtSystemAPIBase):
     def clone_vm(self, source_name, vm_name):
         raise NotImplementedError('clone_vm not implemented.')
 
+    @_invalidates_inventory
     def deploy_template(self, template, *args, **kwargs):
         """ Deploys a vm from a template.
 
@@ -1400,7 +2617,9 @@ class OpenstackSystem(MgmtSystemAPIBase):
         return instance._info['addresses']
 
     def get_ip_address(self, name):
-        networks = self._get_instance_networks(name)
+        return self._floating_ip(self._get_instance_networks(name))
+
+    def _floating_ip(self, networks):
         for network_nics in networks.itervalues():
             for nic in network_nics:
                 if nic['OS-EXT-IPS:type'] == 'floating':
@@ -1410,22 +2629,31 @@ class OpenstackSystem(MgmtSystemAPIBase):
         instances = self.api.servers.list(True, {'all_tenants': True})
         return instances
 
+    def _take_inventory(self):
+        for instance in self._get_all_instances():
+            yield InventoryItem(name=instance.name, id=instance.id, state=instance.status,
+                                ip=self._floating_ip(instance._info['addresses']),
+                                template=False, obj=instance)
+        for image in self.api.images.list():
+            yield InventoryItem(name=image.name, id=image.id, state=image.status, ip=None,
+                                template=True, obj=image)
+
     def _find_instance_by_name(self, name):
         """
         OpenStack Nova Client does have a find method, but it doesn't
         allow the find method to be used on other tenants. The list()
-        method is the only one that allows an all_tenants=True keyword
+        method is the only one that allows an all_tenants=True keyword,
+        so instances are looked up in the inventory taken with it.
         """
-        instances = self._get_all_instances()
-        for instance in instances:
-            if instance.name == name:
-                return instance
-        else:
+        instances = self._find_in_inventory(name, template=False)
+        if not instances:
             raise VMInstanceNotFound(name)
+        return instances[0].obj
 
     def does_vm_exist(self, name):
         try:
-            self._find_instance_by_name(name)
+            # Checked on the backend, in case it was deleted since the inventory was taken
+            self.vm_status(name)
             return True
         except Exception:
             return False
@@ -1480,3 +2708,14 @@ class VMInstanceNotSuspended(Exception):
 
     def __str__(self):
         return 'Could not suspend %s because it\'s not running.' % self.vm_name
+
+
+class VMActionsFailed(Exception):
+    """Raised if an action on many VMs failed on more than one of them."""
+    def __init__(self, failed, total):
+        self.failed = failed
+        self.total = total
+
+    def __str__(self):
+        return 'Failed on %d of %d VMs: %s' % (len(self.failed), self.total, ', '.join(
+            '%s (%s)' % (result.vm_name, result.error) for result in self.failed))
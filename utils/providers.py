@@ -5,8 +5,10 @@ To quickly add all providers::
     setup_providers(validate=False)
 
 """
+from copy import copy, deepcopy
 from functools import partial
 from operator import methodcaller
+from threading import Lock
 
 import cfme.fixtures.pytest_selenium as sel
 from cfme.web_ui import Quadicon, paginator, toolbar
@@ -89,6 +91,148 @@ def provider_factory(provider_name, providers=None, credentials=None):
     return provider_instance
 
 
+def get_crud(provider_key):
+    """Provides the CRUD object for a provider in the yaml configuration files
+
+    Args:
+        provider_key: The name of a provider, as supplied in the yaml configuration files
+    Return: A :py:class:`cfme.cloud.provider.Provider` or
+        :py:class:`cfme.infrastructure.provider.Provider`, as appropriate
+    """
+    provider_type = conf.cfme_data['management_systems'][provider_key]['type']
+    if provider_type in cloud_provider_type_map:
+        from cfme.cloud.provider import get_from_config
+    elif provider_type in infra_provider_type_map:
+        from cfme.infrastructure.provider import get_from_config
+    else:
+        raise UnknownProvider(provider_key)
+    return get_from_config(provider_key)
+
+
+class ProviderProxy(object):
+    """Stands in for a provider object, which is only created the first time it's used
+
+    Attribute access and ``isinstance`` checks are passed on to the provider object, so tests can
+    use the proxy as if it were the object itself.
+
+    Args:
+        factory: Function creating the provider object from the provider key
+        provider_key: The name of a provider, as supplied in the yaml configuration files
+    """
+    def __init__(self, factory, provider_key):
+        object.__setattr__(self, '_proxy_factory', factory)
+        object.__setattr__(self, '_proxy_key', provider_key)
+        object.__setattr__(self, '_proxy_obj', None)
+        object.__setattr__(self, '_proxy_lock', Lock())
+
+    @property
+    def proxy_created(self):
+        """Whether the provider object has been created yet"""
+        return self._proxy_obj is not None
+
+    def proxy_target(self):
+        """Returns the provider object, creating it if this is the first time it's used"""
+        with self._proxy_lock:
+            if self._proxy_obj is None:
+                logger.debug('Creating %s for provider %s' %
+                    (self._proxy_factory.__name__, self._proxy_key))
+                object.__setattr__(self, '_proxy_obj', self._proxy_factory(self._proxy_key))
+            return self._proxy_obj
+
+    @property
+    def __class__(self):
+        return type(self.proxy_target())
+
+    # The provider object's own attributes, so utils.update.update() can swap them
+    def _get_dict(self):
+        return self.proxy_target().__dict__
+
+    def _set_dict(self, value):
+        self.proxy_target().__dict__ = value
+
+    __dict__ = property(_get_dict, _set_dict)
+
+    def __copy__(self):
+        return copy(self.proxy_target())
+
+    def __deepcopy__(self, memo):
+        return deepcopy(self.proxy_target(), memo)
+
+    def __eq__(self, other):
+        if isinstance(other, ProviderProxy):
+            other = other.proxy_target()
+        return self.proxy_target() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = object.__hash__
+
+    def __getattr__(self, name):
+        if name.startswith('_proxy_'):
+            # Not initialized, e.g. while being copied
+            raise AttributeError(name)
+        return getattr(self.proxy_target(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.proxy_target(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self.proxy_target(), name)
+
+    def __str__(self):
+        return str(self.proxy_target())
+
+    def __repr__(self):
+        if self.proxy_created:
+            return repr(self._proxy_obj)
+        return '<%s of provider %s, not created yet>' % (self._proxy_factory.__name__,
+            self._proxy_key)
+
+
+class ProviderRegistry(object):
+    """Provider CRUD objects and management systems, shared by everything in a test session
+
+    Each provider's objects are handed out as :py:class:`ProviderProxy` s, so merely collecting
+    tests parametrized with them doesn't create any objects or open any connections; and once
+    created, the same objects are used by all the test modules. :py:meth:`close` disconnects
+    the management systems at the end of the session.
+    """
+    def __init__(self):
+        self._crud = {}
+        self._mgmt = {}
+        self._lock = Lock()
+
+    def _proxy(self, proxies, factory, provider_key):
+        with self._lock:
+            if provider_key not in proxies:
+                proxies[provider_key] = ProviderProxy(factory, provider_key)
+            return proxies[provider_key]
+
+    def crud(self, provider_key):
+        """Returns a proxy for the provider's CRUD object, see :py:func:`get_crud`"""
+        return self._proxy(self._crud, get_crud, provider_key)
+
+    def mgmt(self, provider_key):
+        """Returns a proxy for the provider's management system, see :py:func:`provider_factory`"""
+        return self._proxy(self._mgmt, provider_factory, provider_key)
+
+    def close(self):
+        """Disconnects the management systems that were used, and forgets all the objects"""
+        with self._lock:
+            mgmts = [proxy for proxy in self._mgmt.itervalues() if proxy.proxy_created]
+            self._crud.clear()
+            self._mgmt.clear()
+        for mgmt in mgmts:
+            try:
+                mgmt.disconnect()
+            except Exception as e:
+                logger.warning('Could not disconnect from provider %s: %s' % (mgmt._proxy_key, e))
+
+#: The session's shared :py:class:`ProviderRegistry`
+provider_registry = ProviderRegistry()
+
+
 def setup_provider(provider_key, validate=True, check_existing=True):
     """Add the named provider to CFME
 
@@ -188,10 +332,8 @@ def _setup_providers(cloud_or_infra, validate, check_existing):
         for provider_key in options_map[cloud_or_infra]['list']():
             provider_name = conf.cfme_data['management_systems'][provider_key]['name']
             quad = Quadicon(provider_name, options_map[cloud_or_infra]['quad'])
-            for page in paginator.pages():
-                if sel.is_displayed(quad):
-                    logger.debug('Provider "%s" exists, skipping' % provider_key)
-                    break
+            if paginator.find_element(quad, max_per_page=True):
+                logger.debug('Provider "%s" exists, skipping' % provider_key)
             else:
                 add_providers.append(provider_key)
     else:
@@ -1,4 +1,12 @@
+import atexit
+import os
+import select
+import socket
 import sys
+import time
+from collections import defaultdict, deque
+from tempfile import SpooledTemporaryFile
+from threading import Lock
 from urlparse import urlparse
 
 import paramiko
@@ -7,6 +15,98 @@ from scp import SCPClient
 from utils import conf
 from utils.net import net_check
 from utils.timeutil import parsetime
+from utils.wait import TimedOutError
+
+
+#: Interval, in seconds, of keepalive packets sent on idle pooled transports
+keepalive_interval = 60
+
+
+def _transport_ok(transport):
+    # Whether or not a pooled transport can still be used
+    if transport is None or not transport.is_active() or not transport.is_authenticated():
+        return False
+    try:
+        transport.send_ignore()
+    except (socket.error, EOFError, paramiko.SSHException):
+        return False
+    return True
+
+
+class TransportPool(object):
+    """Persistent SSH transports, shared by every :py:class:`SSHClient` in the process
+
+    Each transport is connected and authenticated once for every combination of host, port
+    and credentials, after which any number of commands and file transfers can open channels
+    on it concurrently. Transports are checked before being handed out, and replaced if they
+    have gone away.
+
+    Since sockets can't be shared with forked processes, a child process starts with an empty
+    pool rather than using the transports of its parent.
+
+    """
+    def __init__(self):
+        self._clients = {}
+        self._locks = defaultdict(Lock)
+        self._lock = Lock()
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _key(connect_kwargs):
+        return (connect_kwargs['hostname'], int(connect_kwargs.get('port', 22)),
+            connect_kwargs.get('username'), connect_kwargs.get('password'))
+
+    def _key_lock(self, key):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked, and the transports belong to the parent
+                self._clients, self._locks = {}, defaultdict(Lock)
+                self._pid = os.getpid()
+            return self._locks[key]
+
+    def get(self, connect_kwargs, fresh=False):
+        """Gets a connected transport
+
+        Args:
+            connect_kwargs: Keyword arguments for :py:meth:`paramiko.SSHClient.connect`
+            fresh: Replace the pooled transport with a new connection (default ``False``)
+
+        Returns: An authenticated :py:class:`paramiko.Transport`
+        """
+        key = self._key(connect_kwargs)
+        with self._key_lock(key):
+            client = self._clients.pop(key, None)
+            if client is not None and (fresh or not _transport_ok(client.get_transport())):
+                client.close()
+                client = None
+            if client is None:
+                client = paramiko.SSHClient()
+                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                _connect(client, **connect_kwargs)
+                client.get_transport().set_keepalive(keepalive_interval)
+            self._clients[key] = client
+            return client.get_transport()
+
+    def close(self):
+        """Closes all of the pooled transports"""
+        with self._lock:
+            clients, self._clients = self._clients, {}
+            if self._pid != os.getpid():
+                return
+        for client in clients.values():
+            client.close()
+
+#: The :py:class:`TransportPool` used by :py:class:`SSHClient`
+transport_pool = TransportPool()
+atexit.register(transport_pool.close)
+
+
+def _connect(client, hostname, *args, **kwargs):
+    port = int(kwargs.get('port', 22))
+    if not net_check(port, hostname):
+        raise Exception("Connection to %s is not available as port %d is unavailable"
+                        % (hostname, port))
+    paramiko.SSHClient.connect(client, hostname, *args, **kwargs)
 
 
 class SSHClient(paramiko.SSHClient):
@@ -14,11 +114,16 @@ class SSHClient(paramiko.SSHClient):
 
     Allows copying/overriding and use as a context manager
     Constructor kwargs are handed directly to paramiko.SSHClient.connect()
+
+    Unless ``pooled=False`` is passed, clients use transports from :py:data:`transport_pool`,
+    so only the first command run against an appliance pays for connecting and logging in.
+    Closing a pooled client leaves its transport open for the next one.
     """
-    def __init__(self, stream_output=False, **connect_kwargs):
+    def __init__(self, stream_output=False, pooled=True, **connect_kwargs):
         super(SSHClient, self).__init__()
         self.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         self._streaming = stream_output
+        self._pooled = pooled
 
         # Set up some sane defaults
         default_connect_kwargs = dict()
@@ -46,7 +151,8 @@ class SSHClient(paramiko.SSHClient):
         # then return a new instance with the updated kwargs
         new_connect_kwargs = dict(self._connect_kwargs)
         new_connect_kwargs.update(connect_kwargs)
-        new_client = SSHClient(**new_connect_kwargs)
+        new_client = SSHClient(stream_output=self._streaming, pooled=self._pooled,
+            **new_connect_kwargs)
         return new_client
 
     def __enter__(self):
@@ -58,14 +164,45 @@ class SSHClient(paramiko.SSHClient):
 
     def connect(self, hostname, *args, **kwargs):
         """See paramiko.SSHClient.connect"""
-        port = int(kwargs.get('port', 22))
-        if not net_check(port, hostname):
-            raise Exception("Connection to %s is not available as port %d is unavailable"
-                            % (hostname, port))
-        super(SSHClient, self).connect(hostname, *args, **kwargs)
-
-    def run_command(self, command):
-        return command_runner(self, command, self._streaming)
+        if self._pooled and not args:
+            self._transport = transport_pool.get(dict(kwargs, hostname=hostname))
+        else:
+            _connect(self, hostname, *args, **kwargs)
+
+    def close(self):
+        """See paramiko.SSHClient.close
+
+        Pooled transports are left open to be reused.
+        """
+        if self._pooled:
+            self._transport = None
+        else:
+            super(SSHClient, self).close()
+
+    def open_session(self):
+        """Opens a channel on this client's transport
+
+        If a pooled transport has gone away, it is reconnected once.
+        """
+        try:
+            return self.get_transport().open_session()
+        except (socket.error, EOFError, paramiko.SSHException):
+            if not self._pooled:
+                raise
+            self._transport = transport_pool.get(self._connect_kwargs, fresh=True)
+            return self._transport.open_session()
+
+    def run_command(self, command, timeout=None):
+        return command_runner(self, command, self._streaming, timeout)
+
+    def start_command(self, command):
+        """Starts a command without waiting for it to finish
+
+        Returns: A :py:class:`RemoteCommand`
+        """
+        if self.get_transport() is None:
+            self.connect(**self._connect_kwargs)
+        return RemoteCommand(self, command)
 
     def run_rails_command(self, command):
         return rails_runner(self, command, self._streaming)
@@ -89,33 +226,184 @@ class SSHClient(paramiko.SSHClient):
         return is_downstream_getter(self)
 
 
-def command_runner(client, command, stream_output=False):
+class RemoteCommand(object):
+    """A command running on its own channel of an SSH transport
+
+    Output is read as it arrives, by waiting on the channel with ``select`` rather than polling
+    it. All of the output, stdout and stderr interleaved, is kept in memory up to
+    ``max_memory`` bytes, after which it is spilled to a temporary file.
+
+    Any number of commands can run at the same time over one transport; see
+    :py:func:`wait_for_commands`.
+
+    Args:
+        client: A connected :py:class:`SSHClient`
+        command: The command to run
+        max_memory: Number of bytes of output to keep in memory (default 1MB)
+
+    Usage:
+
+        with RemoteCommand(ssh_client, 'tail -n 1000 /var/www/miq/vmdb/log/evm.log') as cmd:
+            for stream, line in cmd.lines(timeout=60):
+                if 'ERROR' in line:
+                    ...
+            print cmd.exit_status
+
+    """
+    def __init__(self, client, command, max_memory=1024 * 1024):
+        self.command = command
+        self.session = client.open_session()
+        self.session.exec_command(command)
+        self.exit_status = None
+        self._output = SpooledTemporaryFile(max_memory)
+        self._partial = {'stdout': '', 'stderr': ''}
+        self._lines = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def fileno(self):
+        # Lets commands be waited on with select
+        return self.session.fileno()
+
+    @property
+    def finished(self):
+        return self.exit_status is not None
+
+    def _feed(self, stream, data):
+        self._output.write(data)
+        lines = (self._partial[stream] + data).split('\n')
+        self._partial[stream] = lines.pop()
+        self._lines.extend((stream, line + '\n') for line in lines)
+
+    def read_available(self):
+        """Reads whatever output the command has sent so far, without blocking"""
+        session = self.session
+        while session.recv_ready():
+            self._feed('stdout', session.recv(32768))
+        while session.recv_stderr_ready():
+            self._feed('stderr', session.recv_stderr(32768))
+        # The exit status is sent after all of the output
+        if not self.finished and (session.exit_status_ready() or session.closed):
+            if not (session.recv_ready() or session.recv_stderr_ready()):
+                for stream in ('stdout', 'stderr'):
+                    if self._partial[stream]:
+                        self._lines.append((stream, self._partial[stream]))
+                        self._partial[stream] = ''
+                self.exit_status = session.recv_exit_status()
+
+    def lines(self, timeout=None):
+        """Yields the command's output as it arrives, until the command finishes
+
+        Args:
+            timeout: Number of seconds to wait for the command to finish (default no limit)
+
+        Yields: ``(stream, line)`` tuples, where stream is ``stdout`` or ``stderr``
+
+        Raises:
+            TimedOutError: If the command takes longer than ``timeout``. The command's channel
+                is closed.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            self.read_available()
+            while self._lines:
+                yield self._lines.popleft()
+            if self.finished:
+                return
+            if deadline is not None and time.time() >= deadline:
+                self.session.close()
+                raise TimedOutError('Command {} did not finish in {} seconds'.format(
+                    self.command.strip(), timeout))
+            _select([self], deadline)
+
+    def wait(self, timeout=None):
+        """Waits for the command to finish
+
+        Takes the same arguments as :py:meth:`lines`.
+
+        Returns: The exit status of the command
+        """
+        for line in self.lines(timeout):
+            pass
+        return self.exit_status
+
+    @property
+    def output(self):
+        """All of the output read so far"""
+        self._output.seek(0)
+        output = self._output.read()
+        self._output.seek(0, os.SEEK_END)
+        return output
+
+    def close(self):
+        self.session.close()
+        self._output.close()
+
+
+def _select(commands, deadline=None):
+    # Waits for output on any of the commands. The exit status doesn't wake select up, so
+    # don't wait for too long at a time
+    wait = 1
+    if deadline is not None:
+        wait = max(min(wait, deadline - time.time()), 0)
+    select.select(commands, [], [], wait)
+
+
+def wait_for_commands(commands, timeout=None):
+    """Waits for many :py:class:`RemoteCommand` s to finish at once
+
+    Args:
+        commands: The commands to wait for
+        timeout: Number of seconds to wait for all of the commands (default no limit)
+
+    Returns: A list of the exit statuses of the commands
+
+    Raises:
+        TimedOutError: If the commands take longer than ``timeout``. The channels of the
+            commands that haven't finished are closed.
+
+    Usage:
+
+        with ssh_client as client:
+            commands = [RemoteCommand(client, 'rpm -q {}'.format(rpm)) for rpm in rpms]
+            statuses = wait_for_commands(commands, timeout=60)
+
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        running = []
+        for command in commands:
+            command.read_available()
+            # Output isn't being consumed as lines, don't let it pile up
+            command._lines.clear()
+            if not command.finished:
+                running.append(command)
+        if not running:
+            return [command.exit_status for command in commands]
+        if deadline is not None and time.time() >= deadline:
+            for command in running:
+                command.session.close()
+            raise TimedOutError('{} commands did not finish in {} seconds'.format(
+                len(running), timeout))
+        _select(running, deadline)
+
+
+def command_runner(client, command, stream_output=False, timeout=None):
     template = '%s\n'
     command = template % command
     with client as ctx:
-        transport = ctx.get_transport()
-        session = transport.open_session()
-        session.exec_command(command)
-        stdout = session.makefile()
-        stderr = session.makefile_stderr()
-        output = ''
-        while True:
-            if session.recv_ready:
-                for line in stdout:
-                    output += line
-                    if stream_output:
+        with RemoteCommand(ctx, command) as remote:
+            for stream, line in remote.lines(timeout):
+                if stream_output:
+                    if stream == 'stdout':
                         sys.stdout.write(line)
-
-            if session.recv_stderr_ready:
-                for line in stderr:
-                    output += line
-                    if stream_output:
+                    else:
                         sys.stderr.write(line)
-
-            if session.exit_status_ready():
-                break
-        exit_status = session.recv_exit_status()
-        return exit_status, output
+            return remote.exit_status, remote.output
 
     # Returning two things so tuple unpacking the return works even if the ssh client fails
     return None, None
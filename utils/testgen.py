@@ -82,13 +82,11 @@ More information on ``parametrize`` can be found in pytest's documentation:
 """
 import pytest
 
-from cfme.cloud.provider import get_from_config as get_cloud_provider
-from cfme.infrastructure.provider import get_from_config as get_infra_provider
 from cfme.infrastructure.pxe import get_pxe_server_from_config
 from fixtures.prov_filter import filtered
 from utils.conf import cfme_data
 from utils.log import logger
-from utils.providers import cloud_provider_type_map, infra_provider_type_map, provider_factory
+from utils.providers import cloud_provider_type_map, infra_provider_type_map, provider_registry
 
 
 def generate(gen_func, *args, **kwargs):
@@ -189,6 +187,11 @@ def provider_by_type(metafunc, provider_types, *fields):
         ``provider_mgmt``
             the provider's backend manager, from :py:class:`utils.mgmt_system`
 
+    ``provider_crud`` and ``provider_mgmt`` are :py:class:`utils.providers.ProviderProxy` s from
+    :py:data:`utils.providers.provider_registry`: they're created the first time a test uses
+    them, and shared by all the tests in the session. Tests that change them should change
+    them back when they're done.
+
     Returns:
         An tuple of ``(argnames, argvalues, idlist)`` for use in a pytest_generate_tests hook, or
         with the :py:func:`parametrize` helper.
@@ -249,13 +252,10 @@ def provider_by_type(metafunc, provider_types, *fields):
                     (key, provider)
                 )
 
-        if prov_type in cloud_provider_type_map:
-            crud = get_cloud_provider(provider)
-        elif prov_type in infra_provider_type_map:
-            crud = get_infra_provider(provider)
-        # else: wat? You deserve the NameError you're about to receive
-
-        mgmt = provider_factory(provider)
+        # Proxies from the session's registry, so the objects are only created when a test
+        # uses them, and then shared with every other module parametrized with this provider
+        crud = provider_registry.crud(provider)
+        mgmt = provider_registry.mgmt(provider)
 
         values = []
         special_args_map = dict(zip(special_args, (provider, data, crud, mgmt, prov_type)))
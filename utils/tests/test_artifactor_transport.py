@@ -0,0 +1,94 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from artifactor.transport import (UnixHookClient, UnixHookServer, recv_message,
+    send_message)
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class FakeRigger(object):
+    def __init__(self):
+        self.hooks = []
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def process_hook(self, hook_name, **kwargs):
+        with self.lock:
+            self.hooks.append((hook_name, kwargs))
+        return {'hook_name': hook_name}, {'count': len(self.hooks)}
+
+    def log_message(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def server(request, tmpdir):
+    server = UnixHookServer(tmpdir.join('art.sock').strpath, FakeRigger(), workers=2)
+    server.serve_in_background()
+    request.addfinalizer(server.close)
+    return server
+
+
+def test_framing():
+    left, right = socket.socketpair()
+    send_message(left, {'hook_name': 'start_test', 'data': {'x': [1, 2]}})
+    send_message(left, 'x' * 100000)
+    assert recv_message(right) == {'hook_name': 'start_test', 'data': {'x': [1, 2]}}
+    assert recv_message(right) == 'x' * 100000
+    left.close()
+    assert recv_message(right) is None
+
+
+def test_hooks_in_order(server):
+    client = UnixHookClient(server.server_address)
+    for i in range(100):
+        client.fire_hook('log_message', n=i)
+    # Hooks from a connection run in order, so this runs after all the others
+    result = client.fire_hook('build_report', grab_result=True)
+    assert result == {'hook_name': 'build_report', 'count': 101}
+    assert [kwargs['n'] for name, kwargs in server.rigger.hooks[:100]] == range(100)
+    client.close()
+
+
+def test_pipelined_replies(server):
+    client = UnixHookClient(server.server_address)
+    replies = [client.send_hook('hook{}'.format(i)) for i in range(10)]
+    assert [reply.get(5)['hook_name'] for reply in replies] == [
+        'hook{}'.format(i) for i in range(10)]
+    client.close()
+
+
+def test_no_server(tmpdir):
+    client = UnixHookClient(tmpdir.join('nothing.sock').strpath)
+    assert client.fire_hook('start_test') is None
+    assert client.fire_hook('start_test', grab_result=True) is None
+
+
+def test_close_runs_queued_hooks(server):
+    # Hooks that take a while, fired and forgotten, must still run before close() returns
+    process_hook = server.rigger.process_hook
+
+    def slow_process_hook(hook_name, **kwargs):
+        time.sleep(0.05)
+        return process_hook(hook_name, **kwargs)
+    server.rigger.process_hook = slow_process_hook
+
+    client = UnixHookClient(server.server_address)
+    # Once this has a reply, the server is handling the connection
+    client.fire_hook('start_session', grab_result=True)
+    for i in range(10):
+        client.fire_hook('log_message', n=i)
+    client.fire_hook('finish_session')
+    client.close()
+    server.close()
+    assert [name for name, kwargs in server.rigger.hooks][-1] == 'finish_session'
+    assert len(server.rigger.hooks) == 12
+    assert not os.path.exists(server.server_address)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0621
+import threading
+import time
+
+import pytest
+
+from utils.log import MultiLogger
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class ArtClient(object):
+    def __init__(self):
+        self.hooks = []
+        self.blocker = threading.Event()
+        self.blocker.set()
+
+    def fire_hook(self, hook_name, **kwargs):
+        self.blocker.wait()
+        self.hooks.append((hook_name, kwargs))
+
+    def __nonzero__(self):
+        return True
+
+
+@pytest.fixture
+def art_client():
+    return ArtClient()
+
+
+@pytest.fixture
+def multilogger(art_client):
+    multilogger = MultiLogger()
+    multilogger._art_instance = art_client
+    multilogger._slaveid = 'gw0'
+    return multilogger
+
+
+def sent_messages(art_client):
+    messages = []
+    for hook_name, kwargs in art_client.hooks:
+        assert hook_name == 'log_messages'
+        assert kwargs['slaveid'] == 'gw0'
+        messages.extend(record['message'] for record in kwargs['log_records'])
+    return messages
+
+
+def test_log_batches(multilogger, art_client):
+    for i in range(250):
+        multilogger.debug(str(i))
+    assert multilogger.flush()
+    assert sent_messages(art_client) == map(str, range(250))
+    # 250 records in batches of at most 100
+    assert len(art_client.hooks) >= 3
+
+
+def test_log_queue_full(multilogger, art_client):
+    queue = multilogger._start_sender()
+    queue.maxsize = 2
+    multilogger._batch_size = 1
+    # Hold up the sender, and fill up the queue behind the record it is trying to send
+    art_client.blocker.clear()
+    multilogger.debug('first')
+    while queue.qsize():
+        time.sleep(0.01)
+    for i in range(5):
+        multilogger.debug(str(i))
+    assert multilogger.dropped == 3
+
+    art_client.blocker.set()
+    assert multilogger.flush()
+    messages = sent_messages(art_client)
+    dropped_message = '3 log messages were dropped, the log queue was full'
+    assert dropped_message in messages
+    messages.remove(dropped_message)
+    assert messages == ['first', '0', '1']
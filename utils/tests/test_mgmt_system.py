@@ -0,0 +1,310 @@
+import time
+from threading import Thread, Timer
+
+import pytest
+from pysphere.resources.vi_exception import VIException
+
+from utils import mgmt_system
+from utils.mgmt_system import (Inventory, InventoryItem, OpenstackSystem, VMActionResult,
+    VMActionResults, VMActionsFailed, VMInstanceNotFound, VMStateWatcher, VMWareSystem)
+from utils.wait import TimedOutError, wait_for
+
+
+def item(name, item_id, template=False):
+    return InventoryItem(name=name, id=item_id, state='ACTIVE', ip=None, template=template,
+                         obj=name)
+
+
+class InventoryTester(OpenstackSystem):
+    # A mgmt system with a fake backend, counting how many snapshots it's asked for
+    def __init__(self, **kwargs):
+        super(OpenstackSystem, self).__init__(**kwargs)
+        self.items = [item('vm1', 1), item('vm2', 2), item('template1', 3, template=True)]
+        self.snapshots = 0
+
+    def _take_inventory(self):
+        self.snapshots += 1
+        return list(self.items)
+
+
+@pytest.fixture
+def mgmt():
+    return InventoryTester()
+
+
+def test_inventory_indexes():
+    inventory = Inventory([item('vm1', 1), item('vm1', 2), item('template1', 3, template=True),
+                           item(None, 4)])
+    assert [i.id for i in inventory.find('vm1')] == [1, 2]
+    assert inventory.find(item_id=3)[0].name == 'template1'
+    assert inventory.find('template1', template=False) == []
+    assert inventory.find('missing') == []
+    assert [i.id for i in inventory.vms] == [1, 2, 4]
+    assert [i.id for i in inventory.templates] == [3]
+
+
+def test_inventory_reused_within_ttl(mgmt):
+    assert mgmt.list_vm() == ['vm1', 'vm2']
+    assert mgmt.list_template() == ['template1']
+    assert mgmt.snapshots == 1
+
+
+def test_inventory_expires(mgmt):
+    mgmt.inventory_ttl = 0
+    mgmt.list_vm()
+    mgmt.list_vm()
+    assert mgmt.snapshots == 2
+
+
+def test_inventory_refreshed_on_miss(mgmt):
+    mgmt.list_vm()
+    mgmt.items.append(item('vm3', 5))
+    assert mgmt._find_instance_by_name('vm3') == 'vm3'
+    assert mgmt.snapshots == 2
+
+
+def test_inventory_invalidated(mgmt):
+    mgmt.list_vm()
+    mgmt.items.pop(0)
+    assert mgmt.list_vm() == ['vm1', 'vm2']
+    mgmt.invalidate_inventory()
+    assert mgmt.list_vm() == ['vm2']
+
+
+class WatcherTester(VMStateWatcher):
+    # A watcher following a fake system, which reports whatever states the test sets
+    poll_interval = 0.1
+
+    @classmethod
+    def key(cls, mgmt):
+        return 'fake'
+
+    def _follow(self):
+        self._set_states({'vm1': 'off', 'vm2': 'off'}, complete=True)
+        self._stopped.wait()
+
+
+@pytest.fixture
+def watcher(request):
+    watcher = WatcherTester(None)
+    watcher.start()
+    request.addfinalizer(watcher.stop)
+    wait_for(lambda: watcher.ready, num_sec=5, delay=0.1)
+    return watcher
+
+
+def test_watcher_wakes_waiters(watcher):
+    backend_reads = []
+
+    def read_state(vm_name):
+        backend_reads.append(vm_name)
+        return 'off'
+
+    Timer(0.5, watcher._set_states, [{'vm1': 'on'}]).start()
+    # Waiters poll the watcher every 10 seconds, so only the wake can end this in time
+    watcher.poll_interval = 10
+    out, duration = watcher.wait_for_state('vm1', {'on'}, read_state, num_sec=5)
+    assert duration < 5
+    assert watcher.state('vm1') == 'on'
+    assert watcher.state('vm2') == 'off'
+    assert backend_reads == []
+
+
+def test_watcher_falls_back_to_backend(watcher):
+    # The watcher doesn't know vm3, so the waiter has to read its state from the backend
+    states = iter(['off', 'off', 'on'])
+    watcher.wait_for_state('vm3', {'on'}, lambda vm_name: next(states), num_sec=5)
+    assert next(states, None) is None
+
+
+class FakeVIServer(object):
+    # Just enough of pysphere's VIServer to count sessions, and expire them
+    def __init__(self):
+        self.alive = True
+        self.keepalives = 0
+
+    def connect(self, hostname, username, password):
+        pass
+
+    def keep_session_alive(self):
+        self.keepalives += 1
+        return self.alive
+
+    def disconnect(self):
+        self.alive = False
+
+    def get_hosts(self):
+        if not self.alive:
+            raise VIException('The session is not authenticated.', 'NotAuthenticatedFault')
+        return {'host-1': 'host1'}
+
+
+@pytest.fixture
+def vi_server_pool(request, monkeypatch):
+    pool = mgmt_system.VIServerPool()
+    monkeypatch.setattr(mgmt_system, 'VIServer', FakeVIServer)
+    monkeypatch.setattr(mgmt_system, 'vi_server_pool', pool)
+    request.addfinalizer(pool.close)
+    return pool
+
+
+def test_vi_server_pool_sessions(vi_server_pool):
+    vsphere = VMWareSystem('vsphere', 'user', 'password')
+    api = vsphere.api
+    # No keepalive on every access, and other objects in this thread share the session
+    assert vsphere.api is api
+    assert VMWareSystem('vsphere', 'user', 'password').api is api
+    assert api.keepalives == 0
+
+    # Other threads get their own session
+    thread_apis = []
+    thread = Thread(target=lambda: thread_apis.append(vsphere.api))
+    thread.start()
+    thread.join()
+    assert thread_apis[0] is not api
+
+    # Released sessions are handed out again
+    vsphere.disconnect()
+    assert vsphere.api in (api, thread_apis[0])
+
+
+def test_vi_server_reconnects(vi_server_pool):
+    vsphere = VMWareSystem('vsphere', 'user', 'password')
+    api = vsphere.api
+    api.alive = False
+    assert vsphere.list_host() == {'host-1': 'host1'}
+    assert vsphere.api is not api
+
+
+def test_vi_server_keepalive(vi_server_pool):
+    vsphere = VMWareSystem('vsphere', 'user', 'password')
+    api = vsphere.api
+    vsphere.disconnect()
+    expired = VMWareSystem('vsphere2', 'user', 'password')
+    expired_api = expired.api
+    expired.disconnect()
+    expired_api.alive = False
+    vi_server_pool._keepalive()
+    # Live sessions go back in the pool, expired ones are dropped
+    assert api.keepalives == 1
+    assert vsphere.api is api
+    assert expired.api is not expired_api
+
+
+def test_vi_server_no_mutating_retry(vi_server_pool):
+    vsphere = VMWareSystem('vsphere', 'user', 'password')
+    vsphere.api.alive = False
+    calls = []
+
+    def suspend(vm_name):
+        calls.append(vm_name)
+        vsphere.api.get_hosts()
+    vsphere._get_vm = lambda vm_name: suspend(vm_name)
+    vsphere.wait_vm_steady = lambda vm_name: None
+    # Methods changing things aren't run twice
+    with pytest.raises(VIException):
+        vsphere.suspend_vm('vm1')
+    assert calls == ['vm1']
+
+
+class BatchTester(InventoryTester):
+    # Starts VMs slowly, one at a time
+    def start_vm(self, vm_name):
+        if vm_name == 'broken':
+            raise VMInstanceNotFound(vm_name)
+        time.sleep(0.5)
+        return True
+
+
+def test_batch_threaded():
+    mgmt = BatchTester()
+    start = time.time()
+    results = mgmt._run_threaded('Starting', ['vm1', 'vm2', 'broken', 'vm3'], mgmt.start_vm,
+                                 num_sec=10)
+    # Each takes half a second, so they must have been started together
+    assert time.time() - start < 1.5
+    assert results.keys() == ['vm1', 'vm2', 'broken', 'vm3']
+    assert [result.vm_name for result in results.succeeded] == ['vm1', 'vm2', 'vm3']
+    assert isinstance(results['broken'].error, VMInstanceNotFound)
+    with pytest.raises(VMInstanceNotFound):
+        results.raise_failures()
+
+
+def test_batch_polls_all_at_once(mgmt):
+    # The VMs become ACTIVE one at a time, and each poll reads all of them from one snapshot
+    def take_inventory():
+        mgmt.snapshots += 1
+        for i, vm in enumerate(mgmt.items):
+            yield vm._replace(state='ACTIVE' if i < mgmt.snapshots else 'BUILD')
+
+    mgmt.items = [item('vm1', 1), item('vm2', 2), item('vm3', 3)]
+    mgmt._take_inventory = take_inventory
+    results = mgmt._run_on_vms('Starting', ['vm1', 'vm2', 'vm3', 'missing'], lambda name: name,
+                               mgmt._inventory_poll({'ACTIVE'}), num_sec=1, delay=0.1)
+    assert [result.vm_name for result in results.succeeded] == ['vm1', 'vm2', 'vm3']
+    assert isinstance(results['missing'].error, TimedOutError)
+
+
+def test_batch_failures_raised():
+    results = VMActionResults((name, VMActionResult(name, error=ValueError(name)))
+                              for name in ['vm1', 'vm2'])
+    results['vm3'] = VMActionResult('vm3', True)
+    with pytest.raises(VMActionsFailed) as e:
+        results.raise_failures()
+    assert [result.vm_name for result in e.value.failed] == ['vm1', 'vm2']
+    assert e.value.total == 3
+
+
+class FakeRHEVObject(object):
+    # Just enough of an ovirtsdk VM or event
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+    def get_status(self):
+        return FakeRHEVObject(get_state=lambda: self.state)
+
+    def get_vm(self):
+        return self.vm
+
+
+class FakeRHEVAPI(object):
+    # An API whose events are listed newest first, like RHEV's
+    events_list = []
+    vm_states = {}
+
+    def __init__(self, **kwargs):
+        self.events = FakeRHEVObject(list=self.list_events)
+        self.vms = FakeRHEVObject(list=self.list_vms, get=self.get_vm)
+
+    def list_events(self, max=None, from_event_id=None):
+        events = sorted(self.events_list, key=lambda event: -int(event.id))
+        return events[:max] if max else events
+
+    def list_vms(self):
+        return [self.get_vm(vm_id) for vm_id in self.vm_states]
+
+    def get_vm(self, id):
+        if id in self.vm_states:
+            return FakeRHEVObject(id=id, name=id, state=self.vm_states[id])
+
+    def disconnect(self):
+        pass
+
+
+def test_rhevm_watcher_reads_all_new_events(request, monkeypatch):
+    FakeRHEVAPI.vm_states = {'vm1': 'down', 'vm2': 'down'}
+    FakeRHEVAPI.events_list = [FakeRHEVObject(id='1', vm=None)]
+    monkeypatch.setattr(mgmt_system, 'API', FakeRHEVAPI)
+    monkeypatch.setattr(mgmt_system.RHEVMStateWatcher, 'event_interval', 0.1)
+    watcher = mgmt_system.RHEVMStateWatcher(
+        FakeRHEVObject(_api_kwargs={'username': 'user', 'url': 'rhevm'}))
+    watcher.start()
+    request.addfinalizer(watcher.stop)
+    wait_for(lambda: watcher.ready, num_sec=5, delay=0.1)
+
+    # Both VMs change state, and both their events are seen in the same read
+    FakeRHEVAPI.vm_states = {'vm1': 'up', 'vm2': 'up'}
+    FakeRHEVAPI.events_list += [
+        FakeRHEVObject(id='2', vm=FakeRHEVObject(get_id=lambda: 'vm1')),
+        FakeRHEVObject(id='3', vm=FakeRHEVObject(get_id=lambda: 'vm2'))]
+    wait_for(lambda: watcher.state('vm1') == watcher.state('vm2') == 'up', num_sec=5, delay=0.1)
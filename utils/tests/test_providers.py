@@ -0,0 +1,76 @@
+import pytest
+
+from utils import providers
+from utils.providers import ProviderProxy, ProviderRegistry
+from utils.update import Updateable, update
+
+
+class FakeMgmt(object):
+    # A management system that remembers being made and disconnected
+    made = []
+
+    def __init__(self, provider_key):
+        self.provider_key = provider_key
+        self.connected = True
+        self.made.append(provider_key)
+
+    def disconnect(self):
+        self.connected = False
+
+
+@pytest.fixture
+def registry(request, monkeypatch):
+    FakeMgmt.made = []
+    monkeypatch.setattr(providers, 'provider_factory', FakeMgmt)
+    registry = ProviderRegistry()
+    request.addfinalizer(registry.close)
+    return registry
+
+
+def test_proxy_created_on_use():
+    FakeMgmt.made = []
+    proxy = ProviderProxy(FakeMgmt, 'prov1')
+    assert 'not created yet' in repr(proxy)
+    assert FakeMgmt.made == []
+    assert isinstance(proxy, FakeMgmt)
+    assert proxy.provider_key == 'prov1'
+    proxy.connected = False
+    assert proxy.proxy_target().connected is False
+    assert FakeMgmt.made == ['prov1']
+
+
+def test_registry_shares_and_closes(registry):
+    mgmt = registry.mgmt('prov1')
+    assert registry.mgmt('prov1') is mgmt
+    unused = registry.mgmt('prov2')
+    mgmt.provider_key
+    target = mgmt.proxy_target()
+    registry.close()
+    # Only the systems that were used are created, and disconnected
+    assert FakeMgmt.made == ['prov1']
+    assert not target.connected
+    assert not unused.proxy_created
+    assert registry.mgmt('prov1') is not mgmt
+
+
+class FakeCrud(Updateable):
+    # A CRUD object recording the updates it's asked to make; outside of its own fields, which
+    # update() swaps around
+    updates = []
+
+    def __init__(self, provider_key):
+        self.name = provider_key
+
+    def update(self, updates):
+        self.updates.append(updates)
+
+
+def test_proxy_update():
+    FakeCrud.updates = []
+    proxy = ProviderProxy(FakeCrud, 'prov1')
+    with update(proxy):
+        proxy.name = 'renamed'
+    crud = proxy.proxy_target()
+    assert FakeCrud.updates == [{'name': 'renamed'}]
+    assert crud.name == proxy.name == 'renamed'
+    assert proxy == crud
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import pytest
 from utils.randomness import generate_random_string
+from utils.ssh import wait_for_commands
 
 pytestmark = [
     pytest.mark.nondestructive,
@@ -50,3 +51,19 @@ def test_scp_client_can_put_a_file(ssh_client, tmpdir):
     assert "content" in tmpfile.read()
     # Clean up the server
     ssh_client.run_command("rm -f /tmp/%s" % tmpfile.basename)
+
+
+def test_ssh_client_streams_output(ssh_client):
+    # Output arrives line by line, tagged with the stream it came from
+    with ssh_client as client:
+        with client.start_command('echo out; echo err >&2; exit 3') as command:
+            lines = list(command.lines(timeout=30))
+            assert ('stdout', 'out\n') in lines
+            assert ('stderr', 'err\n') in lines
+            assert command.exit_status == 3
+
+
+def test_ssh_client_runs_commands_concurrently(ssh_client):
+    with ssh_client as client:
+        commands = [client.start_command('sleep 2; exit {}'.format(i)) for i in range(5)]
+        assert wait_for_commands(commands, timeout=30) == range(5)
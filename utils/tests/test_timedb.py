@@ -0,0 +1,71 @@
+import pytest
+
+from utils.timedb import TimingDB, percentile
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+nodeid = 'cfme/tests/test_module.py::test_thing'
+
+
+@pytest.fixture
+def timings_path(tmpdir):
+    return tmpdir.join('timings.db')
+
+
+def record_run(path, run_id, setup, call, teardown=0.5, nodeid=nodeid):
+    timings = TimingDB(path, run_id=run_id)
+    timings.record(nodeid, 'setup', setup, provider='vsphere5')
+    timings.record(nodeid, 'call', call, provider='vsphere5')
+    if teardown is not None:
+        timings.record(nodeid, 'teardown', teardown, provider='vsphere5')
+    return timings
+
+
+def test_percentile():
+    values = range(1, 101)
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([3], 95) == 3
+    assert percentile([], 50) is None
+
+
+def test_test_stats(timings_path):
+    for run in range(1, 11):
+        record_run(timings_path, str(run), setup=run, call=1)
+
+    timings = TimingDB(timings_path)
+    stats = timings.test_stats(nodeid)
+    assert stats.count == 10
+    assert stats.p50 == 6.5
+    assert stats.p95 == 11.5
+
+    setup_stats = timings.test_stats(nodeid, phase='setup')
+    assert setup_stats.p50 == 5
+
+    assert timings.test_stats(nodeid, provider='rhevm').count == 0
+    assert timings.module_stats('cfme/tests/test_module.py') == stats
+    assert timings.test_durations() == {nodeid: 6.5}
+
+
+def test_incomplete_tests_ignored(timings_path):
+    record_run(timings_path, '1', setup=1, call=1)
+    record_run(timings_path, '2', setup=1, call=100, teardown=None)
+
+    assert TimingDB(timings_path).test_stats(nodeid).count == 1
+
+
+def test_regressions(timings_path):
+    for run in range(1, 4):
+        record_run(timings_path, str(run), setup=1, call=1)
+
+    timings = record_run(timings_path, '4', setup=1, call=1)
+    assert timings.regressions() == []
+
+    timings = record_run(timings_path, '5', setup=1, call=30)
+    (regressed_nodeid, duration, stats), = timings.regressions()
+    assert regressed_nodeid == nodeid
+    assert duration == 31.5
+    assert stats.count == 4
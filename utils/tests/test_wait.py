@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=W0621
 import pytest
+import threading
 import time
-from utils.wait import wait_for, TimedOutError
+from utils.wait import wait_for, wait_for_all, wait_for_any, wait_stats, TimedOutError
 
 pytestmark = [
     pytest.mark.nondestructive,
@@ -41,3 +42,70 @@ def test_lambda_long_wait():
     incman = Incrementor()
     with pytest.raises(TimedOutError):
         wait_for(lambda self: self.i_sleep_a_lot() > 10, [incman], num_sec=1, message="this fails")
+
+
+def test_wait_never_sleeps_past_deadline():
+    start = time.time()
+    with pytest.raises(TimedOutError):
+        wait_for(lambda: False, num_sec=0.5, delay=10, message="deadline")
+    assert time.time() - start < 1, "Should have stopped at the deadline, not after the delay"
+    stats = wait_stats[-1]
+    assert stats.timed_out
+    assert stats.attempts == 2, "Should try once more at the deadline"
+
+
+def test_wait_fail_func_after_last_attempt():
+    fails = []
+    with pytest.raises(TimedOutError):
+        wait_for(lambda: False, num_sec=0.5, delay=10, fail_func=lambda: fails.append(1))
+    assert len(fails) == wait_stats[-1].attempts == 2
+
+
+def test_wait_expo_max_delay():
+    delays = []
+
+    def record_delay():
+        delays.append(time.time())
+    wait_for(lambda: len(delays) > 4, delay=.01, expo=True, max_delay=.02,
+        fail_func=record_delay)
+    stats = wait_stats[-1]
+    assert stats.attempts == 6
+    assert stats.sleep_time < .15, "Delays should be capped at max_delay"
+
+
+def test_wait_wake():
+    wake = threading.Event()
+    incman = Incrementor()
+    threading.Timer(.2, wake.set).start()
+    ec, tc = wait_for(lambda: incman.i_sleep_a_lot() > 1, delay=30, wake=wake)
+    assert tc < 5, "Should have been woken up early"
+    assert wait_stats[-1].wakes == 1
+    assert not wake.is_set()
+
+
+def test_wait_for_all_concurrently():
+    incmen = [Incrementor() for __ in range(5)]
+    start = time.time()
+    results = wait_for_all([lambda incman=incman: incman.i_sleep_a_lot() > 3 for incman in incmen],
+        delay=.05)
+    assert len(results) == 5
+    assert all(out is True for out, tc in results)
+    assert time.time() - start < 1, "Waits should have run concurrently"
+
+
+def test_wait_for_all_times_out():
+    with pytest.raises(TimedOutError):
+        wait_for_all([lambda: True, {'func': lambda: False, 'delay': .05}], num_sec=.5)
+
+
+def test_wait_for_any():
+    slow, fast = Incrementor(), Incrementor()
+    index, (out, tc) = wait_for_any([
+        {'func': lambda: slow.i_sleep_a_lot() > 20, 'delay': .05},
+        {'func': lambda: fast.i_sleep_a_lot() > 2, 'delay': .05},
+    ], num_sec=10)
+    assert index == 1
+    assert tc < 5
+    value = slow.value
+    time.sleep(.5)
+    assert slow.value <= value + 1, "Abandoned waits should stop polling"
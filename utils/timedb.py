@@ -0,0 +1,194 @@
+"""Test timing database
+
+Records how long each phase (setup, call, teardown) of each test took, across test runs,
+in a local SQLite database. When running distributed tests, the master process records every
+test report it receives from its slaves, along with the version of the appliance the test
+ran against and the provider the test was parametrized with, if any.
+
+The recorded timings can be used to predict how long tests are going to take, and to spot
+tests that have become slower than usual.
+
+Usage:
+
+.. code-block:: python
+
+    from utils.timedb import TimingDB
+
+    timings = TimingDB()
+
+    # median and 95th percentile duration of a test, in seconds
+    stats = timings.test_stats('cfme/tests/test_login.py::test_login')
+    print stats.count, stats.p50, stats.p95
+
+    # only look at the fixture setup phase
+    stats = timings.test_stats('cfme/tests/test_login.py::test_login', phase='setup')
+
+    # median and 95th percentile duration of a whole module
+    stats = timings.module_stats('cfme/tests/infrastructure/test_provisioning.py')
+
+    # a mapping of test nodeids to their median duration, useful when scheduling tests
+    estimates = timings.test_durations()
+
+Durations for a test or module are totaled for each test run in which they ran, and statistics
+are taken across those totals. Only tests that made it to their teardown phase in a run are
+considered, so interrupted tests don't drag the numbers down.
+
+"""
+import sqlite3
+from math import ceil
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from time import time
+
+from utils.path import log_path
+
+#: Statistics returned by the :py:class:`TimingDB` query methods
+Stats = namedtuple('Stats', ['count', 'p50', 'p95'])
+
+_schema = """
+CREATE TABLE IF NOT EXISTS timings (
+    run_id TEXT NOT NULL,
+    nodeid TEXT NOT NULL,
+    module TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    outcome TEXT,
+    duration REAL NOT NULL,
+    appliance_version TEXT,
+    provider TEXT,
+    recorded REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_nodeid ON timings (nodeid, run_id);
+CREATE INDEX IF NOT EXISTS timings_module ON timings (module);
+CREATE INDEX IF NOT EXISTS timings_run_id ON timings (run_id);
+"""
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a list of values, or ``None`` if there aren't any"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+def _stats(values):
+    return Stats(len(values), percentile(values, 50), percentile(values, 95))
+
+
+class TimingDB(object):
+    """SQLite-backed store of test phase durations
+
+    Args:
+        path: Path to the database file (default ``log/timings.db``)
+        run_id: Identifier for the current test run, used to group timings by run. Defaults
+            to the current date and time.
+
+    """
+    def __init__(self, path=None, run_id=None):
+        self.path = str(path or log_path.join('timings.db'))
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d%H%M%S%f')
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(_schema)
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, nodeid, phase, duration, outcome=None, appliance_version=None,
+            provider=None):
+        """Record the duration of one phase of a test in the current run"""
+        module = nodeid.split('::')[0]
+        with self.conn:
+            self.conn.execute('INSERT INTO timings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.run_id, nodeid, module, phase, outcome, duration,
+                 appliance_version, provider, time()))
+
+    def record_report(self, report, appliance_version=None, provider=None):
+        """Record the duration of a py.test ``TestReport``"""
+        self.record(report.nodeid, report.when, report.duration, report.outcome,
+            appliance_version, provider)
+
+    def _totals(self, group_by, phase=None, appliance_version=None, provider=None,
+            include_current=False, **filters):
+        # Sum durations per run, per group_by column, of tests that completed a run
+        where = ["EXISTS (SELECT 1 FROM timings t WHERE t.nodeid = timings.nodeid "
+                 "AND t.run_id = timings.run_id AND t.phase = 'teardown')"]
+        args = []
+        if phase is not None:
+            where.append('phase = ?')
+            args.append(phase)
+        if appliance_version is not None:
+            where.append('appliance_version = ?')
+            args.append(str(appliance_version))
+        if provider is not None:
+            where.append('provider = ?')
+            args.append(provider)
+        if not include_current:
+            where.append('run_id != ?')
+            args.append(self.run_id)
+        for column, value in filters.items():
+            where.append('%s = ?' % column)
+            args.append(value)
+
+        query = 'SELECT %s, SUM(duration) FROM timings WHERE %s GROUP BY run_id, %s' % (
+            group_by, ' AND '.join(where), group_by)
+        totals = defaultdict(list)
+        for key, total in self.conn.execute(query, args):
+            totals[key].append(total)
+        return totals
+
+    def test_stats(self, nodeid, phase=None, appliance_version=None, provider=None):
+        """Duration statistics for a single test from previous runs
+
+        Args:
+            nodeid: py.test nodeid of the test
+            phase: Only consider this test phase, one of ``setup``, ``call``, or ``teardown``.
+                ``setup`` is the time spent setting up fixtures for the test.
+            appliance_version: Only consider runs against this appliance version
+            provider: Only consider runs parametrized with this provider key
+
+        Returns: a :py:attr:`Stats` tuple of the number of runs, median and 95th percentile
+            durations in seconds. The durations are ``None`` if the test never ran.
+
+        """
+        totals = self._totals('nodeid', phase, appliance_version, provider, nodeid=nodeid)
+        return _stats(totals[nodeid])
+
+    def module_stats(self, module, phase=None, appliance_version=None, provider=None):
+        """Duration statistics for a whole test module from previous runs
+
+        Takes the same arguments as :py:meth:`test_stats`, but with the path of a test module
+        relative to the project root instead of a test nodeid.
+
+        """
+        totals = self._totals('module', phase, appliance_version, provider, module=module)
+        return _stats(totals[module])
+
+    def test_durations(self, phase=None, appliance_version=None, provider=None):
+        """Median durations of all tests from previous runs, by nodeid
+
+        Takes the same filtering arguments as :py:meth:`test_stats`.
+
+        """
+        totals = self._totals('nodeid', phase, appliance_version, provider)
+        return {nodeid: percentile(durations, 50) for nodeid, durations in totals.items()}
+
+    def regressions(self, min_runs=3):
+        """Tests that took longer in the current run than they did in 95% of previous runs
+
+        Args:
+            min_runs: Only consider tests that were run at least this many times before
+
+        Returns: a list of ``(nodeid, duration, stats)`` tuples, where ``duration`` is the
+            duration of the test in the current run, and stats are the :py:attr:`Stats` for
+            previous runs, slowest test first.
+
+        """
+        previous = self._totals('nodeid')
+        current = self._totals('nodeid', include_current=True, run_id=self.run_id)
+        regressions = []
+        for nodeid, (duration,) in current.items():
+            stats = _stats(previous.get(nodeid, []))
+            if stats.count >= min_runs and duration > stats.p95:
+                regressions.append((nodeid, duration, stats))
+        return sorted(regressions, key=lambda regression: regression[1], reverse=True)
@@ -1,6 +1,60 @@
+import Queue as queue
+import random
+import sys
+import threading
 import time
-from utils.log import logger
+from collections import deque
 from functools import partial
+from multiprocessing.pool import ThreadPool
+
+from utils.log import logger, perflog
+
+#: Statistics of the most recent :py:func:`wait_for` calls, newest last
+wait_stats = deque(maxlen=1000)
+
+#: Waits taking at least this many seconds are written to the perflog, as are failed ones
+slow_wait = 60
+
+
+class WaitStats(object):
+    """Statistics of a single :py:func:`wait_for` call
+
+    Attributes:
+        message: The description of the wait, as logged by :py:func:`wait_for`
+        attempts: Number of times func was called
+        func_time: Time spent in func, in seconds
+        sleep_time: Time spent sleeping between attempts, in seconds
+        wakes: Number of times sleep was cut short by the ``wake`` event
+        duration: Total time spent waiting, in seconds
+        timed_out: Whether or not the wait timed out
+
+    """
+    def __init__(self, message):
+        self.message = message
+        self.attempts = 0
+        self.func_time = 0.0
+        self.sleep_time = 0.0
+        self.wakes = 0
+        self.duration = 0.0
+        self.timed_out = False
+
+    def __repr__(self):
+        return ('<WaitStats %s: %d attempts, %f in func, %f sleeping, %d wakes%s>' %
+            (self.message, self.attempts, self.func_time, self.sleep_time, self.wakes,
+             ', timed out' if self.timed_out else ''))
+
+
+def _sleep(seconds, wake=None):
+    # Sleep for the given number of seconds, returning True if woken early by the wake event
+    if seconds <= 0:
+        return False
+    if wake is None:
+        time.sleep(seconds)
+        return False
+    if wake.wait(seconds):
+        wake.clear()
+        return True
+    return False
 
 
 def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
@@ -11,6 +65,9 @@ def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
     Returns the output from the function once it completes successfully,
     along with the time taken to complete the command.
 
+    Sleeping between attempts never extends past the ``num_sec`` deadline; if the deadline
+    would be reached while sleeping, func is tried one last time at the deadline instead.
+
     Note: If using the expo keyword, the returned elapsed time will be inaccurate
         as wait_for does not know the exact time that the function returned
         correctly, only that it returned correctly at last check.
@@ -31,6 +88,13 @@ def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
             clobber the exception and treat it as a fail_condition.
         delay: An integer describing the number of seconds to delay before trying func()
             again.
+        max_delay: The longest delay, in seconds, ``expo`` is allowed to grow to
+            (default no limit)
+        jitter: Randomly vary each delay by up to this fraction of the delay, e.g. ``0.1``
+            for +/- 10%, to keep many waiters from polling in lockstep (default 0)
+        wake: A :py:class:`threading.Event` that will cut the current delay short when set,
+            causing func() to be tried again immediately. The event is cleared when it wakes
+            the waiter.
         fail_func: A function to be run after every unsuccessful attempt to run func()
         quiet: Do not write time report to the log (default False)
 
@@ -40,9 +104,12 @@ def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
     Raises:
         TimedOutError: If num_sec is exceeded after an unsuccessful func() invocation.
 
+    Statistics for each call (attempts, time spent in func and sleeping) that fails or takes
+    at least :py:attr:`slow_wait` seconds are written to the perflog unless ``quiet`` is set,
+    and the :py:class:`WaitStats` for the most recent calls are kept in :py:attr:`wait_stats`.
+
     """
     st_time = time.time()
-    total_time = 0
     num_sec = kwargs.get('num_sec', 120)
     expo = kwargs.get('expo', False)
     message = kwargs.get('message', None)
@@ -55,33 +122,190 @@ def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
     fail_condition = kwargs.get('fail_condition', False)
     handle_exception = kwargs.get('handle_exception', False)
     delay = kwargs.get('delay', 1)
+    max_delay = kwargs.get('max_delay', None)
+    jitter = kwargs.get('jitter', 0)
+    wake = kwargs.get('wake', None)
     fail_func = kwargs.get('fail_func', None)
     quiet = kwargs.get("quiet", False)
 
-    t_delta = 0
-    while t_delta <= num_sec:
-        try:
-            out = func(*func_args, **func_kwargs)
-        except:
-            if handle_exception:
-                out = fail_condition
+    deadline = st_time + num_sec
+    succeeded = False
+    stats = WaitStats(message)
+    wait_stats.append(stats)
+    try:
+        while True:
+            stats.attempts += 1
+            func_start = time.time()
+            try:
+                out = func(*func_args, **func_kwargs)
+            except:
+                if handle_exception:
+                    out = fail_condition
+                else:
+                    raise
+            finally:
+                stats.func_time += time.time() - func_start
+
+            if out == fail_condition:
+                remaining = deadline - time.time()
+                if remaining > 0:
+                    this_delay = delay
+                    if jitter:
+                        this_delay *= 1 + random.uniform(-jitter, jitter)
+                    sleep_start = time.time()
+                    if _sleep(min(this_delay, remaining), wake):
+                        stats.wakes += 1
+                    stats.sleep_time += time.time() - sleep_start
+                    if expo:
+                        delay *= 2
+                        if max_delay is not None:
+                            delay = min(delay, max_delay)
+                # Called after the last attempt too, as it always has been
+                if fail_func:
+                    fail_func()
+                if remaining <= 0:
+                    break
             else:
-                raise
-        if out == fail_condition:
-            time.sleep(delay)
-            total_time += delay
-            if expo:
-                delay *= 2
-            if fail_func:
-                fail_func()
-        else:
-            duration = time.time() - st_time
-            if not quiet:
-                logger.info('Took %f to do %s' % (duration, message))
-            return out, duration
+                duration = time.time() - st_time
+                if not quiet:
+                    logger.info('Took %f to do %s' % (duration, message))
+                succeeded = True
+                return out, duration
+
         t_delta = time.time() - st_time
-    logger.error('Could not complete %s in time, took %f' % (message, t_delta))
-    raise TimedOutError("Could not do %s in time" % message)
+        stats.timed_out = True
+        logger.error('Could not complete %s in time, took %f' % (message, t_delta))
+        raise TimedOutError("Could not do %s in time" % message)
+    finally:
+        stats.duration = time.time() - st_time
+        if not quiet and (not succeeded or stats.duration >= slow_wait):
+            perflog.logger.info('wait_for %s: %d attempts, %f in func, %f sleeping, %d wakes' %
+                (message, stats.attempts, stats.func_time, stats.sleep_time, stats.wakes))
+
+
+def wait_for_each(waits, num_sec=120, **kwargs):
+    """Waits for many conditions at once, yielding each one as it completes
+
+    Each condition is polled by :py:func:`wait_for` in its own thread, so waiting on N
+    conditions takes as long as the slowest one instead of as long as all of them combined.
+
+    Args:
+        waits: A list of conditions to wait for. Each one is either a function, or a dict of
+            keyword arguments for :py:func:`wait_for`, including ``func``. This allows
+            every condition to have its own ``delay``, ``fail_condition``, and so on.
+        num_sec: Number of seconds to wait for all conditions before timing out. Conditions
+            with their own ``num_sec`` will time out at whichever deadline comes first.
+        **kwargs: Default :py:func:`wait_for` keyword arguments for every condition
+
+    Yields:
+        ``(index, (out, duration))`` tuples, where index is the position of the completed
+        condition in ``waits``, and ``(out, duration)`` is what :py:func:`wait_for` returned.
+
+    Raises:
+        TimedOutError: As soon as any condition times out. Conditions still being waited on
+            are abandoned, as they are whenever the generator is closed before completing.
+        Any other exception raised by a condition's function, in the same way.
+
+    Note:
+
+        Conditions are run with their own ``wake`` events, which are used to stop waiting on
+        abandoned conditions, so any ``wake`` passed in will be ignored.
+
+    """
+    deadline = time.time() + num_sec
+    results = queue.Queue()
+    cancelled = threading.Event()
+    wait_kwargs_list = []
+    for wait in waits:
+        wait_kwargs = dict(kwargs)
+        if callable(wait):
+            wait_kwargs['func'] = wait
+        else:
+            wait_kwargs.update(wait)
+        wait_kwargs['wake'] = threading.Event()
+        wait_kwargs_list.append(wait_kwargs)
+
+    def run(index, wait_kwargs):
+        user_fail_func = wait_kwargs.get('fail_func')
+
+        def fail_func():
+            if cancelled.is_set():
+                raise _Cancelled()
+            if user_fail_func:
+                user_fail_func()
+        wait_kwargs['fail_func'] = fail_func
+        wait_kwargs['num_sec'] = min(wait_kwargs.get('num_sec', num_sec), deadline - time.time())
+        try:
+            results.put((index, wait_for(**wait_kwargs), None))
+        except _Cancelled:
+            pass
+        except:
+            results.put((index, None, sys.exc_info()))
+
+    if not wait_kwargs_list:
+        return
+    pool = ThreadPool(len(wait_kwargs_list))
+    try:
+        for index, wait_kwargs in enumerate(wait_kwargs_list):
+            pool.apply_async(run, (index, wait_kwargs))
+        for __ in wait_kwargs_list:
+            while True:
+                # Queue.get without a timeout can't be interrupted with ctrl-c
+                try:
+                    index, result, exc_info = results.get(timeout=1)
+                    break
+                except queue.Empty:
+                    continue
+            if exc_info:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            yield index, result
+    finally:
+        cancelled.set()
+        for wait_kwargs in wait_kwargs_list:
+            wait_kwargs['wake'].set()
+        pool.close()
+
+
+def wait_for_all(waits, num_sec=120, **kwargs):
+    """Waits for all of the given conditions at once
+
+    Takes the same arguments as :py:func:`wait_for_each`.
+
+    Returns:
+        A list of the ``(out, duration)`` tuples returned by :py:func:`wait_for` for each
+        condition, in the same order as ``waits``.
+
+    Usage:
+
+        # Power on a few vms, then wait for them to all be running
+        wait_for_all([partial(is_vm_running, vm) for vm in vms], num_sec=600, delay=10)
+
+    """
+    results = [None] * len(waits)
+    for index, result in wait_for_each(waits, num_sec, **kwargs):
+        results[index] = result
+    return results
+
+
+def wait_for_any(waits, num_sec=120, **kwargs):
+    """Waits for the first of the given conditions to complete
+
+    Takes the same arguments as :py:func:`wait_for_each`. The remaining conditions are
+    abandoned as soon as one completes.
+
+    Returns:
+        A tuple of ``(index, (out, duration))`` for the first condition to complete, where
+        index is its position in ``waits``.
+
+    """
+    for index, result in wait_for_each(waits, num_sec, **kwargs):
+        return index, result
+    raise ValueError('No conditions to wait for')
+
+
+class _Cancelled(Exception):
+    # Raised in abandoned wait_for_each conditions to stop waiting on them
+    pass
 
 
 class TimedOutError(Exception):